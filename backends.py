@@ -0,0 +1,553 @@
+'''
+Input backends used by the bot to move the mouse and press keys.
+
+    pyautogui   default, works everywhere pyautogui does
+    xtest       direct X11 XTest events (Linux, needs python-xlib). Events of a stroke are
+                queued with server-side delays and flushed once when the stroke ends
+    recording   records events instead of sending them, used for tests and benchmarks
+    simulation  paints strokes onto an in-memory canvas on a virtual clock, see simulate.py
+
+The backend is selected with the "input_backend" key in config.json. A micro-benchmark
+reports how many events per second each backend can send:
+
+    python backends.py bench --backend xtest --events 5000
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from exceptions import InputBackendError
+
+try:
+    import pyautogui
+except Exception:
+    # No display to connect to (e.g. headless CI), only the recording and simulation backends work
+    pyautogui = None
+
+
+class InputBackend:
+    '''
+    Minimal set of input primitives used by the bot. Subclasses implement move_to,
+    mouse_down, mouse_up, key_down and key_up, everything else is built on top of them.
+    '''
+
+    name = None
+    # True if sleep() while a button is held is carried out by the backend itself (see XTestBackend)
+    server_timed = False
+    # True if sleep() only advances a simulated clock, the bot then never waits in real time
+    virtual_clock = False
+
+    def move_to(self, x, y):
+        raise NotImplementedError
+
+    def mouse_down(self, x=None, y=None, button='left'):
+        raise NotImplementedError
+
+    def mouse_up(self, x=None, y=None, button='left'):
+        raise NotImplementedError
+
+    def key_down(self, key):
+        raise NotImplementedError
+
+    def key_up(self, key):
+        raise NotImplementedError
+
+    def position(self):
+        '''Returns the current (x, y) position of the mouse'''
+        raise NotImplementedError
+
+    def sleep(self, seconds):
+        '''Waits between two events'''
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def flush(self):
+        '''Sends any queued events, called once at the end of every stroke'''
+        pass
+
+    def capture(self, box):
+        '''
+        Returns the pixels of the screen region box (x, y, w, h) as an (h, w, 3) array if the
+        backend renders its own screen, or None if the real screen has to be captured
+        '''
+        return None
+
+    def click(self, x, y, clicks=1, interval=0.0, button='left'):
+        for i in range(clicks):
+            if i:
+                self.sleep(interval)
+            self.mouse_down(x, y, button=button)
+            self.mouse_up(x, y, button=button)
+
+    def press(self, key, presses=1, interval=0.0):
+        for i in range(presses):
+            if i:
+                self.sleep(interval)
+            self.key_down(key)
+            self.key_up(key)
+
+    def write(self, keys, interval=0.0):
+        '''Presses a sequence of keys in one go, interval seconds apart'''
+        for i, key in enumerate(keys):
+            if i:
+                self.sleep(interval)
+            self.key_down(key)
+            self.key_up(key)
+
+    def hotkey(self, *keys):
+        '''Holds keys down in order and releases them in reverse order'''
+        for key in keys:
+            self.key_down(key)
+        for key in reversed(keys):
+            self.key_up(key)
+
+    def copy(self, text):
+        '''Puts text on the clipboard'''
+        try:
+            import pyperclip
+        except ImportError:
+            raise InputBackendError('Pasting colors requires pyperclip (pip install pyperclip)')
+        pyperclip.copy(text)
+
+    def drag_to(self, x, y, duration=0.0, button='left'):
+        '''Holds the button down and moves from the current position to (x, y)'''
+        x0, y0 = self.position()
+        steps = max(1, int(duration / 0.01))
+        self.mouse_down(button=button)
+        for i in range(1, steps + 1):
+            self.move_to(x0 + (x - x0) * i / steps, y0 + (y - y0) * i / steps)
+            if steps > 1:
+                self.sleep(duration / steps)
+        self.mouse_up(button=button)
+        self.flush()
+
+
+class PyAutoGUIBackend(InputBackend):
+    name = 'pyautogui'
+
+    def move_to(self, x, y):
+        pyautogui.moveTo(x, y)
+
+    def mouse_down(self, x=None, y=None, button='left'):
+        pyautogui.mouseDown(x, y, button=button)
+
+    def mouse_up(self, x=None, y=None, button='left'):
+        pyautogui.mouseUp(x, y, button=button)
+
+    def key_down(self, key):
+        pyautogui.keyDown(key)
+
+    def key_up(self, key):
+        pyautogui.keyUp(key)
+
+    def position(self):
+        return tuple(pyautogui.position())
+
+    def click(self, x, y, clicks=1, interval=0.0, button='left'):
+        pyautogui.click((x, y), clicks=clicks, interval=interval, button=button)
+
+    def press(self, key, presses=1, interval=0.0):
+        pyautogui.press(key, presses=presses, interval=interval)
+
+    def write(self, keys, interval=0.0):
+        pyautogui.press(list(keys), interval=interval)
+
+    def hotkey(self, *keys):
+        pyautogui.hotkey(*keys)
+
+    def drag_to(self, x, y, duration=0.0, button='left'):
+        pyautogui.dragTo(x, y, duration, button=button)
+
+
+class XTestBackend(InputBackend):
+    '''
+    Sends events straight to the X server through the XTest extension, skipping pyautogui's
+    per-call overhead and failsafe checks. While a mouse button is held or a key sequence
+    is written, events and sleeps are queued (sleeps become server-side delays) and sent in
+    one go by flush().
+    '''
+
+    name = 'xtest'
+    server_timed = True
+
+    BUTTONS = {'left': 1, 'middle': 2, 'right': 3}
+    KEYSYMS = {
+        'ctrl': 'Control_L', 'alt': 'Alt_L', 'shift': 'Shift_L', 'tab': 'Tab', 'enter': 'Return',
+        'return': 'Return', 'esc': 'Escape', 'escape': 'Escape', 'backspace': 'BackSpace',
+        'space': 'space', 'delete': 'Delete', 'up': 'Up', 'down': 'Down', 'left': 'Left', 'right': 'Right'
+    }
+
+    def __init__(self):
+        try:
+            from Xlib import X, XK, display
+            from Xlib.ext import xtest
+        except ImportError:
+            raise InputBackendError('The xtest input backend requires python-xlib (pip install python-xlib)')
+
+        try:
+            self._display = display.Display()
+        except Exception as e:
+            raise InputBackendError(f'Could not connect to the X server: {e}')
+        if not self._display.has_extension('XTEST'):
+            raise InputBackendError('The X server does not support the XTEST extension')
+
+        self._X, self._XK, self._xtest = X, XK, xtest
+        self._keycodes = {}
+        self._buttons_down = 0
+        self._writing = False
+        self._pending_delay = 0.0
+        self._position = None
+
+    def _send(self, event_type, detail=0, x=0, y=0):
+        # XTest delays are given in milliseconds relative to the previous event
+        delay = int(self._pending_delay * 1000)
+        self._pending_delay = 0.0
+        self._xtest.fake_input(self._display, event_type, detail, time=delay or self._X.CurrentTime, x=x, y=y)
+        if not self._buttons_down and not self._writing:
+            self.flush()
+
+    def _keycode(self, key):
+        '''
+        Returns (keycode, shifted) of key. shifted is set if the keysym only sits on the shifted
+        level of its key, e.g. 'A' on the key of 'a', so it has to be pressed with Shift held.
+        '''
+        entry = self._keycodes.get(key)
+        if entry is None:
+            keysym = self._XK.string_to_keysym(XTestBackend.KEYSYMS.get(key.lower(), key))
+            # Sorted by level, an unshifted binding wins
+            levels = list(self._display.keysym_to_keycodes(keysym)) if keysym else []
+            if not levels:
+                raise InputBackendError(f'Unknown key for xtest backend: {key}')
+            keycode, level = levels[0]
+            entry = self._keycodes[key] = (keycode, level % 2 == 1)
+        return entry
+
+    def key_down(self, key):
+        keycode, shifted = self._keycode(key)
+        if shifted:
+            self._send(self._X.KeyPress, self._keycode('shift')[0])
+        self._send(self._X.KeyPress, keycode)
+
+    def key_up(self, key):
+        keycode, shifted = self._keycode(key)
+        self._send(self._X.KeyRelease, keycode)
+        if shifted:
+            self._send(self._X.KeyRelease, self._keycode('shift')[0])
+
+    def move_to(self, x, y):
+        self._position = (int(x), int(y))
+        self._send(self._X.MotionNotify, x=int(x), y=int(y))
+
+    def mouse_down(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.move_to(x, y)
+        self._buttons_down += 1
+        self._send(self._X.ButtonPress, XTestBackend.BUTTONS[button])
+
+    def mouse_up(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.move_to(x, y)
+        self._buttons_down = max(0, self._buttons_down - 1)
+        self._send(self._X.ButtonRelease, XTestBackend.BUTTONS[button])
+
+    def position(self):
+        # Queued moves have not reached the server yet, report where the last one will end up
+        if self._buttons_down and self._position is not None:
+            return self._position
+        pointer = self._display.screen().root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def write(self, keys, interval=0.0):
+        self._writing = True
+        try:
+            super().write(keys, interval)
+        finally:
+            self._writing = False
+        self.flush()
+
+    def sleep(self, seconds):
+        if self._buttons_down or self._writing:
+            self._pending_delay += max(0.0, seconds)
+        else:
+            super().sleep(seconds)
+
+    def flush(self):
+        # sync() only returns once the server has processed every queued event and delay
+        self._display.sync()
+
+
+class RecordingBackend(InputBackend):
+    '''
+    Records events as (time, name, args) tuples instead of sending them. Sleeps advance a
+    virtual clock unless real_time is set, so recorded plans replay instantly.
+    '''
+
+    name = 'recording'
+
+    def __init__(self, real_time=False):
+        self.real_time = real_time
+        self.events = []
+        self.clock = 0.0
+        self._position = (0, 0)
+
+    def _record(self, name, *args):
+        self.events.append((self.clock, name, args))
+
+    def move_to(self, x, y):
+        self._position = (x, y)
+        self._record('move', x, y)
+
+    def mouse_down(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.move_to(x, y)
+        self._record('down', button)
+
+    def mouse_up(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.move_to(x, y)
+        self._record('up', button)
+
+    def key_down(self, key):
+        self._record('key_down', key)
+
+    def key_up(self, key):
+        self._record('key_up', key)
+
+    def copy(self, text):
+        self._record('copy', text)
+
+    def position(self):
+        return self._position
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        self.clock += seconds
+        if self.real_time:
+            time.sleep(seconds)
+
+
+def brush_footprint(size=1, shape='round'):
+    '''
+    Returns the (dy, dx) pixel offsets covered by a brush of the given diameter around the
+    point it is placed at. shape is 'round' or 'square'.
+    '''
+    size = max(1, int(size))
+    offsets = np.arange(-(size // 2), (size + 1) // 2)
+    dy, dx = (a.ravel() for a in np.meshgrid(offsets, offsets, indexing='ij'))
+    if shape == 'round':
+        # Even sizes have their center between pixels
+        center = 0.5 if size % 2 == 0 else 0.0
+        inside = (dy + center) ** 2 + (dx + center) ** 2 <= (size / 2) ** 2
+        dy, dx = dy[inside], dx[inside]
+    elif shape != 'square':
+        raise ValueError(f"Unknown brush shape '{shape}', expected 'round' or 'square'")
+    return dy, dx
+
+
+class SimulationBackend(InputBackend):
+    '''
+    Paints strokes onto an in-memory image of the screen region box (x, y, w, h) instead of
+    sending events, at full speed. The simulated app behaves like a simple paint program:
+
+    - a press inside box paints the brush footprint there, moves paint lines until release
+    - a click on a position in pickers (screen position -> color, e.g. palette cells and
+      calibrated spectrum points) selects that color
+    - after a click inside the custom colors dialog, text typed or pasted into the fields
+      is entered like entry (a colorentry.ColorEntry) enters it, its confirm key applies
+
+    Sleeps advance a virtual clock, event_seconds is added per event to model input latency.
+    '''
+
+    name = 'simulation'
+    virtual_clock = True
+
+    def __init__(self, box=(0, 0, 800, 600), brush=1, shape='round', background=(255, 255, 255), event_seconds=0.0):
+        x, y, w, h = (int(v) for v in box)
+        self.box = (x, y, w, h)
+        self.image = np.empty((h, w, 3), dtype=np.uint8)
+        self.image[:] = background
+        self.footprint = brush_footprint(brush, shape)
+        self.pickers = {}
+        self.dialog = None  # (x, y, w, h) of the custom colors dialog
+        self.entry = None  # ColorEntry the dialog is filled in with
+        self.clipboard = ''
+        self.color = (0, 0, 0)
+        self.event_seconds = event_seconds
+        self.clock = 0.0
+        self.events = 0
+        self.color_switches = 0
+        self._position = (x, y)
+        self._pressed_at = None
+        self._painting = False
+        self._field = None  # Field of the dialog typed into, None outside the dialog
+        self._fields = {}
+        self._held = set()
+
+    def _event(self):
+        self.events += 1
+        self.clock += self.event_seconds
+
+    def _paint(self, p0, p1):
+        '''Paints the brush footprint along the line from p0 to p1'''
+        x0, y0 = p0[0] - self.box[0], p0[1] - self.box[1]
+        x1, y1 = p1[0] - self.box[0], p1[1] - self.box[1]
+        n = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+        xs = np.rint(np.linspace(x0, x1, n)).astype(np.int64)
+        ys = np.rint(np.linspace(y0, y1, n)).astype(np.int64)
+        dy, dx = self.footprint
+        px = (xs[:, None] + dx[None, :]).ravel()
+        py = (ys[:, None] + dy[None, :]).ravel()
+        h, w = self.image.shape[:2]
+        inside = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+        self.image[py[inside], px[inside]] = self.color
+
+    def _select(self, color):
+        self.color = tuple(int(v) for v in color)
+        self.color_switches += 1
+
+    def move_to(self, x, y):
+        self._event()
+        position = (int(round(x)), int(round(y)))
+        if self._painting:
+            self._paint(self._position, position)
+        self._position = position
+
+    def mouse_down(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.move_to(x, y)
+        self._event()
+        self._pressed_at = self._position
+        px, py = self._position
+        if self._position not in self.pickers:
+            bx, by, bw, bh = self.box
+            self._painting = bx <= px < bx + bw and by <= py < by + bh
+            if self._painting:
+                self._paint(self._position, self._position)
+
+    def mouse_up(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.move_to(x, y)
+        self._event()
+        self._painting = False
+        if self._pressed_at != self._position:
+            return
+        if self._position in self.pickers:
+            self._select(self.pickers[self._position])
+        elif self.dialog is not None:
+            dx, dy, dw, dh = self.dialog
+            px, py = self._position
+            if dx <= px < dx + dw and dy <= py < dy + dh and self.entry is not None:
+                self._field, self._fields = 0, {}
+
+    def _type(self, text):
+        self._fields[self._field] = self._fields.get(self._field, '') + text
+
+    def _apply(self):
+        '''Applies the fields of the dialog, fields that were not filled in keep their value'''
+        entry, first = self.entry, self.entry.tabs_to_field
+        try:
+            if entry.method == 'hex':
+                text = self._fields.get(first, '')
+                rgb = [int(text[k:k + 2], 16) for k in (0, 2, 4)] if len(text) == 6 else list(self.color)
+            else:
+                rgb = [int(self._fields[first + k]) if first + k in self._fields else self.color[k] for k in range(3)]
+        except ValueError:
+            return
+        self._select(min(255, v) for v in rgb)
+
+    def key_down(self, key):
+        self._event()
+        self._held.add(key)
+        if self._field is None:
+            return
+        entry = self.entry
+        if key in entry.paste_keys and all(k in self._held for k in entry.paste_keys):
+            self._type(self.clipboard)
+        elif key == 'tab' or key == entry.next_field:
+            self._field += 1
+        elif key == entry.confirm:
+            self._apply()
+            self._field = None
+        elif len(key) == 1 and key not in entry.paste_keys:
+            self._type(key)
+
+    def key_up(self, key):
+        self._event()
+        self._held.discard(key)
+
+    def copy(self, text):
+        self.clipboard = text
+
+    def position(self):
+        return self._position
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.clock += seconds
+
+    def capture(self, box):
+        x, y, w, h = (int(v) for v in box)
+        bx, by = self.box[:2]
+        return self.image[max(0, y - by):y - by + h, max(0, x - bx):x - bx + w].copy()
+
+
+BACKENDS = {
+    PyAutoGUIBackend.name: PyAutoGUIBackend,
+    XTestBackend.name: XTestBackend,
+    RecordingBackend.name: RecordingBackend,
+    SimulationBackend.name: SimulationBackend
+}
+
+
+def create_backend(name='pyautogui'):
+    '''Creates the input backend with the given name'''
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise InputBackendError(f"Unknown input backend '{name}', expected one of: {', '.join(BACKENDS)}")
+
+
+def benchmark(backend, events=2000, origin=(200, 200), size=100):
+    '''
+    Sends events mouse moves along a square with the button held, flushing every 10 moves
+    like short strokes would. Returns the number of events per second.
+    '''
+    x0, y0 = origin
+    backend.move_to(x0, y0)
+    start = time.perf_counter()
+    backend.mouse_down(button='left')
+    for i in range(events):
+        t = i % (4 * size)
+        side, offset = divmod(t, size)
+        x, y = ((x0 + offset, y0), (x0 + size, y0 + offset), (x0 + size - offset, y0 + size), (x0, y0 + size - offset))[side]
+        backend.move_to(x, y)
+        if i % 10 == 9:
+            backend.flush()
+    backend.mouse_up(button='left')
+    backend.flush()
+    elapsed = time.perf_counter() - start
+    return events / elapsed if elapsed > 0 else float('inf')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pyaint input backends.')
+    parser.add_argument('command', choices=('bench',))
+    parser.add_argument('--backend', choices=tuple(BACKENDS) + ('all',), default='all')
+    parser.add_argument('--events', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print('Warning: the benchmark moves the real mouse with the left button held. Focus an empty window.')
+    names = tuple(BACKENDS) if args.backend == 'all' else (args.backend,)
+    for name in names:
+        try:
+            rate = benchmark(create_backend(name), args.events)
+            print(f"[Benchmark] {name}: {rate:,.0f} events/s")
+        except InputBackendError as e:
+            print(f"[Benchmark] {name}: unavailable ({e})")
+
+
+if __name__ == '__main__':
+    main()
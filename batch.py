@@ -0,0 +1,192 @@
+'''
+Batch pre-computation of a folder of reference images.
+
+Images are fanned out over a process pool and every plan is written to the plan cache,
+exactly like the Pre-compute button does for a single image. The canvas, palette, drawing
+settings and custom color quantization are taken from config.json and the color
+calibration from color_calibration.bin, so run Setup in the UI once beforehand.
+
+    python batch.py references/ --workers 4
+    python batch.py "references/*.png" --mode slotted
+'''
+
+import argparse
+import glob
+import json
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bot import Bot
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp')
+
+
+def find_images(pattern):
+    '''Returns the sorted image files inside a directory or matching a glob pattern'''
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def _precompute_job(job):
+    '''
+    Runs in a worker process. Rebuilds a bot from the job description and writes the plan
+    for a single image into the shared cache. Never raises, failures are reported back.
+    '''
+    start = time.time()
+    result = {'image': job['image'], 'strokes': 0, 'colors': 0, 'seconds': 0.0, 'cache_file': None, 'error': None}
+    try:
+        bot = Bot()
+        bot.settings = list(job['settings'])
+        bot.cache.cache_dir = job['cache_dir']
+        bot.cache.max_bytes = job['max_bytes']
+        bot._canvas = tuple(job['canvas'])
+        if job['colors_pos']:
+            bot.init_palette(colors_pos=job['colors_pos'])
+        bot.custom_quantization = job['custom_quantization']
+        bot.custom_color_count = job['custom_color_count']
+        if job['calibration_file'] and not bot.load_color_calibration(job['calibration_file']):
+            raise RuntimeError(f"calibration {job['calibration_file']} could not be loaded")
+        # The plan must land under the cache key the caller looks it up with
+        if bot._plan_inputs(job['flags'], job['mode']) != job['plan_inputs']:
+            raise RuntimeError('plan inputs differ from the caller, was the calibration file changed?')
+
+        cache_file = bot.precompute(job['image'], job['flags'], job['mode'], skip_existing=True)
+        cache_data = bot.load_cached(cache_file)
+        if cache_data is None:
+            raise RuntimeError('plan could not be read back from the cache')
+
+        with cache_data['cmap'] as cmap:
+            result['cache_file'] = cache_file
+            result['colors'] = len(cmap)
+            result['strokes'] = sum(len(lines) for lines in cmap.values())
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = time.time() - start
+    return result
+
+
+def _print_result(result, done, total, eta_seconds):
+    name = os.path.basename(result['image'])
+    if result['error']:
+        print(f"[Batch] {done}/{total} FAILED {name}: {result['error']}")
+    else:
+        print(f"[Batch] {done}/{total} {name}: {result['strokes']} strokes, {result['colors']} colors "
+              f"in {result['seconds']:.1f}s - ETA: {Bot._format_time(eta_seconds)}")
+
+
+def precompute_batch(bot, images, flags=0, mode=Bot.LAYERED, workers=None, on_result=_print_result):
+    '''
+    Pre-computes every image in images with the canvas, palette and settings of bot.
+    on_result(result, done, total, eta_seconds) is called in the calling process as
+    soon as each image finishes. Returns the list of results in completion order.
+    '''
+    if bot._canvas is None:
+        raise RuntimeError("Cannot precompute: canvas not initialized")
+
+    # Workers read the calibration from its file instead of receiving the whole map
+    calibration_file = bot.calibration_file() if bot.color_calibration_map else None
+    if calibration_file is not None:
+        calibration_file = os.path.abspath(calibration_file)
+
+    job_base = {
+        'settings': list(bot.settings),
+        'canvas': tuple(bot._canvas),
+        'colors_pos': dict(bot._palette.colors_pos) if bot._palette is not None else None,
+        'flags': flags,
+        'mode': mode,
+        'cache_dir': bot.cache.cache_dir,
+        'max_bytes': bot.cache.max_bytes,
+        'custom_quantization': bot.custom_quantization,
+        'custom_color_count': bot.custom_color_count,
+        'calibration_file': calibration_file,
+        'plan_inputs': bot._plan_inputs(flags, mode)
+    }
+
+    results = []
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_precompute_job, dict(job_base, image=image)) for image in images]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+
+            done = len(results)
+            eta_seconds = (time.time() - start) / done * (len(images) - done)
+            if on_result is not None:
+                on_result(result, done, len(images), eta_seconds)
+
+    return results
+
+
+def bot_from_config(config_file):
+    '''Creates a bot with the drawing settings, canvas, palette and color calibration the UI saved'''
+    with open(config_file, 'r', encoding='utf-8') as f:
+        tools = json.load(f)
+
+    bot = Bot(config_file)
+    settings = tools.get('drawing_settings', {})
+    bot.settings = [
+        Bot.stroke_delay(settings),
+        settings.get('pixel_size', 12),
+        settings.get('precision', 0.9),
+        settings.get('jump_delay', 0.5)
+    ]
+    if 'cache_settings' in tools:
+        bot.cache.max_bytes = int(float(tools['cache_settings'].get('max_mb', 256)) * 1024 * 1024)
+
+    if tools.get('Canvas', {}).get('box'):
+        bot.init_canvas(tools['Canvas']['box'])
+    palette_config = tools.get('Palette', {})
+    if palette_config.get('color_coords'):
+        bot.init_palette(colors_pos={
+            tuple(map(int, k[1:-1].split(', '))): tuple(v)
+            for k, v in palette_config['color_coords'].items()
+        })
+
+    options = tools.get('drawing_options', {})
+    bot.custom_quantization = options.get('custom_quantization', 'interval')
+    bot.custom_color_count = int(options.get('custom_color_count', 64))
+    if bot.calibration_file():
+        bot.load_color_calibration(bot.calibration_file())
+
+    flags = 0
+    if options.get('ignore_white_pixels', True):
+        flags |= Bot.IGNORE_WHITE
+    if options.get('use_custom_colors', False):
+        flags |= Bot.USE_CUSTOM_COLORS
+    return bot, flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-compute drawing plans for a folder of images.')
+    parser.add_argument('images', help='directory or glob pattern of images')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: CPU count)')
+    parser.add_argument('--mode', choices=(Bot.LAYERED, Bot.SLOTTED), default=Bot.LAYERED)
+    parser.add_argument('--config', default='config.json', help='config file with canvas, palette and settings')
+    args = parser.parse_args(argv)
+
+    bot, flags = bot_from_config(args.config)
+    images = find_images(args.images)
+    if not images:
+        print(f"[Batch] No images found for: {args.images}")
+        return 1
+
+    print(f"[Batch] Pre-computing {len(images)} images...")
+    start = time.time()
+    results = precompute_batch(bot, images, flags, args.mode, args.workers)
+    failed = [r for r in results if r['error']]
+
+    print("=" * 50)
+    print(f"[Batch] {len(results) - len(failed)} succeeded, {len(failed)} failed in {bot._format_time(time.time() - start)}")
+    for r in failed:
+        print(f"[Batch] FAILED {r['image']}: {r['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
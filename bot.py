@@ -1,23 +1,54 @@
-import pyautogui
 import time
-import utils
 import hashlib
 import json
+import logging
 import os
-import math
-import threading
-import tkinter as tk
-from tkinter import ttk
+import struct
 from typing import Optional, Tuple, Dict, List, Any
 from PIL import ImageGrab
 
+import numpy as np
+import backends
+import calibration
+import calibstore
+import colorentry
+import colorindex
+import control
+import estimate
+import journal
+import log
+import pacing
+import pipeline
+import planfile
+import progress
+import readiness
+import spectrum
+import tape
+import verify
+
+from cache import CacheStore, atomic_write
 from exceptions import (
+    InputBackendError,
     NoCustomColorsError,
     NoCanvasError,
     NoPaletteError
 )
 from PIL import Image
 
+try:
+    import pyautogui
+except Exception:
+    # No display to connect to (e.g. headless CI), drawings can only be simulated
+    pyautogui = None
+
+draw_log = log.get_logger('draw')
+calibration_log = log.get_logger('calibration')
+cache_log = log.get_logger('cache')
+input_log = log.get_logger('input')
+
+# Calibration file written before the binary calibration store, still read if present
+LEGACY_CALIBRATION_FILE = 'color_calibration.json'
+
 class Palette:
     def __init__(self, colors_pos=None, box=None, rows=None, columns=None, valid_positions=None, manual_centers=None):
         if colors_pos is not None:
@@ -103,17 +134,22 @@ class Bot:
     IGNORE_WHITE = 1 << 0
     USE_CUSTOM_COLORS = 1 << 1
 
+    REPLAY_WINDOW = 8192  # Tape events converted to lists at a time while drawing
+    # Delays saved before drawing_settings.delay_per_stroke took Delay / segments per stroke,
+    # Delay / 10 for long strokes; dividing by this keeps their speed
+    LEGACY_DELAY_DIVISOR = 10
+
     def __init__(self, config_file='config.json'):
-        self.terminate = False
-        self.paused = False
+        self.control = control.DrawControl()  # Pause/terminate requests, see control.py
         self.pause_key = 'p'
-        self.settings = [.1, 12, .9, 0.5]  # Added jump delay default
+        self.settings = [.01, 12, .9, 0.5]  # Added jump delay default
         self.progress = 0
         self.options = Bot.IGNORE_WHITE
         self.config_file = config_file
         self.drawing = False  # Flag to indicate if currently drawing
         self.skip_first_color = False  # Skip first color when drawing
         self.jump_threshold = 5  # Pixel distance threshold for jump detection (default 5)
+        self.progress_interval = 1.0  # Seconds between progress reports while drawing
 
         # Drawing state for pause/resume
         self.draw_state = {
@@ -173,17 +209,68 @@ class Bot:
         self._custom_colors = None
         
         # Color calibration map for custom colors: {(r,g,b): (x,y)}
+        # (also clears spectrum_model, the SpectrumModel of a model calibration)
         self.color_calibration_map = None
-
-        # Progress Overlay state
-        self.progress_overlay = None
+        self._calibration_progress = {'total': 0, 'current': 0}
+        # Spectrum colors further than this from every calibrated color are reported before drawing
+        self.gamut_tolerance = 40.0
+        self.color_resolution = None  # ColorResolution of the last compiled plan
+        # How USE_CUSTOM_COLORS quantizes: 'interval' snaps channels to an ACCURACY grid,
+        # 'calibrated' clusters the image to custom_color_count colors of the calibration map
+        self.custom_quantization = 'interval'
+        self.custom_color_count = 64
+        # Saved calibration map with its grid settings and progress, see calibstore.py
+        self.calibration_store = calibstore.CalibrationStore()
+        self._calibration_meta = None
+        self.calibration_saved = False  # Whether the last completed calibration was saved to the store
+        self.calibration_coverage = None  # CoverageReport of the last adaptive calibration
+
+        # Size-capped store for pre-computed plans
+        self.cache = CacheStore('cache')
+
+        # Key sequence that types a color into the custom colors dialog, see colorentry.py
+        self.color_entry = colorentry.ColorEntry()
+        # Mouse and keyboard events go through an input backend, see backends.py
+        self.input = backends.PyAutoGUIBackend()
+        # Paces the segments of every stroke over settings[DELAY]
+        self.pacer = pacing.StrokeScheduler()
+        # Closed-loop tuning of the stroke and jump delays, None unless enabled in config.json
+        self.adaptive_pacing = None
+        self.pacing_profile = 'default'
+        self.pacing_profiles = pacing.PacingProfiles()
+        # Ends the waits after helper clicks as soon as the app reacted, see readiness.py
+        self.readiness = readiness.ReadinessProbe()
+        self.color_preview_spot = None  # (x, y) from setup, shows the selected color
+        self.layer_panel_region = None  # (x1, y1, x2, y2) watched after New Layer clicks
+
+        # Stroke counters read by the progress overlay, which the window renders from its own loop
+        self.progress_channel = progress.ProgressChannel()
+        # Crash-safe checkpoints of full drawings, see journal.py
+        self.journal = journal.CheckpointJournal()
+        self._draw_journal = None
+        # Measured phases of past drawings, fitted into the drawing time estimate (see estimate.py)
+        self.run_history = estimate.RunHistory()
+        self._cost_model = None
+        self._cost_model_key = None
+        self._draw_phases = [0, 0, 0]  # ns spent in strokes, jumps and color switches
         self.progress_overlay_enabled = True  # Always enabled by default
-        self.overlay_window = None
-        self.overlay_update_thread = None
-        self.overlay_stop_event = None
 
-        pyautogui.PAUSE = 0.0
-        pyautogui.MINIMUM_DURATION = 0.01
+        if pyautogui is not None:
+            pyautogui.PAUSE = 0.0
+            pyautogui.MINIMUM_DURATION = 0.01
+
+    def set_input_backend(self, name):
+        '''
+        Switches to the named input backend. Falls back to pyautogui if the backend is
+        unavailable on this system. Returns the name of the backend in use.
+        '''
+        try:
+            self.input = backends.create_backend(name)
+        except InputBackendError as e:
+            input_log.warning(f"[Input] {e} - falling back to pyautogui")
+            self.input = backends.PyAutoGUIBackend()
+        input_log.info(f"[Input] Using {self.input.name} input backend")
+        return self.input.name
 
     def init_palette(self, colors_pos=None, prows=None, pcols=None, pbox=None, valid_positions=None, manual_centers=None) -> Palette:
 
@@ -220,16 +307,11 @@ class Bot:
         # Scan the custom colors spectrum to create a color-to-position map
         # This allows clicking on specific colors in the spectrum instead of using keyboard input
         self._spectrum_map = self._scan_spectrum(ccbox)
-        print(f"[Spectrum] Scanned {len(self._spectrum_map)} unique colors from custom colors spectrum")
+        calibration_log.info(f"[Spectrum] Scanned {len(self._spectrum_map)} unique colors from custom colors spectrum")
         
         # Load color calibration data if file exists
-        if os.path.exists('color_calibration.json'):
-            try:
-                with open('color_calibration.json', 'r') as f:
-                    calibration_json = json.load(f)
-                print(f"[Color Calibration] Loaded {len(calibration_json)} mapped colors")
-            except Exception as e:
-                print(f"[Color Calibration] Error loading calibration data: {e}")
+        if self.calibration_file():
+            self.load_color_calibration(self.calibration_file())
     
     def _scan_spectrum(self, ccbox):
         """
@@ -249,7 +331,7 @@ class Bot:
         sample_step = 4  # Sample every 4th pixel
         spectrum_map = {}
         
-        print(f"[Spectrum] Scanning spectrum box: ({left}, {top}, {width}, {height})")
+        calibration_log.info(f"[Spectrum] Scanning spectrum box: ({left}, {top}, {width}, {height})")
         
         for y in range(0, height, sample_step):
             for x in range(0, width, sample_step):
@@ -266,7 +348,7 @@ class Bot:
                     # Skip invalid pixels
                     continue
         
-        print(f"[Spectrum] Created spectrum map with {len(spectrum_map)} color positions")
+        calibration_log.info(f"[Spectrum] Created spectrum map with {len(spectrum_map)} color positions")
         return spectrum_map
     
     def _find_nearest_spectrum_color(self, target_color):
@@ -284,11 +366,15 @@ class Bot:
         )
         
         distance = Palette.dist(nearest_color, target_color)
-        print(f"[Spectrum] Target: {target_color}, Nearest found: {nearest_color}, Distance: {distance:.1f}")
+        calibration_log.debug("[Spectrum] Target: %s, Nearest found: %s, Distance: %.1f", target_color, nearest_color, distance)
         
         return self._spectrum_map[nearest_color]
     
-    def calibrate_custom_colors(self, grid_box: Any, preview_point: Any, step: int = 2) -> Dict[Tuple[int, int, int], Tuple[int, int]]:
+    def calibrate_custom_colors(self, grid_box: Any, preview_point: Any, step: int = 2, mode: str = 'grid',
+                                sweep_speed: float = 0, verify_points: int = 12, coarse_step: int = 16,
+                                target_delta_e: float = 5.0, sample_budget: int = 0, model_probes: Tuple[int, int] = (7, 5),
+                                model_max_residual: float = 6.0, model_fallback: str = 'grid',
+                                resume: bool = True) -> Dict[Tuple[int, int, int], Tuple[int, int]]:
         """
         Calibrate custom colors by scanning the color spectrum grid and recording
         the RGB values shown in the preview point at each grid position.
@@ -297,6 +383,21 @@ class Bot:
             grid_box: list/tuple [x1, y1, x2, y2] defining the color spectrum area
             preview_point: list/tuple [x, y] defining where the selected color is shown
             step: pixel step size for scanning (default 2)
+            mode: 'grid' visits every grid point, 'sweep' drags along the rows while
+                  sampling the preview continuously, 'adaptive' samples coarse to fine
+                  where the colors change (see calibration.py), 'model' fits an HSV/HSL
+                  model of the spectrum to a few probes (see spectrum.py)
+            sweep_speed: sweep speed in pixels per second, 0 to match the capture rate
+            verify_points: number of fixed points grabbed after a sweep to fit the display lag,
+                           or to check the fitted model
+            coarse_step: initial grid spacing of the adaptive mode
+            target_delta_e: adaptive cells are split until their colors differ by at most this
+            sample_budget: maximum samples of the adaptive mode, 0 for half of a uniform grid
+            model_probes: (columns, rows) of the probe grid the model is fitted to
+            model_max_residual: largest mean channel error of the model on the verification
+                                probes, a worse fit falls back to model_fallback mode
+            resume: continue a cancelled grid calibration of the same grid from the
+                    calibration store at the row it stopped at
         
         Returns:
             Dictionary mapping RGB tuples to (x, y) coordinates on the grid
@@ -334,25 +435,65 @@ class Bot:
         # Define the bbox for 1x1 pixel capture at preview point
         preview_bbox = (preview_x, preview_y, preview_x + 1, preview_y + 1)
         
-        print(f"[Calibration] Starting calibration of custom colors grid...")
-        print(f"[Calibration] Grid area: ({grid_x}, {grid_y}, {grid_width}, {grid_height})")
-        print(f"[Calibration] Preview point: ({preview_x}, {preview_y})")
-        print(f"[Calibration] Step size: {step}")
+        calibration_log.info(f"[Calibration] Starting calibration of custom colors grid...")
+        calibration_log.info(f"[Calibration] Grid area: ({grid_x}, {grid_y}, {grid_width}, {grid_height})")
+        calibration_log.info(f"[Calibration] Preview point: ({preview_x}, {preview_y})")
+        calibration_log.info(f"[Calibration] Step size: {step}")
+
+        # Saved with the map, next_row stays set until the run completes
+        self._calibration_meta = {
+            'grid_box': [grid_x, grid_y, grid_x + grid_width, grid_y + grid_height],
+            'preview_point': [preview_x, preview_y], 'step': step, 'mode': mode, 'next_row': grid_y
+        }
+        self.calibration_saved = False
+
+        if mode == 'model':
+            calibration_map = self._calibrate_model(grid_x, grid_y, grid_width, grid_height, preview_bbox, step,
+                                                    model_probes, verify_points, model_max_residual)
+            if calibration_map is not None or self.terminate:
+                return self._finish_calibration()
+            calibration_log.info(f"[Calibration] Falling back to {model_fallback} calibration")
+            mode = self._calibration_meta['mode'] = model_fallback
+        if mode == 'sweep':
+            self._calibrate_sweep(grid_x, grid_y, grid_width, grid_height, preview_bbox, step, sweep_speed, verify_points)
+            return self._finish_calibration()
+        if mode == 'adaptive':
+            self._calibrate_adaptive(grid_x, grid_y, grid_width, grid_height, preview_bbox, step,
+                                     coarse_step, target_delta_e, sample_budget)
+            return self._finish_calibration()
+
+        # Continue a cancelled run of the same grid where it stopped
+        first_row = grid_y
+        if resume:
+            try:
+                stored = self.calibration_store.load_partial()
+            except (OSError, ValueError) as e:
+                calibration_log.warning(f"[Calibration] Could not read calibration store: {e}")
+                stored = None
+            if stored is not None and not stored.complete and stored.next_row is not None and \
+                    stored.matches(self._calibration_meta['grid_box'], (preview_x, preview_y), step, mode):
+                self.color_calibration_map = dict(stored.calibration_map)
+                first_row = self._calibration_meta['next_row'] = stored.next_row
+                calibration_log.info(f"[Calibration] Resuming cancelled calibration at row {first_row} "
+                                     f"with {len(self.color_calibration_map)} colors already mapped")
         
         # Press mouse down at the start of grid (to grab the slider)
         start_x = grid_x
-        start_y = grid_y
-        pyautogui.mouseDown(start_x, start_y, button='left')
+        start_y = first_row
+        self.input.mouse_down(start_x, start_y, button='left')
+        self.input.flush()
         time.sleep(0.1)  # Small delay to ensure mouse is pressed
         
         # Track progress for console output
         total_steps = ((grid_width // step) + 1) * ((grid_height // step) + 1)
-        current_step = 0
+        current_step = len(range(grid_y, first_row, step)) * len(range(grid_x, grid_x + grid_width, step))
         last_progress = 0
         start_time = time.time()  # Track start time for ETA calculation
         
         # Loop through grid coordinates with step size
-        for y in range(grid_y, grid_y + grid_height, step):
+        for y in range(first_row, grid_y + grid_height, step):
+            # Progress up to the previous row survives a crash or cancel
+            self._checkpoint_calibration(y)
             for x in range(grid_x, grid_x + grid_width, step):
                 # Increment step counter
                 current_step += 1
@@ -384,36 +525,38 @@ class Bot:
                     else:
                         eta_str = "calculating..."
 
-                    print(f"[Calibration] Progress: {current_step}/{total_steps} ({progress_percent:.1f}%) - {len(self.color_calibration_map)} colors mapped - ETA: {eta_str}")
+                    calibration_log.info(f"[Calibration] Progress: {current_step}/{total_steps} ({progress_percent:.1f}%) - {len(self.color_calibration_map)} colors mapped - ETA: {eta_str}")
                     last_progress = progress_percent
                 # Check for termination (ESC key pressed)
                 if self.terminate:
-                    print("[Calibration] Calibration cancelled by user")
+                    calibration_log.info("[Calibration] Calibration cancelled by user")
                     # Release mouse before exiting
                     try:
-                        pyautogui.mouseUp(button='left')
+                        self.input.mouse_up(button='left')
                     except:
                         pass
-                    return self.color_calibration_map
+                    # The current row is scanned again on resume
+                    return self._cancel_calibration(y)
 
                 # Move mouse to the current grid position
-                pyautogui.moveTo(x, y)
+                self.input.move_to(x, y)
+                self.input.flush()  # The preview is sampled right away, the move must not stay queued
                 time.sleep(0.01)  # Small delay to allow UI to update
 
                 # Capture 1x1 pixel at preview point
                 try:
-                    pixel_img = ImageGrab.grab(bbox=preview_bbox)
-                    r, g, b = pixel_img.getpixel((0, 0))
+                    r, g, b = self._grab_preview(preview_bbox)
                     color = (r, g, b)
 
                     # Store the calibration data
                     self.color_calibration_map[color] = (x, y)
                 except Exception as e:
-                    print(f"[Calibration] Error capturing pixel at ({x}, {y}): {e}")
+                    calibration_log.warning(f"[Calibration] Error capturing pixel at ({x}, {y}): {e}")
                     continue
         
         # Release mouse up at the end
-        pyautogui.mouseUp(button='left')
+        self.input.mouse_up(button='left')
+        self.input.flush()
         
         # Calculate actual time and show completion message
         actual_time = time.time() - start_time
@@ -428,72 +571,308 @@ class Bot:
             minutes = int((actual_time % 3600) // 60)
             actual_str = f"{hours}:{minutes:02.0f}h"
         
-        print(f"[Calibration] Calibration complete. Mapped {len(self.color_calibration_map)} colors.")
-        print(f"[Calibration] Total time: {actual_str}")
+        # Positions of colors seen twice were overwritten in place, rebuild the index from scratch
+        self._calibration_index = None
+        self.calibration_index()
+        calibration_log.info(f"[Calibration] Calibration complete. Mapped {len(self.color_calibration_map)} colors.")
+        calibration_log.info(f"[Calibration] Total time: {actual_str}")
         
+        return self._finish_calibration()
+
+    def _checkpoint_calibration(self, next_row, force=False):
+        '''Saves the partial calibration map to the partial file, at most every few seconds unless forced'''
+        self._calibration_meta['next_row'] = next_row
+        try:
+            if force:
+                self.calibration_store.save(self.color_calibration_map, **self._calibration_meta)
+            else:
+                self.calibration_store.checkpoint(self.color_calibration_map, **self._calibration_meta)
+        except OSError as e:
+            calibration_log.warning(f"[Calibration] Could not save calibration progress: {e}")
+
+    def _finish_calibration(self):
+        '''Marks the calibration complete unless it was cancelled, saves it and returns the map'''
+        if self.terminate:
+            return self._cancel_calibration(self._calibration_meta['grid_box'][1])
+        self._calibration_meta['next_row'] = None
+        self.calibration_saved = self.save_color_calibration(self.calibration_store.path)
         return self.color_calibration_map
+
+    def _cancel_calibration(self, next_row):
+        '''
+        Saves the progress of a cancelled calibration to the partial file and goes back to the
+        saved calibration, if there is one. Returns the map of the cancelled run.
+        '''
+        self._checkpoint_calibration(next_row, force=True)
+        calibration_map = self.color_calibration_map
+        saved = self.calibration_file()
+        if saved is not None:
+            calibration_log.info(f"[Calibration] Keeping the saved calibration in {saved}")
+            self.load_color_calibration(saved)
+        return calibration_map
     
+    def _grab_preview(self, preview_bbox):
+        '''Returns the (r, g, b) color shown at the preview point'''
+        return ImageGrab.grab(bbox=preview_bbox).getpixel((0, 0))[:3]
+
+    def _calibrate_sweep(self, grid_x, grid_y, grid_width, grid_height, preview_bbox, step, speed=0, verify_points=12):
+        '''
+        Sweep calibration: drags along every step-th row of the spectrum, alternating direction,
+        while a PreviewSampler grabs the preview continuously. Returns the calibration map.
+        '''
+        sampler = calibration.PreviewSampler(lambda: self._grab_preview(preview_bbox))
+        scheduler = pacing.StrokeScheduler()
+        row_ys = list(range(grid_y, grid_y + grid_height, step))
+        columns = list(range(grid_x, grid_x + grid_width))
+        rows = []
+
+        self.input.mouse_down(grid_x, grid_y, button='left')
+        self.input.flush()
+        sampler.start()
+        start_time = time.time()
+        try:
+            time.sleep(0.1)  # Mouse press settles while the sampler measures the capture rate
+            if not speed:
+                # About one sample every step pixels
+                interval = sampler.interval() or 0.01
+                speed = min(max(step / interval, 50.0), 2000.0)
+            calibration_log.info(f"[Calibration] Sweep speed: {speed:.0f} px/s ({len(row_ys)} rows, about {len(row_ys) * len(columns) / speed:.0f}s)")
+
+            for n, y in enumerate(row_ys):
+                if self.terminate:
+                    calibration_log.info("[Calibration] Calibration cancelled by user")
+                    break
+                row = calibration.SweepRow(y)
+                xs = columns if n % 2 == 0 else columns[::-1]
+                row_start = time.perf_counter_ns()
+                for i, x in enumerate(xs):
+                    scheduler.wait_until(row_start + int(i / speed * 1e9))
+                    self.input.move_to(x, y)
+                    self.input.flush()  # The move is stamped when it was sent
+                    row.record(x)
+                rows.append(row)
+                self._calibration_progress['current'] = (n + 1) * (len(columns) // step + 1)
+                if n % 10 == 0:
+                    calibration_log.info(f"[Calibration] Sweep progress: row {n + 1}/{len(row_ys)} - {len(sampler.times)} samples")
+        finally:
+            sampler.stop()
+
+        times, colors = sampler.arrays()
+        lag = 0.0
+        verified = []
+        if not self.terminate:
+            # Verification pass: fixed points grabbed after the preview settled
+            for x, y in calibration.verification_points(grid_x, grid_width, [row.y for row in rows], verify_points):
+                self.input.move_to(x, y)
+                self.input.flush()
+                time.sleep(0.05)
+                try:
+                    verified.append((x, y, tuple(self._grab_preview(preview_bbox))))
+                except Exception as e:
+                    calibration_log.warning(f"[Calibration] Error capturing pixel at ({x}, {y}): {e}")
+            lag, error = calibration.fit_lag(times, colors, rows, verified)
+            calibration_log.info(f"[Calibration] Display lag {lag * 1000:.0f}ms, verified points off by {error:.1f}px on average")
+
+        try:
+            self.input.mouse_up(button='left')
+            self.input.flush()
+        except Exception:
+            pass
+
+        calibration_map = calibration.build_map(times, colors, rows, lag)
+        calibration_map.update({color: (x, y) for x, y, color in verified})
+        self.color_calibration_map = calibration_map
+        if sampler.errors:
+            calibration_log.warning(f"[Calibration] {sampler.errors} preview captures failed")
+        calibration_log.info(f"[Calibration] Sweep complete. Mapped {len(calibration_map)} colors from {len(times)} samples "
+                             f"in {self._format_time(time.time() - start_time)}")
+        self.calibration_index()
+        return calibration_map
+
+    def _calibrate_model(self, grid_x, grid_y, grid_width, grid_height, preview_bbox, step,
+                         probes=(7, 5), verify_points=12, max_residual=6.0):
+        '''
+        Model calibration: fits a spectrum.SpectrumModel to a small grid of probes and checks
+        it on verify_points random points. Returns the calibration map rendered from the model,
+        or None if the model does not describe the spectrum well enough.
+        '''
+        box = (grid_x, grid_y, grid_width, grid_height)
+        columns = np.linspace(grid_x, grid_x + grid_width - 1, max(int(probes[0]), 2)).round().astype(int)
+        rows = np.linspace(grid_y, grid_y + grid_height - 1, max(int(probes[1]), 2)).round().astype(int)
+        points = [(int(x), int(y)) for y in rows for x in columns]
+        rng = np.random.default_rng(0)
+        checks = [(int(rng.integers(grid_x, grid_x + grid_width)), int(rng.integers(grid_y, grid_y + grid_height)))
+                  for _ in range(verify_points)]
+        self._calibration_progress.update(total=len(points) + len(checks), current=0)
+
+        self.input.mouse_down(grid_x, grid_y, button='left')
+        self.input.flush()
+        time.sleep(0.1)  # Small delay to ensure mouse is pressed
+        colors = []
+        try:
+            for x, y in points + checks:
+                if self.terminate:
+                    calibration_log.info("[Calibration] Calibration cancelled by user")
+                    return None
+                self.input.move_to(x, y)
+                self.input.flush()
+                time.sleep(0.05)  # Few probes, let the preview settle fully
+                colors.append(self._grab_preview(preview_bbox))
+                self._calibration_progress['current'] += 1
+        finally:
+            try:
+                self.input.mouse_up(button='left')
+                self.input.flush()
+            except Exception:
+                pass
+
+        model = spectrum.SpectrumModel.fit([p[0] for p in points], [p[1] for p in points], colors[:len(points)], box)
+        residual = model.error([p[0] for p in checks], [p[1] for p in checks], colors[len(points):]) if checks else model.residual
+        calibration_log.info(f"[Calibration] Spectrum model {model.describe()} - error {model.residual:.1f} on probes, "
+                             f"{residual:.1f} on verification points")
+        if residual > max_residual:
+            calibration_log.info(f"[Calibration] Spectrum model error above {max_residual:g}, the spectrum is not analytic")
+            return None
+
+        self.color_calibration_map = model.render(step)
+        self.spectrum_model = model  # Set after the map, replacing the map drops the model
+        self.calibration_index()
+        calibration_log.info(f"[Calibration] Model calibration complete. Rendered {len(self.color_calibration_map)} colors.")
+        return self.color_calibration_map
+
+    def _calibrate_adaptive(self, grid_x, grid_y, grid_width, grid_height, preview_bbox, step,
+                            coarse_step=16, target_delta_e=5.0, budget=0):
+        '''
+        Adaptive calibration: samples a coarse grid and refines the cells where the preview
+        colors change, see calibration.adaptive_samples. Returns the calibration map and
+        keeps the coverage report in self.calibration_coverage.
+        '''
+        start_time = time.time()
+        self.input.mouse_down(grid_x, grid_y, button='left')
+        self.input.flush()
+        time.sleep(0.1)  # Small delay to ensure mouse is pressed
+
+        uniform = ((grid_width - 1) // step + 1) * ((grid_height - 1) // step + 1)
+        self._calibration_progress['total'] = budget or max(uniform // 2, 4)
+
+        def probe(x, y):
+            self.input.move_to(x, y)
+            self.input.flush()
+            time.sleep(0.01)  # Small delay to allow UI to update
+            self._calibration_progress['current'] += 1
+            return self._grab_preview(preview_bbox)
+
+        self._calibration_progress['current'] = 0
+        try:
+            samples, report = calibration.adaptive_samples(
+                probe, (grid_x, grid_y, grid_width, grid_height), step, coarse_step, target_delta_e, budget,
+                should_stop=lambda: self.terminate)
+        finally:
+            try:
+                self.input.mouse_up(button='left')
+                self.input.flush()
+            except Exception:
+                pass
+        if self.terminate:
+            calibration_log.info("[Calibration] Calibration cancelled by user")
+
+        # Same {(r, g, b): (x, y)} map as the grid calibration, so it saves and loads alike
+        calibration_map = {color: pos for pos, color in samples.items()}
+        self.color_calibration_map = calibration_map
+        self.calibration_coverage = report
+        calibration_log.info(f"[Calibration] Adaptive calibration complete. Mapped {len(calibration_map)} colors "
+                             f"in {self._format_time(time.time() - start_time)}")
+        calibration_log.info(f"[Calibration] Coverage: {report.summary()}")
+        self.calibration_index()
+        return calibration_map
+
     def save_color_calibration(self, filepath: str) -> bool:
         """
-        Save the color calibration map to a JSON file.
+        Save the color calibration map to a calibration store (see calibstore.py), or to a
+        JSON file of earlier versions if filepath ends in .json.
         
         Parameters:
-            filepath: Path to the JSON file to save
+            filepath: Path to the file to save
         
         Returns:
             True on success, False on failure
         """
         if self.color_calibration_map is None:
-            print("[Calibration] No calibration data to save.")
+            calibration_log.info("[Calibration] No calibration data to save.")
             return False
         
         try:
-            # Convert tuple keys to string format for JSON compatibility
-            calibration_json = {}
-            for (r, g, b), (x, y) in self.color_calibration_map.items():
-                key = f"{r},{g},{b}"
-                calibration_json[key] = [x, y]
-            
-            # Save to file
-            with open(filepath, 'w') as f:
-                json.dump(calibration_json, f, indent=2)
+            if filepath.endswith('.json'):
+                # Convert tuple keys to string format for JSON compatibility
+                calibration_json = {}
+                for (r, g, b), (x, y) in self.color_calibration_map.items():
+                    key = f"{r},{g},{b}"
+                    calibration_json[key] = [x, y]
+
+                # Save to file
+                with open(filepath, 'w') as f:
+                    json.dump(calibration_json, f, indent=2)
+            else:
+                meta = getattr(self, '_calibration_meta', None) or {}
+                model = self.spectrum_model.to_dict() if self.spectrum_model is not None else None
+                calibstore.CalibrationStore(filepath).save(self.color_calibration_map, model=model, **meta)
             
-            print(f"[Calibration] Calibration data saved to: {filepath}")
+            calibration_log.info(f"[Calibration] Calibration data saved to: {filepath}")
             return True
         except Exception as e:
-            print(f"[Calibration] Error saving calibration data: {e}")
+            calibration_log.warning(f"[Calibration] Error saving calibration data: {e}")
             return False
     
     def load_color_calibration(self, filepath: str) -> bool:
         """
-        Load color calibration data from a JSON file.
+        Load color calibration data from a calibration store or a JSON file of earlier versions.
         
         Parameters:
-            filepath: Path to the JSON file to load
+            filepath: Path to the file to load
         
         Returns:
             True on success, False on failure
         """
         try:
-            with open(filepath, 'r') as f:
-                calibration_json = json.load(f)
-            
-            # Convert string keys back to tuples
-            self.color_calibration_map = {}
-            for key, value in calibration_json.items():
-                # Parse the key "r,g,b" back to tuple
-                r, g, b = map(int, key.split(','))
-                self.color_calibration_map[(r, g, b)] = tuple(value)
+            model = None
+            if calibstore.is_store(filepath):
+                stored = calibstore.CalibrationStore(filepath).load()
+                calibration_map = stored.calibration_map
+                if stored.meta.get('model'):
+                    model = spectrum.SpectrumModel.from_dict(stored.meta['model'])
+                if not stored.complete:
+                    calibration_log.info(f"[Calibration] Calibration in {filepath} was cancelled at row {stored.next_row}, "
+                                         f"run it again to resume")
+            else:
+                with open(filepath, 'r') as f:
+                    calibration_json = json.load(f)
+
+                # Convert string keys back to tuples
+                calibration_map = {}
+                for key, value in calibration_json.items():
+                    # Parse the key "r,g,b" back to tuple
+                    r, g, b = map(int, key.split(','))
+                    calibration_map[(r, g, b)] = tuple(value)
+            self.color_calibration_map = calibration_map
+            self.spectrum_model = model
+            self.calibration_index()  # Built once here, not on the first color switch
             
-            print(f"[Calibration] Calibration data loaded from: {filepath}")
-            print(f"[Calibration] Loaded {len(self.color_calibration_map)} color mappings.")
+            calibration_log.info(f"[Calibration] Calibration data loaded from: {filepath}")
+            calibration_log.info(f"[Calibration] Loaded {len(self.color_calibration_map)} color mappings.")
             return True
         except FileNotFoundError:
-            print(f"[Calibration] Calibration file not found: {filepath}")
+            calibration_log.info(f"[Calibration] Calibration file not found: {filepath}")
             return False
         except Exception as e:
-            print(f"[Calibration] Error loading calibration data: {e}")
+            calibration_log.warning(f"[Calibration] Error loading calibration data: {e}")
             return False
+
+    def calibration_file(self):
+        '''Returns the path of the saved calibration: the store, else a JSON file of earlier versions, else None'''
+        for path in (self.calibration_store.path, LEGACY_CALIBRATION_FILE):
+            if os.path.exists(path):
+                return path
+        return None
     
     def get_calibrated_color_position(self, target_rgb: Tuple[int, int, int], tolerance: int = 20, k_neighbors: int = 4) -> Optional[Tuple[int, int]]:
         """
@@ -509,57 +888,69 @@ class Bot:
         Returns:
             (x, y) coordinates of the best match, or None if no calibration data exists
         """
+        if self.spectrum_model is not None:
+            # Model calibration, the position follows in closed form
+            pos = self.spectrum_model.position(target_rgb)
+            calibration_log.debug("[Calibration] Spectrum model position of %s: %s", target_rgb, pos)
+            return pos
+
         if self.color_calibration_map is None or not self.color_calibration_map:
-            print(f"[Calibration] ERROR: Calibration map is empty or None!")
+            calibration_log.debug("[Calibration] Calibration map is empty or None!")
             return None
         
-        print(f"[Calibration] Looking up target color {target_rgb}")
-        print(f"[Calibration] Calibration map has {len(self.color_calibration_map)} entries")
+        calibration_log.debug("[Calibration] Looking up target color %s in %d entries", target_rgb, len(self.color_calibration_map))
         
+        index = self.calibration_index()
+
         # First, try to find exact match within tolerance using Manhattan distance
-        for color, pos in self.color_calibration_map.items():
-            diff = abs(color[0] - target_rgb[0]) + abs(color[1] - target_rgb[1]) + abs(color[2] - target_rgb[2])
-            if diff <= tolerance:
-                # Found exact match within tolerance
-                print(f"[Calibration] Exact match found: {target_rgb} ~ {color} (diff={diff}) at {pos}")
-                return pos
-        
+        match = index.within(target_rgb, tolerance)
+        if match is not None:
+            color, diff, pos = match
+            calibration_log.debug("[Calibration] Exact match found: %s ~ %s (diff=%s) at %s", target_rgb, color, diff, pos)
+            return pos
+
         # If no exact match, use k-nearest neighbors with weighted spatial interpolation
         # This prevents distinct colors from all mapping to the same spot
-        color_distances = []
-        for color, pos in self.color_calibration_map.items():
-            # Calculate Euclidean distance in RGB space
-            distance = math.sqrt(
-                (color[0] - target_rgb[0]) ** 2 +
-                (color[1] - target_rgb[1]) ** 2 +
-                (color[2] - target_rgb[2]) ** 2
-            )
-            color_distances.append((distance, color, pos))
-        
-        # Sort by distance and get k nearest neighbors
-        color_distances.sort(key=lambda x: x[0])
-        neighbors = color_distances[:k_neighbors]
-        
+        neighbors = index.nearest(target_rgb, k_neighbors)
+
         # Calculate inverse distance weights (closer colors have more influence)
         # Add a small epsilon to prevent division by zero
         epsilon = 0.0001
         weights = [1.0 / (dist + epsilon) for dist, _, _ in neighbors]
         total_weight = sum(weights)
-        
+
         # Normalize weights
         normalized_weights = [w / total_weight for w in weights]
-        
+
         # Calculate weighted position
         weighted_x = sum(w * pos[0] for w, (_, _, pos) in zip(normalized_weights, neighbors))
         weighted_y = sum(w * pos[1] for w, (_, _, pos) in zip(normalized_weights, neighbors))
-        
+
         # Log the interpolation details
         nearest_color = neighbors[0][1]
         nearest_dist = neighbors[0][0]
-        print(f"[Calibration] Target: {target_rgb}, Nearest: {nearest_color} (dist={nearest_dist:.2f})")
-        print(f"[Calibration] Using {k_neighbors}-nearest interpolation to ({weighted_x:.1f}, {weighted_y:.1f})")
-        
+        calibration_log.debug("[Calibration] Target: %s, Nearest: %s (dist=%.2f), %d-nearest interpolation to (%.1f, %.1f)",
+                              target_rgb, nearest_color, nearest_dist, k_neighbors, weighted_x, weighted_y)
+
         return (int(weighted_x), int(weighted_y))
+
+    @property
+    def color_calibration_map(self):
+        return self._color_calibration_map
+
+    @color_calibration_map.setter
+    def color_calibration_map(self, value):
+        self._color_calibration_map = value
+        self._calibration_index = None  # Rebuilt for the new map on the next lookup
+        self.spectrum_model = None
+
+    def calibration_index(self):
+        '''Returns the spatial index of the calibration map, see colorindex.py'''
+        index = self._calibration_index
+        # The map is filled in place while calibrating, a size change means the index is stale
+        if index is None or index.size != len(self._color_calibration_map):
+            index = self._calibration_index = colorindex.ColorIndex(self._color_calibration_map)
+        return index
     
     # def test(self):
     #     box = self._canvas
@@ -568,642 +959,562 @@ class Bot:
     #         pyautogui.moveTo(l)
     #         time.sleep(.25)
 
-    def process(self, file, flags=0, mode=LAYERED):
+    def _stage_keys(self, image_hash, flags=0):
         '''
-        Processes the requested file as per the flags submitted and returns 
-        a table mapping each color to a list of lines that are to be drawn on 
-        the canvas. Each line contains both starting and terminating coordinates.
+        Returns the cache key of every intermediate pipeline stage. Each key hashes the inputs
+        of its own stage together with the key of the stage before it, so that changing e.g.
+        the mode or IGNORE_WHITE only recomputes the stages downstream of it.
         '''
-        
-        self.terminate = False
-        step = int(self.settings[Bot.STEP])
-        img = Image.open(file).convert('RGBA')
-
-        try:
-            x, y, cw, ch = self._canvas  # type: ignore[union-attr]
-        except:
-            raise NoCanvasError('Bot could not continue because canvas is not initialized')
-
-        tw, th = tuple(int(p // step) for p in utils.adjusted_img_size(img, (cw, ch)))
-        xo = x = x + ((cw - tw * step) // 2)    # Center the drawing correctly
-        y += ((ch - th * step) // 2)
-    
-        try:
-            # Try newer PIL syntax
-            img_small = img.resize((tw, th), resample=Image.Resampling.NEAREST)
-        except AttributeError:
-            # Fallback to older PIL syntax
-            img_small = img.resize((tw, th), resample=Image.NEAREST)  # type: ignore
-        pix = img_small.load()
-        w, h = img_small.size
-        size = w * h
-        start = xo, y
-
-        nearest_colors = dict()
-        cmap = dict()
-
-        col_freq = dict()
-        table_lines = list()
-        table_colors = list()
-
-        old_col = None
-
-        # Create interval size from normalized accuracy value
-        # Also setting a lower bound value of 1 to prevent interval_size from reaching 0
-        interval_size = max((1 - self.settings[Bot.ACCURACY]) * 255, 1)
-
-        for i in range(h):
-            if mode is Bot.LAYERED:
-                table_lines.append(list())
-                table_colors.append(set())
-
-            x = xo  # Reset x to start of row
-            for j in range(w):
-                r, g, b = pix[j, i][:3]
-                col = near = (r, g, b)
-
-                # DESIGNATING COLOR OF THE CURRENT PIXEL
-                # Deciding what to do with new RGB triplet
-                if (r, g, b) not in nearest_colors:
-                    if flags & Bot.USE_CUSTOM_COLORS:
-                        # # Find the nearest custom color previously used, if any
-                        # if len(cmap.keys()) > 0:
-                        #     near = min(cmap.keys(), key=lambda c : Palette.dist(c, near))
-                        # # Find the euclidean distance of the furthest color
-                        # max_dist = sum( max( 255 - col[i], col[i] - 0) ** 2 for i in range(len(col)) ) 
-                        # col = near if (max_dist - Palette.dist(near, col)) / max_dist >= self.settings[Bot.ACCURACY] else col
-
-                        # Obtain the closest color
-                        # round(color_component / interval_size) * interval_size
-                        col = tuple(int(round(v / interval_size) * interval_size) for v in col)
-                    else:
-                        # Find the nearest color from the palette
-                        col = self._palette.nearest_color((r, g, b))
-
-                    # Save the nearest color for this RGB triplet to avoid recomputing it
-                    nearest_colors[(r, g, b)] = col
-                else:
-                    col = nearest_colors[(r, g, b)]
-
-                # DESIGNATING COLOR LINES
-                # End brush stroke when...
-                # 1. a new color is encountered 
-                # 2. the brush is at the end of the row
-                if j == w - 1 or (old_col != None and old_col != col):
-                    end = (x, y)
-                    if mode is Bot.SLOTTED and not (old_col == (255, 255, 255) and flags & Bot.IGNORE_WHITE):
-                        lines = cmap.get(old_col, [])
-                        lines.append( (start, end) )
-                        cmap[old_col] = lines
-                    if mode is Bot.LAYERED:
-                        table_lines[i].append((old_col, (start, end)))
-                        table_colors[i].add(old_col)
-                        col_freq[old_col] = col_freq.get(old_col, 0) + end[0] - start[0] + 1
-                    start = (xo, y + step) if j == w - 1 else (x + step, y)
-                
-                self.progress = 100 * (i * w + (j + 1)) / size
-
-                old_col = col
-                x += step
-
-            x = xo
-            y += step
-        
-        if mode is Bot.SLOTTED:
-            return cmap
+        custom = bool(flags & Bot.USE_CUSTOM_COLORS)
+        stages = (
+            ('grid', {'image': image_hash, 'step': int(self.settings[Bot.STEP]), 'canvas_size': [int(self._canvas[2]), int(self._canvas[3])]}),
+            ('quant', dict(self._quantization_inputs(custom), palette=None if custom else self._palette_fingerprint())),
+            ('runs', {})
+        )
 
-        # Sort colors in decreasing order of their frequency and maintain a height level index for each color
-        col_freq = tuple(k for k, _ in sorted(col_freq.items(), key=lambda item : item [1], reverse=True))
-        col_index = {col_freq[i]: i for i in range(len(col_freq))}     
-    
-        # This loop will attempt to merge lines in favour of reducing the number of brush strokes when drawing.
-        # Lines of lower layer colors can be easily merged into fewer strokes since they will be repainted over
-        # again by colors from a higher layer
-        for idc, col in enumerate(col_freq):
-            for idr, row in enumerate(table_lines):
-                if col not in table_colors[idr] or (col == (255, 255, 255) and flags & Bot.IGNORE_WHITE):
-                    continue
+        keys, parent = {}, ''
+        for stage, inputs in stages:
+            parent = hashlib.md5(f"{parent}_{stage}_{json.dumps(inputs, sort_keys=True)}".encode()).hexdigest()[:8]
+            keys[stage] = f"{image_hash}_{stage}_{parent}.npz"
+        return keys
+
+    def _cached_stage(self, key, compute):
+        '''Loads the arrays of a pipeline stage from the cache, or computes and stores them'''
+        path = self.cache.path(key)
+        # Hold the entry lock so concurrent batch workers compute each stage only once
+        with self.cache.lock(key):
+            if self.cache.contains(key):
+                try:
+                    with np.load(path) as data:
+                        arrays = {k: data[k] for k in data.files}
+                    self.cache.record_lookup(key, True)
+                    return arrays
+                except (OSError, ValueError, KeyError):
+                    pass
 
-                start, end, exposed = None, None, False
-                for idl, line in enumerate(row):
-                    if idc <= col_index[line[0]]:
-                        start = line[1][0] if start is None else start
-                        end = line[1][1]
-                        exposed = exposed or idc == col_index[line[0]]
-                    if start is not None and (idc > col_index[line[0]] or idl == len(row) - 1):
-                        if exposed:
-                            lines = cmap.get(col, [])
-                            lines.append((start, end))
-                            cmap[col] = lines
-                        start, exposed = None, False
+            self.cache.record_lookup(key, False)
+            arrays = compute()
+            with atomic_write(path, 'wb') as f:
+                np.savez(f, **arrays)
+            self.cache.add(key)
+            return arrays
+
+    def _calibrated_quantization(self):
+        '''True if custom colors are clustered to the calibration map, which needs a calibration'''
+        return self.custom_quantization == 'calibrated' and bool(self.color_calibration_map)
+
+    def _quantization_inputs(self, custom):
+        '''The settings that change how custom colors are quantized, for cache keys'''
+        if not custom:
+            return {'custom': False, 'accuracy': None}
+        if self._calibrated_quantization():
+            return {'custom': True, 'accuracy': None, 'quantization': 'calibrated',
+                    'color_count': int(self.custom_color_count), 'calibration': self.calibration_index().digest()}
+        return {'custom': True, 'accuracy': round(float(self.settings[Bot.ACCURACY]), 6)}
+
+    def _quantize(self, grid, flags=0):
+        '''Quantizes an RGB grid to custom colors or to the palette'''
+        if flags & Bot.USE_CUSTOM_COLORS and self._calibrated_quantization():
+            # Only colors the calibrated spectrum actually shows, so every color switch is distinct
+            index = self.calibration_index()
+            snap = lambda c: index.nearest(np.rint(c), 1)[0][1]
+            nearest = pipeline.cluster_quantizer(grid, max(int(self.custom_color_count), 1), snap)
+        elif flags & Bot.USE_CUSTOM_COLORS:
+            if self.custom_quantization == 'calibrated':
+                draw_log.warning("[Colors] Calibrated quantization needs a color calibration, using the accuracy interval")
+            nearest = pipeline.interval_quantizer(self.settings[Bot.ACCURACY])
+        elif self._palette is not None:
+            # Find the nearest color from the palette
+            nearest = self._palette.nearest_color
+        else:
+            raise NoPaletteError('Bot could not continue because palette is not initialized')
 
-        return cmap
+        index, colors = pipeline.quantize_grid(grid, nearest)
+        return {'index': index, 'colors': np.array(colors, dtype=np.int32).reshape(-1, 3)}
 
-    def draw(self, cmap):
+    def _layout_runs(self, runs, colors, origin, flags=0, mode=LAYERED):
         '''
-        Draws the image as per the coordinates of the processed cmap table.
-        Depending upon the selection of colors used, the bot will choose
-        from either the standard palette or custom color option accordingly.
-        Supports pause/resume functionality and configurable jump delays.
+        Turns a run table into a list of (color, strokes) pairs in drawing order, where strokes
+        is an (n, 4) int32 array of (x1, y1, x2, y2). Lines are placed starting from origin,
+        one pixel step per grid cell.
         '''
+        step = int(self.settings[Bot.STEP])
+        colors = [tuple(c) for c in colors.tolist()]
+        skip = None
+        if flags & Bot.IGNORE_WHITE and (255, 255, 255) in colors:
+            skip = colors.index((255, 255, 255))
 
-        # Calculate total strokes for progress tracking (must be before overlay creation)
-        self.total_strokes = sum(len(lines) for lines in cmap.values())
-        self.start_time = time.time()
-        self.completed_strokes = 0
-
-        # Load calibration data if file exists - always load if file exists to ensure latest data is used
-        if os.path.exists('color_calibration.json'):
-            if self.color_calibration_map is None or not self.color_calibration_map:
-                print("[Calibration] Loading calibration data from color_calibration.json")
-                self.load_color_calibration('color_calibration.json')
-            else:
-                print(f"[Calibration] Calibration data already loaded from color_calibration.json ({len(self.color_calibration_map)} colors)")
+        if mode == Bot.SLOTTED:
+            plan = pipeline.slot_runs(runs, skip)
         else:
-            print("[Calibration] No calibration data available")
+            plan = pipeline.merge_runs(runs, step, skip)
+
+        xo, yo = origin
+        layout = []
+        for ci, lines in plan.items():
+            lines = np.array(lines, dtype=np.int64).reshape(-1, 3)
+            strokes = np.empty((len(lines), 4), dtype=np.int32)
+            strokes[:, 0] = xo + lines[:, 1] * step
+            strokes[:, 1] = yo + lines[:, 0] * step
+            strokes[:, 2] = xo + lines[:, 2] * step
+            strokes[:, 3] = strokes[:, 1]
+            layout.append((colors[ci], strokes))
+        return layout
 
-        # Create progress overlay window
-        self.create_progress_overlay()
-        if self.overlay_window:
-            self.update_progress_overlay(0, self.total_strokes, 0)
+    @staticmethod
+    def _layout_to_cmap(layout):
+        '''Converts (color, strokes) pairs into the color table used by draw()'''
+        return {
+            col: [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in strokes.tolist()]
+            for col, strokes in layout
+        }
 
-        # Reset bot state for fresh drawing session
+    def _plan_layout(self, file, flags=0, mode=LAYERED):
+        '''
+        Runs the cached pipeline stages for file and returns the plan as (color, strokes)
+        pairs with coordinates relative to the canvas origin.
+        '''
         self.terminate = False
-        self.paused = False
-        self.drawing = True  # Mark as actively drawing
-        last_stroke_end = None  # Track last stroke position for jump detection
-        self.estimated_time_seconds = self._estimate_drawing_time_seconds(cmap)
-        estimated_str = self._format_time(self.estimated_time_seconds)
-        print(f"Estimated drawing time: {estimated_str}")
-
-        for color_idx, (c, lines) in enumerate(cmap.items()):
-            # Skip the first color if skip_first_color is enabled
-            if color_idx == 0 and self.skip_first_color:
-                print(f"[Skip First Color] Skipping first color: {c}")
-                continue
+        step = int(self.settings[Bot.STEP])
 
-            # Skip colors already drawn if resuming
-            if color_idx < self.draw_state['color_idx']:
-                continue
+        try:
+            _, _, cw, ch = self._canvas  # type: ignore[union-attr]
+        except:
+            raise NoCanvasError('Bot could not continue because canvas is not initialized')
 
-            # If resuming and we have a specific color to resume with, use that instead
-            if self.draw_state['current_color'] is not None and color_idx == self.draw_state['color_idx']:
-                c = self.draw_state['current_color']
-                print(f"Resuming with saved color {c}")
+        with open(file, 'rb') as f:
+            image_hash = hashlib.md5(f.read()).hexdigest()[:8]
+        keys = self._stage_keys(image_hash, flags)
 
-            # Log color change with cached coordinate info
-            num_strokes = len(lines)
-            print(f"Switching to color {c} - {num_strokes} cached coordinate points")
+        self.progress = 0
+        grid = self._cached_stage(keys['grid'], lambda: {'grid': pipeline.decode_grid(file, (cw, ch), step)})['grid']
+        self.progress = 25
+        quant = self._cached_stage(keys['quant'], lambda: self._quantize(grid, flags))
+        self.progress = 50
+        runs = self._cached_stage(keys['runs'], lambda: {'runs': pipeline.build_runs(quant['index'])})['runs']
+        self.progress = 75
+
+        # Center the drawing correctly
+        layout = self._layout_runs(runs, quant['colors'], pipeline.grid_origin(grid, (cw, ch), step), flags, mode)
+        self.progress = 100
+        return layout
 
-            # If New Layer is enabled, click the new-layer button with modifiers
-            # Skip on first color when skip_first_color is enabled
-            try:
-                nl = self.new_layer
-                if nl.get('enabled') and nl.get('coords') and not (color_idx == 0 and self.skip_first_color):
-                    nx, ny = nl['coords']
-                    print(f"[NewLayer] attempting click at {(nx, ny)} with mods={nl.get('modifiers')}")
-
-                    # Track which modifiers were pressed so we can release them in reverse order
-                    pressed_modifiers = []
-
-                    # Press modifiers immediately before the click
-                    modifier_keys = [('ctrl', 'ctrl'), ('alt', 'alt'), ('shift', 'shift')]
-                    for mod_key, pygui_key in modifier_keys:
-                        if nl['modifiers'].get(mod_key):
-                            pyautogui.keyDown(pygui_key)
-                            pressed_modifiers.append(pygui_key)
-                            print(f"[NewLayer] pressed modifier: {pygui_key}")
-
-                    # Click the button with modifiers active
-                    print(f"[NewLayer] performing mouseDown at {(nx, ny)}")
-                    pyautogui.mouseDown(nx, ny, button='left')
-                    time.sleep(0.08)
-                    pyautogui.mouseUp(nx, ny, button='left')
-                    print(f"[NewLayer] mouse click performed at {(nx, ny)}")
+    def process(self, file, flags=0, mode=LAYERED):
+        '''
+        Processes the requested file as per the flags submitted and returns 
+        a table mapping each color to a list of lines that are to be drawn on 
+        the canvas. Each line contains both starting and terminating coordinates.
+        The decoded grid, quantized grid and run table are cached as separate stages.
+        '''
+        layout = self._plan_layout(file, flags, mode)
+        x, y = self._canvas[0], self._canvas[1]
+        return Bot._layout_to_cmap((col, strokes + np.array([x, y, x, y], dtype=np.int32)) for col, strokes in layout)
 
-                    # Release modifiers immediately after the click with robust handling
-                    for pygui_key in reversed(pressed_modifiers):
-                        pyautogui.keyUp(pygui_key)
-                        print(f"[NewLayer] released modifier: {pygui_key}")
-                        time.sleep(0.05)  # Small delay to ensure each key release is registered
+    def _draw_target(self, file, flags=0):
+        '''
+        Returns (planned index grid, color table, grid origin relative to the canvas) of file
+        from the cached pipeline stages, the reference a finished drawing is verified against.
+        '''
+        step = int(self.settings[Bot.STEP])
+        try:
+            _, _, cw, ch = self._canvas  # type: ignore[union-attr]
+        except:
+            raise NoCanvasError('Bot could not continue because canvas is not initialized')
 
-                    # Brute-force release all modifiers as backup (in case tracked list missed any)
-                    try:
-                        pyautogui.keyUp('shift')
-                        time.sleep(0.05)
-                        pyautogui.keyUp('alt')
-                        time.sleep(0.05)
-                        pyautogui.keyUp('ctrl')
-                        time.sleep(0.05)
-                        print(f"[NewLayer] force-released all modifiers as backup")
-                    except:
-                        pass
+        with open(file, 'rb') as f:
+            image_hash = hashlib.md5(f.read()).hexdigest()[:8]
+        keys = self._stage_keys(image_hash, flags)
+        grid = self._cached_stage(keys['grid'], lambda: {'grid': pipeline.decode_grid(file, (cw, ch), step)})['grid']
+        quant = self._cached_stage(keys['quant'], lambda: self._quantize(grid, flags))
+        runs = self._cached_stage(keys['runs'], lambda: {'runs': pipeline.build_runs(quant['index'])})['runs']
+        index = verify.planned_grid(runs, quant['index'].shape)
+        return index, quant['colors'], pipeline.grid_origin(grid, (cw, ch), step)
+
+    def capture_canvas(self):
+        '''Returns a screenshot of the canvas as an (h, w, 3) array'''
+        image = self.input.capture(self._canvas)
+        if image is not None:
+            return image  # The backend renders its own screen (simulation)
+        x, y, w, h = self._canvas
+        return np.asarray(ImageGrab.grab(bbox=(x, y, x + w, y + h)).convert('RGB'))
+
+    def verify_canvas(self, index, colors, origin, tolerance=40, skip=None):
+        '''Captures the canvas and returns the bool grid of cells that do not show their target color'''
+        sampled = verify.sample_cells(self.capture_canvas(), index.shape, origin, int(self.settings[Bot.STEP]))
+        return verify.mismatch_grid(sampled, index, colors, tolerance, skip)
+
+    def touch_up(self, file, flags=0, passes=2, tolerance=40, settle=0.3):
+        '''
+        Verifies the drawing of file on the canvas and draws touch-up strokes over the cells
+        that do not match the quantized target, then verifies again, up to passes times.
+        Waits settle seconds before every capture so the app can finish rendering.
+        Returns (result, reports) with one VerifyReport per verification.
+        '''
+        index, colors, origin = self._draw_target(file, flags)
+        color_list = [tuple(c) for c in colors.tolist()]
+        skip = None
+        if flags & Bot.IGNORE_WHITE and (255, 255, 255) in color_list:
+            skip = color_list.index((255, 255, 255))
+
+        reports = []
+        # Touch-ups must draw every color, including the one skipped as background. The
+        # estimate of the drawing itself is kept for its time report
+        skip_first_color, self.skip_first_color = self.skip_first_color, False
+        estimated_time_seconds = getattr(self, 'estimated_time_seconds', None)
+        try:
+            for pass_no in range(passes + 1):
+                time.sleep(settle)
+                mismatch = self.verify_canvas(index, colors, origin, tolerance, skip)
+                report = verify.VerifyReport(pass_no, mismatch, index, colors)
+                reports.append(report)
+                draw_log.info(f"[Verify] {report.summary()}")
+                if not report.mismatched or pass_no == passes:
+                    break
 
-                    # Additional delay to ensure OS processes all key release events
-                    time.sleep(0.1)
+                runs = verify.touchup_runs(index, mismatch)
+                x, y = self._canvas[0], self._canvas[1]
+                layout = self._layout_runs(runs, colors, (origin[0] + x, origin[1] + y), 0, Bot.SLOTTED)
+                draw_log.info(f"[Verify] Touch-up {pass_no + 1}: {len(runs)} strokes")
+                self.draw_state.update(color_idx=0, line_idx=0, segment_idx=0, current_color=None)
+                result = self.draw(Bot._layout_to_cmap(layout), checkpoint=False)
+                if result != 'success':
+                    return result, reports
+        finally:
+            self.skip_first_color = skip_first_color
+            if estimated_time_seconds is not None:
+                self.estimated_time_seconds = estimated_time_seconds
+        return 'success', reports
+
+    def _readiness_region(self, kind):
+        '''
+        Screen region the readiness probe watches after a click: the layer panel after New
+        Layer, the custom colors box after the color dialog opens or closes and the color
+        preview spot after a color click. None if that region is not configured; the clicked
+        button itself is never watched, its own hover and press feedback would end the wait
+        before the app reacted.
+        '''
+        if kind == 'new_layer' and self.layer_panel_region:
+            return tuple(self.layer_panel_region)
+        if kind == 'dialog' and self._custom_colors is not None:
+            x, y, w, h = self._custom_colors
+            return (x, y, x + w, y + h)
+        if kind == 'preview' and self.color_preview_spot:
+            return self.readiness.square(self.color_preview_spot)
+        return None
+
+    def _compile_ready(self, b, region, timeout):
+        '''Lowers a wait of timeout seconds that ends early once region reacted'''
+        if region is not None and self.readiness.enabled:
+            b.ready(region, timeout)
+        else:
+            b.wait(timeout)
 
-                    # Wait for the target app to process the click (without modifiers active)
-                    time.sleep(0.75)
+    def _compile_helper_click(self, b, config, tag, region=None):
+        '''
+        Lowers a click on one of the helper buttons (New Layer, Color Button, Color Button
+        Okay) with its modifier keys held down. Modifiers are released in reverse order and
+        then all of them once more as a backup. The baseline of the readiness region is
+        taken right before the click.
+        '''
+        x, y = config['coords']
+        if region is not None and self.readiness.enabled:
+            b.mark(region)
+        pressed_modifiers = []
+        for mod_key in ('ctrl', 'alt', 'shift'):
+            if config['modifiers'].get(mod_key):
+                b.key_down(mod_key)
+                pressed_modifiers.append(mod_key)
+
+        b.move(x, y)
+        b.down()
+        b.wait(0.08)
+        b.move(x, y)
+        b.up()
+
+        for mod_key in reversed(pressed_modifiers):
+            b.key_up(mod_key)
+            b.wait(0.05)  # Small delay to ensure each key release is registered
+        for mod_key in ('shift', 'alt', 'ctrl'):
+            b.key_up(mod_key)
+            b.wait(0.05)
+
+        # Additional delay to ensure OS processes all key release events
+        b.wait(0.1)
+        draw_log.debug("[%s] click at %s with mods=%s", tag, (x, y), pressed_modifiers)
+
+    def _color_entry_focus(self):
+        '''Center of the custom colors box, clicked to focus the dialog before a color is typed in'''
+        try:
+            cc_box = self._custom_colors
+            return cc_box[0] + cc_box[2] // 2, cc_box[1] + cc_box[3] // 2
+        except TypeError:
+            raise NoCustomColorsError('Bot could not continue because custom colors are not initialized')
 
-                    # Wait at least 0.75 seconds before starting to paint to ensure new layer is ready
-                    print(f"[NewLayer] waiting 0.75 seconds before painting...")
-                    time.sleep(0.75)
+    def resolve_colors(self, colors):
+        '''
+        Resolves how every color of a plan is selected in one batch, see colorindex.ColorResolution.
+        Spectrum positions are looked up for all colors at once and cached with the plan, keyed by
+        the colors, the palette and the calibration.
+        '''
+        colors = [tuple(int(v) for v in c) for c in colors]
+        # When Color Button Okay is enabled the color is always picked in the spectrum before clicking okay
+        okay_mode = self.color_button_okay.get('enabled', False)
+        on_palette = [not okay_mode and self._palette is not None and c in self._palette.colors for c in colors]
+        spectrum_colors = np.array([c for c, p in zip(colors, on_palette) if not p], dtype=np.int64).reshape(-1, 3)
+
+        if self.spectrum_model is not None:
+            model = self.spectrum_model
+            found = [model.position(c) for c in spectrum_colors.tolist()]
+            shown = model.color_at([p[0] for p in found], [p[1] for p in found]) if found else np.zeros((0, 3))
+            spectrum = np.array(found, dtype=np.int64).reshape(-1, 2), np.sqrt(((shown - spectrum_colors) ** 2).sum(axis=1))
+        elif self.color_calibration_map and len(spectrum_colors):
+            index = self.calibration_index()
+            inputs = {'colors': hashlib.md5(spectrum_colors.tobytes()).hexdigest(), 'calibration': index.digest(), 'tolerance': 20}
+            key = f"resolve_{hashlib.md5(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:12]}.npz"
+
+            def compute():
+                # Use tolerance of 20 (same as calibration default) to ensure accurate color selection
+                positions, distances = index.resolve(spectrum_colors, tolerance=20)
+                return {'positions': positions, 'distances': distances}
 
+            try:
+                arrays = self._cached_stage(key, compute)
+            except OSError as e:
+                cache_log.warning(f"[Cache] Could not cache color resolution: {e}")
+                arrays = compute()
+            spectrum = arrays['positions'], arrays['distances']
+        else:
+            spectrum = None
+
+        fallback = 'none' if self.calibration_file() else 'keyboard'
+        sources, positions, distances, j = [], [], [], 0
+        for c, palette in zip(colors, on_palette):
+            if palette:
+                sources.append('palette')
+                positions.append(self._palette.colors_pos[c])
+                distances.append(0.0)
+            elif spectrum is not None:
+                sources.append('spectrum')
+                positions.append(spectrum[0][j])
+                distances.append(float(spectrum[1][j]))
+                j += 1
+            else:
+                sources.append(fallback)
+                positions.append(None)
+                distances.append(0.0)
+        return colorindex.ColorResolution(colors, sources, positions, distances, self.gamut_tolerance)
+
+    def _compile_color_selection(self, b, c, resolution=None):
+        '''Lowers the selection of color c from the palette, the calibrated spectrum or the keyboard fallback'''
+        delay = self.color_button.get('delay', 0.1)
+        mspaint = self.mspaint_mode.get('enabled', False)
+        mspaint_delay = self.mspaint_mode.get('delay', 0.5)
+        okay_mode = self.color_button_okay.get('enabled', False)
+
+        if resolution is None:
+            resolution = self.resolve_colors([c])
+        source, pos = resolution.get(c)
+
+        if pos:
+            region = self._readiness_region('preview')
+            if region is not None and self.readiness.enabled:
+                b.mark(region)
+            # MSPaint Mode: double-click instead of single click (palette, or spectrum in okay mode)
+            if mspaint and (source == 'palette' or okay_mode):
+                b.click(*pos)
+                b.wait(mspaint_delay)
+            b.click(*pos)
+            # Without a color preview spot there is nothing to watch, the fixed delay is used
+            self._compile_ready(b, region, delay)
+            return f"{source} click at {tuple(pos)}"
+
+        # Skip the keyboard input method if the user already selected colors manually (calibration exists)
+        if source == 'none':
+            return "none (color calibration file exists - skipping keyboard input method)"
+        self.color_entry.enter(b, c, self._color_entry_focus())
+        return f"keyboard input ({self.color_entry.method})"
+
+    def _compile_switch(self, b, c, resolution):
+        '''Lowers the switch procedure of color c: New Layer, Color Button, the selection and Color Button Okay'''
+        nl = self.new_layer
+        if nl.get('enabled') and nl.get('coords'):
+            try:
+                region = self._readiness_region('new_layer')
+                self._compile_helper_click(b, nl, 'NewLayer', region)
+                # Wait until the layer panel shows the new layer, or 1.5 seconds without a layer panel region
+                self._compile_ready(b, region, 1.5)
             except Exception as e:
-                print(f"[NewLayer] Error during new layer creation: {e}")
-                # Ensure modifiers are released even if there's an error
-                try:
-                    pyautogui.keyUp('shift')
-                    pyautogui.keyUp('alt')
-                    pyautogui.keyUp('ctrl')
-                except:
-                    pass
+                draw_log.warning(f"[NewLayer] Error during new layer creation: {e}")
 
-            # If Color Button Mode is enabled, click the color button with modifiers before palette selection
+        cb = self.color_button
+        if cb.get('enabled') and cb.get('coords'):
             try:
-                cb = self.color_button
-                if cb.get('enabled') and cb.get('coords'):
-                    cx, cy = cb['coords']
-                    print(f"[ColorButton] attempting click at {(cx, cy)} with mods={cb.get('modifiers')}, delay={cb.get('delay')}")
-
-                    # Track which modifiers were pressed so we can release them in reverse order
-                    pressed_modifiers = []
-
-                    # Press modifiers immediately before the click
-                    modifier_keys = [('ctrl', 'ctrl'), ('alt', 'alt'), ('shift', 'shift')]
-                    for mod_key, pygui_key in modifier_keys:
-                        if cb['modifiers'].get(mod_key):
-                            pyautogui.keyDown(pygui_key)
-                            pressed_modifiers.append(pygui_key)
-                            print(f"[ColorButton] pressed modifier: {pygui_key}")
-
-                    # Click the button with modifiers active
-                    print(f"[ColorButton] performing mouseDown at {(cx, cy)}")
-                    pyautogui.mouseDown(cx, cy, button='left')
-                    time.sleep(0.08)
-                    pyautogui.mouseUp(cx, cy, button='left')
-                    print(f"[ColorButton] mouse click performed at {(cx, cy)}")
-
-                    # Release modifiers immediately after the click with robust handling
-                    for pygui_key in reversed(pressed_modifiers):
-                        pyautogui.keyUp(pygui_key)
-                        print(f"[ColorButton] released modifier: {pygui_key}")
-                        time.sleep(0.05)  # Small delay to ensure each key release is registered
-
-                    # Brute-force release all modifiers as backup (in case tracked list missed any)
-                    try:
-                        pyautogui.keyUp('shift')
-                        time.sleep(0.05)
-                        pyautogui.keyUp('alt')
-                        time.sleep(0.05)
-                        pyautogui.keyUp('ctrl')
-                        time.sleep(0.05)
-                        print(f"[ColorButton] force-released all modifiers as backup")
-                    except:
-                        pass
-
-                    # Additional delay to ensure OS processes all key release events
-                    time.sleep(0.1)
-
-                    # Wait for the configured delay after clicking the color button
-                    delay = cb.get('delay', 0.1)
-                    print(f"[ColorButton] waiting {delay} seconds before palette selection...")
-                    time.sleep(delay)
-
+                region = self._readiness_region('dialog')
+                self._compile_helper_click(b, cb, 'ColorButton', region)
+                self._compile_ready(b, region, cb.get('delay', 0.1))
             except Exception as e:
-                print(f"[ColorButton] Error during color button click: {e}")
-                # Ensure modifiers are released even if there's an error
-                try:
-                    pyautogui.keyUp('shift')
-                    pyautogui.keyUp('alt')
-                    pyautogui.keyUp('ctrl')
-                except:
-                    pass
+                draw_log.warning(f"[ColorButton] Error during color button click: {e}")
 
-            # DEBUG: Log color selection details
-            print(f"[DEBUG] Selecting color: {c}")
-            print(f"[DEBUG] Color in palette: {self._palette is not None and c in self._palette.colors}")
-            print(f"[DEBUG] Color Button enabled: {self.color_button.get('enabled', False)}")
-            print(f"[DEBUG] Color Button Okay enabled: {self.color_button_okay.get('enabled', False)}")
-            print(f"[DEBUG] Custom colors box: {self._custom_colors}")
-            
-            # Only perform automatic color selection if Color Button Okay is NOT enabled
-            # When Color Button Okay is enabled, user is expected to manually select=color
-            if not self.color_button_okay.get('enabled', False):
-                # Check if palette exists and color is in palette before accessing it
-                if self._palette is not None and c in self._palette.colors:
-                    px, py = self._palette.colors_pos[c]
-                    print(f"[DEBUG] Using palette click at: {(px, py)}")
-                    
-                    # MSPaint Mode: Double-click on palette instead of single click
-                    if self.mspaint_mode.get('enabled', False):
-                        # First click
-                        pyautogui.click((px, py))
-                        # Wait for configured delay between clicks
-                        mspaint_delay = self.mspaint_mode.get('delay', 0.5)
-                        print(f"[MSPaintMode] Waiting {mspaint_delay} seconds between double-click...")
-                        time.sleep(mspaint_delay)
-                        # Second click on the same position
-                        pyautogui.click((px, py))
-                        print(f"[MSPaintMode] Double-click completed at {(px, py)}")
-                        # Use color button delay after double-click
-                        delay = self.color_button.get('delay', 0.1)
-                        print(f"[DEBUG] Waiting {delay} seconds after palette double-click...")
-                        time.sleep(delay)
-                    else:
-                        # Simple click (original behavior)
-                        pyautogui.click((px, py))
-                        # Wait for application to register=color selection
-                        delay = self.color_button.get('delay', 0.1)
-                        print(f"[DEBUG] Waiting {delay} seconds after palette click...")
-                        time.sleep(delay)
-                else:
-                    # Try to find the color in the spectrum map with tolerance
-                    # Use tolerance of 20 (same as calibration default) to ensure accurate color selection
-                    spectrum_pos = self.get_calibrated_color_position(c, tolerance=20)
-                    if spectrum_pos:
-                        print(f"[DEBUG] Using spectrum click at: {spectrum_pos}")
-                        pyautogui.click(spectrum_pos)
-                        # Wait for the application to register the color selection (use same delay as color button)
-                        delay = self.color_button.get('delay', 0.1)
-                        print(f"[DEBUG] Waiting {delay} seconds after spectrum click...")
-                        time.sleep(delay)
-                    else:
-                        # Check if manual color selection occurred (color_calibration.json exists)
-                        # If so, skip the keyboard input method since user already selected the color
-                        if not os.path.exists('color_calibration.json'):
-                            # Fallback to keyboard input method
-                            try:
-                                cc_box = self._custom_colors
-                                center_x = cc_box[0] + cc_box[2] // 2
-                                center_y = cc_box[1] + cc_box[3] // 2
-                                print(f"[DEBUG] Spectrum not available - clicking center of box at: ({center_x}, {center_y})")
-                                pyautogui.click((center_x, center_y), clicks=3, interval=.15)
-                            except:
-                                raise NoCustomColorsError('Bot could not continue because custom colors are not initialized')
-                            print(f"[DEBUG] Using keyboard input method - typing RGB: {c}")
-                            pyautogui.press('tab', presses=7, interval=.05)
-                            for val in c:
-                                numbers = (d for d in str(val))
-                                for n in numbers:
-                                    pyautogui.press(str(n))
-                                pyautogui.press('tab')
-                            pyautogui.press('tab')
-                            pyautogui.press('enter')
-                            pyautogui.PAUSE = 0.0
-                        else:
-                            print(f"[DEBUG] Color calibration file exists - skipping keyboard input method")
-            else:
-                # Color Button Okay is enabled, but we still need to select color in spectrum before clicking okay
-                print(f"[DEBUG] Color Button Okay enabled - selecting color in spectrum before clicking okay")
-                
-                # Try to find the color in the spectrum map
-                spectrum_pos = self.get_calibrated_color_position(c, tolerance=20)
-                if spectrum_pos:
-                    print(f"[DEBUG] Using spectrum click at: {spectrum_pos}")
-                    
-                    # MSPaint Mode: Double-click on spectrum instead of single click
-                    if self.mspaint_mode.get('enabled', False):
-                        # First click
-                        pyautogui.click(spectrum_pos)
-                        # Wait for configured delay between clicks
-                        mspaint_delay = self.mspaint_mode.get('delay', 0.5)
-                        print(f"[MSPaintMode] Waiting {mspaint_delay} seconds between double-click...")
-                        time.sleep(mspaint_delay)
-                        # Second click on the same position
-                        pyautogui.click(spectrum_pos)
-                        print(f"[MSPaintMode] Double-click completed at {spectrum_pos}")
-                        # Use color button delay after double-click
-                        delay = self.color_button.get('delay', 0.1)
-                        print(f"[DEBUG] Waiting {delay} seconds after spectrum double-click...")
-                        time.sleep(delay)
-                    else:
-                        # Simple click (original behavior)
-                        pyautogui.click(spectrum_pos)
-                        # Wait for the application to register the color selection (use same delay as color button)
-                        delay = self.color_button.get('delay', 0.1)
-                        print(f"[DEBUG] Waiting {delay} seconds after spectrum click...")
-                        time.sleep(delay)
-                else:
-                    # Check if manual color selection occurred (color_calibration.json exists)
-                    # If so, skip keyboard input method since user already selected the color
-                    if not os.path.exists('color_calibration.json'):
-                        # Fallback to keyboard input method
-                        try:
-                            cc_box = self._custom_colors
-                            center_x = cc_box[0] + cc_box[2] // 2
-                            center_y = cc_box[1] + cc_box[3] // 2
-                            print(f"[DEBUG] Spectrum not available - clicking center of box at: ({center_x}, {center_y})")
-                            pyautogui.click((center_x, center_y), clicks=3, interval=.15)
-                        except:
-                            raise NoCustomColorsError('Bot could not continue because custom colors are not initialized')
-                        print(f"[DEBUG] Using keyboard input method - typing RGB: {c}")
-                        pyautogui.press('tab', presses=7, interval=.05)
-                        for val in c:
-                            numbers = (d for d in str(val))
-                            for n in numbers:
-                                pyautogui.press(str(n))
-                                pyautogui.press('tab')
-                        pyautogui.press('tab')
-                        pyautogui.press('enter')
-                        pyautogui.PAUSE = 0.0
-                    else:
-                        print(f"[DEBUG] Color calibration file exists - skipping keyboard input method")
+        method = self._compile_color_selection(b, c, resolution)
 
-            # If Color Button Okay Mode is enabled, click "Set Okay" button after color selection
+        cbo = self.color_button_okay
+        if cbo.get('enabled') and cbo.get('coords'):
             try:
-                cbo = self.color_button_okay
-                if cbo.get('enabled') and cbo.get('coords'):
-                    cx, cy = cbo['coords']
-                    print(f"[ColorButtonOkay] attempting click at {(cx, cy)} with mods={cbo.get('modifiers')}")
-
-                    # Track which modifiers were pressed so we can release them in reverse order
-                    pressed_modifiers = []
-
-                    # Press modifiers immediately before the click
-                    modifier_keys = [('ctrl', 'ctrl'), ('alt', 'alt'), ('shift', 'shift')]
-                    for mod_key, pygui_key in modifier_keys:
-                        if cbo['modifiers'].get(mod_key):
-                            pyautogui.keyDown(pygui_key)
-                            pressed_modifiers.append(pygui_key)
-                            print(f"[ColorButtonOkay] pressed modifier: {pygui_key}")
-
-                    # Click the button with modifiers active
-                    print(f"[ColorButtonOkay] performing mouseDown at {(cx, cy)}")
-                    pyautogui.mouseDown(cx, cy, button='left')
-                    time.sleep(0.08)
-                    pyautogui.mouseUp(cx, cy, button='left')
-                    print(f"[ColorButtonOkay] mouse click performed at {(cx, cy)}")
+                region = self._readiness_region('dialog')
+                self._compile_helper_click(b, cbo, 'ColorButtonOkay', region)
+                self._compile_ready(b, region, cbo.get('delay', 0.1))
+            except Exception as e:
+                draw_log.warning(f"[ColorButtonOkay] Error during color button okay click: {e}")
+        return method
 
-                    # Release modifiers immediately after the click with robust handling
-                    for pygui_key in reversed(pressed_modifiers):
-                        pyautogui.keyUp(pygui_key)
-                        print(f"[ColorButtonOkay] released modifier: {pygui_key}")
-                        time.sleep(0.05)  # Small delay to ensure each key release is registered
+    def compile_tape(self, cmap):
+        '''
+        Lowers cmap together with the color switch procedure of every color (New Layer,
+        Color Button, palette/spectrum/keyboard selection, Color Button Okay) into an
+        EventTape with precomputed timings. See tape.py.
+        '''
+        b = tape.TapeBuilder()
+        colors, color_offsets, stroke_offsets, stroke_counts = [], [], [], []
+        last_end = None
 
-                    # Brute-force release all modifiers as backup (in case tracked list missed any)
-                    try:
-                        pyautogui.keyUp('shift')
-                        time.sleep(0.05)
-                        pyautogui.keyUp('alt')
-                        time.sleep(0.05)
-                        pyautogui.keyUp('ctrl')
-                        time.sleep(0.05)
-                        print(f"[ColorButtonOkay] force-released all modifiers as backup")
-                    except:
-                        pass
+        # Every color is placed before the first event, colors the calibration cannot reach are reported now
+        resolution = self.color_resolution = self.resolve_colors(cmap.keys())
+        draw_log.info(f"[Colors] {len(resolution)} colors: {resolution.summary()}")
+        for c, distance in resolution.out_of_gamut:
+            draw_log.warning(f"[Colors] {c} is outside the calibrated gamut, the nearest calibrated color is {distance:.0f} away")
 
-                    # Additional delay to ensure OS processes all key release events
-                    time.sleep(0.1)
+        for color_idx, (c, lines) in enumerate(cmap.items()):
+            strokes = Bot._stroke_array(lines, absolute=True)
+            colors.append(tuple(int(v) for v in c))
+            stroke_counts.append(len(strokes))
 
-                    # Wait for the configured delay after clicking the "Set Okay" button (use same delay as Color Button)
-                    delay = self.color_button_okay.get('delay', 0.1)
-                    print(f"[ColorButtonOkay] waiting {delay} seconds before starting to draw...")
-                    time.sleep(delay)
+            # Skip the first color if skip_first_color is enabled
+            if color_idx == 0 and self.skip_first_color:
+                draw_log.info(f"[Skip First Color] Skipping first color: {c}")
+                color_offsets.append(-1)
+                stroke_offsets.append(np.full(len(strokes), -1, dtype=np.int64))
+                continue
 
-            except Exception as e:
-                print(f"[ColorButtonOkay] Error during color button okay click: {e}")
-                # Ensure modifiers are released even if there's an error
-                try:
-                    pyautogui.keyUp('shift')
-                    pyautogui.keyUp('alt')
-                    pyautogui.keyUp('ctrl')
-                except:
-                    pass
+            color_offsets.append(len(b))
+            b.color(color_idx)
+            method = self._compile_switch(b, c, resolution)
+            draw_log.debug("[Tape] Color %s: %s, %d strokes", c, method, len(strokes))
 
-            for line_idx, line in enumerate(lines):
-                # Skip lines already drawn if resuming
-                if color_idx == self.draw_state['color_idx'] and line_idx < self.draw_state['line_idx']:
-                    continue
+            first_stroke = sum(stroke_counts[:-1])
+            stroke_offsets.append(b.strokes(strokes, first_stroke, self.settings[Bot.DELAY],
+                                            self.settings[Bot.JUMP_DELAY], self.jump_threshold, last_end))
+            if len(strokes):
+                last_end = strokes[-1, 2:].tolist()
 
-                # Update progress and calculate estimates
-                self.completed_strokes += 1
-                strokes_remaining = self.total_strokes - self.completed_strokes
-
-                # Calculate elapsed time and estimate remaining time
-                elapsed_time = time.time() - self.start_time
-                if self.completed_strokes > 0:
-                    avg_time_per_stroke = elapsed_time / self.completed_strokes
-                    estimated_remaining = strokes_remaining * avg_time_per_stroke
-
-                    # Format time remaining
-                    if estimated_remaining < 60:
-                        time_remaining = f"{estimated_remaining:.1f}s"
-                    elif estimated_remaining < 3600:
-                        minutes = int(estimated_remaining // 60)
-                        seconds = estimated_remaining % 60
-                        time_remaining = f"{minutes}:{seconds:02.0f}"
-                    else:
-                        hours = int(estimated_remaining // 3600)
-                        minutes = int((estimated_remaining % 3600) // 60)
-                        time_remaining = f"{hours}:{minutes:02.0f}h"
-                else:
-                    time_remaining = "calculating..."
-
-                # Log stroke progress with time remaining and strokes left
-                progress_percent = ((line_idx + 1) / len(lines)) * 100
-                print(f"Drawing stroke {line_idx + 1}/{len(lines)} for color {c} - {progress_percent:.1f}% complete")
-                print(f"Total progress: {self.completed_strokes}/{self.total_strokes} strokes - {time_remaining} remaining")
-
-                # Update overlay with progress and ETA
-                if self.overlay_window:
-                    self.update_progress_overlay(self.completed_strokes, self.total_strokes, estimated_remaining)
-
-                # Check for large cursor jumps and add delay
-                start_pos = line[0]
-                if last_stroke_end is not None:
-                    jump_distance = ((start_pos[0] - last_stroke_end[0]) ** 2 + (start_pos[1] - last_stroke_end[1]) ** 2) ** 0.5
-                    if jump_distance > self.jump_threshold:
-                        print(f"Large jump detected ({jump_distance:.1f} pixels) - adding {self.settings[Bot.JUMP_DELAY]}s delay")
-                        time.sleep(self.settings[Bot.JUMP_DELAY])
-
-                # Wait if paused - detect when we come out of pause for stroke replay
-                was_paused = False
-                while self.paused and not self.terminate:
-                    was_paused = True
-                    # Ensure any stuck modifier keys are released during pause
-                    try:
-                        pyautogui.keyUp('shift')
-                        pyautogui.keyUp('alt')
-                        pyautogui.keyUp('ctrl')
-                    except:
-                        pass  # Ignore errors if keys are already released
-                    time.sleep(0.1)  # Small delay to avoid busy waiting
+        stroke_offsets = np.concatenate(stroke_offsets) if stroke_offsets else []
+        compiled = b.build(colors, color_offsets, stroke_offsets, stroke_counts)
+        draw_log.info(f"[Tape] Compiled {len(compiled)} events for {compiled.total_strokes} strokes in {len(colors)} colors")
+        return compiled
 
-                # If we just came out of pause, mark for stroke replay
-                if was_paused:
-                    self.draw_state['was_paused'] = True
+    def draw(self, cmap, checkpoint=True):
+        '''
+        Draws the image as per the coordinates of the processed cmap table.
+        Depending upon the selection of colors used, the bot will choose
+        from either the standard palette or custom color option accordingly.
+        Supports pause/resume functionality and configurable jump delays.
+        With checkpoint set, progress is journaled so the drawing survives a crash.
+        '''
+        compiled = self.prepare_draw(cmap)
+        return self.draw_tape(compiled, checkpoint=checkpoint)
 
-                if self.terminate:
-                    pyautogui.mouseUp()
-                    self.drawing = False  # Clear drawing flag on termination
-                    self.close_progress_overlay()  # Close overlay on termination
-                    return 'terminated'
+    def prepare_draw(self, cmap):
+        '''Loads the calibration data and compiles cmap into an EventTape for draw_tape()'''
+        # Load calibration data if file exists - always load if file exists to ensure latest data is used
+        calibration_file = self.calibration_file()
+        if calibration_file:
+            if self.color_calibration_map is None or not self.color_calibration_map:
+                calibration_log.info(f"[Calibration] Loading calibration data from {calibration_file}")
+                self.load_color_calibration(calibration_file)
+            else:
+                calibration_log.info(f"[Calibration] Calibration data already loaded from {calibration_file} ({len(self.color_calibration_map)} colors)")
+        else:
+            calibration_log.info("[Calibration] No calibration data available")
 
-                # Draw line with pause support (complete each stroke before checking pause)
-                end_pos = (line[1][0], line[1][1])
+        return self.compile_tape(cmap)
 
-                # Calculate distance
-                dx = end_pos[0] - start_pos[0]
-                dy = end_pos[1] - start_pos[1]
-                distance = (dx**2 + dy**2)**0.5
+    def find_checkpoint(self, compiled):
+        '''Returns the journaled Checkpoint of an unfinished drawing of the same tape, or None'''
+        if not self.journal.enabled:
+            return None
+        return self.journal.last(compiled.digest())
 
-                if distance < 1:  # Very short line
-                    pyautogui.moveTo(start_pos)
-                    pyautogui.dragTo(end_pos[0], end_pos[1], 0, button='left')
-                else:
-                    # Break into segments for smooth drawing
-                    segments = max(2, min(10, int(distance / 10)))  # 2-10 segments based on length
-                    segment_delay = self.settings[Bot.DELAY] / segments
-
-                    pyautogui.moveTo(start_pos)
-                    pyautogui.mouseDown(button='left')
-
-                    # Always replay the current stroke when resuming from pause
-                    start_segment = 1
-                    if self.draw_state.get('was_paused', False):
-                        print(f"Replaying stroke after pause - ensuring clean result")
-                        self.draw_state['was_paused'] = False
-
-                    for i in range(start_segment, segments + 1):
-                        # Calculate next position
-                        t = i / segments
-                        next_x = start_pos[0] + dx * t
-                        next_y = start_pos[1] + dy * t
-
-                        pyautogui.moveTo(next_x, next_y)
-                        time.sleep(segment_delay / segments)  # Distribute delay
-
-                    pyautogui.mouseUp()
-
-                # Check for pause after completing the stroke
-                if self.paused or self.terminate:
-                    # Save current state for resume
-                    self.draw_state['color_idx'] = color_idx
-                    self.draw_state['line_idx'] = line_idx
-                    self.draw_state['segment_idx'] = 0  # Stroke completed, so reset segment
-                    self.draw_state['current_color'] = c  # Save current color
-                    if self.terminate:
-                        self.close_progress_overlay()  # Close overlay on termination
-                        return 'terminated'
-                    # Wait for resume
-                    print("Paused after completing stroke - press resume to continue")
-                    while self.paused and not self.terminate:
-                        time.sleep(0.1)
-                    if self.terminate:
-                        self.close_progress_overlay()  # Close overlay on termination
-                        return 'terminated'
-                    # Resume - replay the current stroke to ensure clean result
-                    print(f"Resuming - replaying current stroke for color {c}")
-                    self.draw_state['was_paused'] = True
+    def draw_tape(self, compiled, estimated_seconds=None, checkpoint=False):
+        '''
+        Replays a compiled EventTape. Resumes from self.draw_state (color and line index)
+        if it is set. Termination is honoured between events whenever no mouse button or key
+        is held down, a pause only before a stroke or a color switch, where no click is
+        pending while the cursor may be moved; after a pause the last stroke is drawn again.
+        With checkpoint set, the position is journaled every few strokes (see journal.py).
+        Without estimated_seconds the estimate of the cost model fitted to past drawings is
+        used. Completed drawings that started from the beginning are added to its history.
+        '''
+        self.start_time = time.time()
+        self.progress_channel.begin(compiled.total_strokes)
+        self.pacer.reset()
+        self.readiness.reset()
+        self._start_adaptive_pacing()
+        color_idx, line_idx = self.draw_state['color_idx'], self.draw_state['line_idx']
+        resumed = bool(color_idx or line_idx)
+        if resumed:
+            self.progress_channel.completed = compiled.first_stroke(color_idx) + line_idx - compiled.first_stroke(1 if self.skip_first_color else 0)
+        self._draw_journal = None
+        if checkpoint and self.journal.enabled:
+            # A resumed drawing records the position it resumes from before anything else happens
+            self.journal.begin(compiled.digest(), compiled.total_strokes,
+                               (color_idx, line_idx, self.progress_channel.completed) if resumed else None)
+            self._draw_journal = self.journal
 
-                # Update last stroke position for jump detection
-                last_stroke_end = end_pos
+        # Reset bot state for fresh drawing session
+        self.control.reset()
+        self.drawing = True  # Mark as actively drawing
+        self.estimated_time_range = None
+        if estimated_seconds is None:
+            estimated_seconds, low, high = self.estimate_tape(compiled)
+            self.estimated_time_range = (low, high)
+        self.estimated_time_seconds = estimated_seconds
+        estimated_str = self._format_estimate()
+        draw_log.info(f"Estimated drawing time: {estimated_str}")
+        self._draw_phases = [0, 0, 0]
+
+        if resumed:
+            # Resume: switch to the saved color again, then continue at the saved line
+            first = compiled.first_stroke(color_idx)
+            start = int(compiled.color_offsets[color_idx])
+            draw_log.info(f"Resuming with color {compiled.colors[color_idx]} at stroke {line_idx + 1}")
+            result, last_stroke = self._replay(compiled, start, int(compiled.stroke_offsets[first]))
+            if result == 'success':
+                result, last_stroke = self._replay(compiled, int(compiled.stroke_offsets[first + line_idx]), len(compiled))
+        else:
+            result, last_stroke = self._replay(compiled, 0, len(compiled))
+
+        if result == 'terminated':
+            self.input.mouse_up()
+            self.input.flush()
+            # Save current state for resume
+            if last_stroke >= 0:
+                color_idx, line_idx = compiled.stroke_position(last_stroke)
+                self.draw_state['color_idx'] = color_idx
+                self.draw_state['line_idx'] = line_idx
+                self.draw_state['segment_idx'] = 0  # Stroke completed, so reset segment
+                self.draw_state['current_color'] = compiled.colors[color_idx]
+                if self._draw_journal is not None:
+                    self._draw_journal.record(color_idx, line_idx, self.progress_channel.completed)
+            if self._draw_journal is not None:
+                self._draw_journal.close()  # Kept, so the drawing can be resumed after a restart
+            self._save_adaptive_pacing()
+            self.drawing = False  # Clear drawing flag on termination
+            self.progress_channel.end()
+            return 'terminated'
 
         # Calculate actual time and show comparison
         actual_time = time.time() - self.start_time
         actual_str = self._format_time(actual_time)
-        estimated_str = self._format_time(self.estimated_time_seconds)
+        estimated_str = self._format_estimate()
         
         # Calculate difference (positive = saved time, negative = extra time)
         diff_seconds = self.estimated_time_seconds - actual_time
@@ -1212,15 +1523,24 @@ class Bot:
         else:
             diff_str = f"Extra: {self._format_time(abs(diff_seconds))}"
         
-        print("=" * 50)
-        print(f"Drawing completed!")
-        print(f"Estimated: {estimated_str}")
-        print(f"Actual:   {actual_str}")
-        print(f"{diff_str}")
-        print("=" * 50)
+        draw_log.info("=" * 50)
+        draw_log.info(f"Drawing completed!")
+        draw_log.info(f"Estimated: {estimated_str}")
+        draw_log.info(f"Actual:   {actual_str}")
+        draw_log.info(f"{diff_str}")
+        draw_log.info(f"Pacing:   {self.pacer.stats.summary()}")
+        if self.readiness.stats.waits:
+            draw_log.info(f"Readiness: {self.readiness.stats.summary()}")
+        if self.adaptive_pacing is not None:
+            draw_log.info(f"Adaptive: {self.adaptive_pacing.summary()}")
+        draw_log.info("=" * 50)
         
-        # Close progress overlay
-        self.close_progress_overlay()
+        self.progress_channel.end()
+        if self._draw_journal is not None:
+            self._draw_journal.finish()
+        self._save_adaptive_pacing()
+        if not resumed and not self.input.virtual_clock:
+            self._record_run(compiled)
         
         # Reset draw state on successful completion
         self.drawing = False  # Clear drawing flag
@@ -1231,6 +1551,360 @@ class Bot:
         self.draw_state['was_paused'] = False
         return 'success'
 
+    def _replay(self, compiled, start, stop):
+        '''
+        Executes events start..stop of a tape. The tape arrays are converted to lists, which are
+        much faster to index one by one, a window of REPLAY_WINDOW events at a time so that the
+        memory used does not grow with the tape. Returns (result, last stroke index).
+        '''
+        backend, pacer, stats, keys = self.input, self.pacer, self.pacer.stats, compiled.keys
+        probe, probes, baselines = self.readiness, compiled.probes, {}
+        channel = self.progress_channel
+        checkpoints = self._draw_journal
+        adaptive = self.adaptive_pacing
+        # Stroke segment and jump waits are scaled by adaptive pacing
+        scale = adaptive.scale if adaptive is not None else 1.0
+        next_check = channel.completed + adaptive.check_every if adaptive is not None else 0
+        perf_counter_ns = time.perf_counter_ns
+        # Simulated backends keep their own clock, waits are handed to them instead of spent
+        virtual = backend.virtual_clock
+        MOVE, WAIT, DOWN, UP, KEY_DOWN, KEY_UP, STROKE = tape.MOVE, tape.WAIT, tape.DOWN, tape.UP, tape.KEY_DOWN, tape.KEY_UP, tape.STROKE
+        JUMP_WAIT = tape.JUMP_WAIT
+        buttons_down, keys_down, redrawn = 0, set(), set()
+        deadline = stroke_start = perf_counter_ns()
+        # Time per phase for the run history: 0 strokes, 1 jumps, 2 color switches up to switch_end
+        phases, phase, phase_start, switch_end = self._draw_phases, 0, deadline, -1
+        last_stroke = -1
+        next_report = time.time() + self.progress_interval
+        if checkpoints is not None:
+            next_checkpoint = channel.completed + checkpoints.every_strokes
+            checkpoint_deadline = time.time() + checkpoints.every_seconds
+        # Checked once, per-stroke records are only created when the draw logger is at DEBUG level
+        log_strokes = draw_log.isEnabledFor(logging.DEBUG)
+
+        running = self.control.go.is_set
+        tape_ops, tape_args, window = compiled.ops, compiled.args, Bot.REPLAY_WINDOW
+        base = end = 0
+        i = start
+        while i < stop:
+            if not running() and not buttons_down and not keys_down and \
+                    (self.control.terminated or self._at_pause_point(compiled, i)):
+                if self.control.terminated:
+                    return 'terminated', last_stroke
+                phases[phase] += perf_counter_ns() - phase_start
+                i = self._pause_replay(compiled, i, start)
+                if adaptive is not None:
+                    adaptive.cancel()  # The canvas sample of the next stroke may be stale
+                deadline = phase_start = perf_counter_ns()
+                continue
+
+            if not base <= i < end:
+                # Also taken after jumping back to replay a stroke
+                base, end = i, min(stop, i + window)
+                ops, args = tape_ops[base:end].tolist(), tape_args[base:end].tolist()
+            k = i - base
+            op = ops[k]
+            if op == MOVE:
+                backend.move_to(*args[k])
+            elif op == WAIT:
+                seconds, kind = args[k]
+                if kind:
+                    seconds *= scale
+                    if kind == JUMP_WAIT and phase != 1:
+                        now_ns = perf_counter_ns()
+                        phases[phase] += now_ns - phase_start
+                        phase, phase_start = 1, now_ns
+                # Deadlines are absolute since the last press/release, so late events catch up
+                if virtual or (buttons_down and backend.server_timed):
+                    backend.sleep(seconds)
+                else:
+                    deadline += int(seconds * 1e9)
+                    lateness = pacer.wait_until(deadline)
+                    if buttons_down:
+                        stats.waits += 1
+                        if lateness > pacer.late_ns:
+                            stats.late_waits += 1
+            elif op == DOWN:
+                backend.mouse_down(button='left')
+                buttons_down += 1
+                deadline = stroke_start = perf_counter_ns()
+                if phase and i > switch_end:
+                    phases[phase] += stroke_start - phase_start
+                    phase, phase_start = 0, stroke_start
+            elif op == UP:
+                backend.mouse_up(button='left')
+                backend.flush()
+                buttons_down = max(0, buttons_down - 1)
+                deadline = perf_counter_ns()
+            elif op == KEY_DOWN:
+                key = int(args[k][0])
+                backend.key_down(keys[key])
+                keys_down.add(key)
+                deadline = perf_counter_ns()
+            elif op == KEY_UP:
+                key = int(args[k][0])
+                backend.key_up(keys[key])
+                keys_down.discard(key)
+                deadline = perf_counter_ns()
+            elif op == STROKE:
+                stroke, target = args[k]
+                if target >= 0 and not virtual:
+                    stats.record_stroke(int(target * scale * 1e9), perf_counter_ns() - stroke_start)
+                last_stroke = int(stroke)
+                # The overlay reads the counter on its own schedule, so a stroke only costs this increment
+                channel.completed += 1
+                if log_strokes:
+                    draw_log.debug("Drew stroke %d/%d", channel.completed, channel.total)
+                now = time.time()
+                if now >= next_report:
+                    next_report = now + self.progress_interval
+                    self._report_draw_progress()
+                if checkpoints is not None and (channel.completed >= next_checkpoint or now >= checkpoint_deadline):
+                    checkpoints.record(*compiled.stroke_position(last_stroke), channel.completed)
+                    next_checkpoint = channel.completed + checkpoints.every_strokes
+                    checkpoint_deadline = now + checkpoints.every_seconds
+                if adaptive is not None and (adaptive.pending is not None or channel.completed >= next_check):
+                    if adaptive.pending is None:
+                        self._prepare_stroke_check(compiled, i + 1, stop)
+                        next_check = channel.completed + adaptive.check_every
+                    elif adaptive.verify(last_stroke) is False and last_stroke not in redrawn:
+                        # Missed: draw it again at the slower rate
+                        redrawn.add(last_stroke)
+                        channel.completed -= 1
+                        i = max(start, int(compiled.stroke_offsets[last_stroke]))
+                        scale = adaptive.scale
+                        deadline = perf_counter_ns()
+                        continue
+                    scale = adaptive.scale
+            elif op == tape.MARK:
+                region = int(args[k][0])
+                if not virtual:
+                    baselines[region] = probe.sample(probes[region])
+            elif op == tape.READY:
+                region, timeout = args[k]
+                if virtual:
+                    backend.sleep(timeout)  # Nothing to watch, the fixed delay is simulated
+                else:
+                    probe.wait(probes[int(region)], baselines.pop(int(region), None), timeout)
+                deadline = perf_counter_ns()
+            elif op == tape.TYPE:
+                backend.write(keys[int(args[k][0])], args[k][1])
+                deadline = perf_counter_ns()
+            elif op == tape.CLIP:
+                backend.copy(keys[int(args[k][0])])
+            elif op == tape.COLOR:
+                color_idx = int(args[k][0])
+                now_ns = perf_counter_ns()
+                phases[phase] += now_ns - phase_start
+                phase, phase_start = 2, now_ns
+                # The switch procedure ends where the first stroke of the color begins
+                switch_end = int(compiled.stroke_offsets[compiled.first_stroke(color_idx)]) if compiled.stroke_counts[color_idx] else stop
+                draw_log.info(f"Switching to color {compiled.colors[color_idx]} - {compiled.stroke_counts[color_idx]} strokes")
+            i += 1
+
+        phases[phase] += perf_counter_ns() - phase_start
+        self._report_draw_progress()
+        return 'success', last_stroke
+
+    def _prepare_stroke_check(self, compiled, i, stop):
+        '''Finds the points of the next stroke on the tape and lets adaptive pacing sample the canvas under them'''
+        # Events i.. relative to i, one more than scanned for the STROKE marker after the stroke
+        ops, args = compiled.ops[i:min(stop, i + 65)].tolist(), compiled.args[i:min(stop, i + 65)].tolist()
+        down, points = False, []
+        for j in range(min(len(ops), 64)):
+            op = ops[j]
+            if op == tape.DOWN:
+                down = True
+            elif op == tape.MOVE:
+                if down:
+                    points.append(args[j])
+            elif op == tape.UP:
+                break
+            elif op != tape.WAIT:
+                return  # Color switch ahead, the canvas sample would be stale
+        else:
+            return
+        if not points or j + 1 >= len(ops) or ops[j + 1] != tape.STROKE:
+            return
+        stroke = int(args[j + 1][0])
+        color_idx, _ = compiled.stroke_position(stroke)
+        # A few points spread along the stroke are enough to tell whether it landed
+        picks = sorted({len(points) // 4, len(points) // 2, (3 * len(points)) // 4})
+        self.adaptive_pacing.prepare(stroke, [points[k] for k in picks], compiled.colors[color_idx])
+
+    def _start_adaptive_pacing(self):
+        '''Starts adaptive pacing from the delays learned for the current app profile'''
+        adaptive = self.adaptive_pacing
+        if adaptive is None:
+            return
+        learned = self.pacing_profiles.load(self.pacing_profile)
+        delay = self.settings[Bot.DELAY]
+        scale = learned['delay'] / delay if learned and delay > 0 else 1.0
+        adaptive.reset(scale)
+        adaptive.enabled = True
+        draw_log.info(f"[AdaptivePacing] Profile '{self.pacing_profile}': starting at delay {delay * adaptive.scale:.3f}s, "
+                      f"jump delay {self.settings[Bot.JUMP_DELAY] * adaptive.scale:.3f}s")
+
+    def _save_adaptive_pacing(self):
+        '''Stores the delays adaptive pacing converged on for the current app profile'''
+        adaptive = self.adaptive_pacing
+        if adaptive is None or not adaptive.checks:
+            return
+        delay = self.settings[Bot.DELAY] * adaptive.scale
+        jump_delay = self.settings[Bot.JUMP_DELAY] * adaptive.scale
+        try:
+            self.pacing_profiles.save(self.pacing_profile, delay, jump_delay, adaptive.checks, adaptive.misses)
+            draw_log.info(f"[AdaptivePacing] Profile '{self.pacing_profile}': learned delay {delay:.3f}s, jump delay {jump_delay:.3f}s "
+                          f"({adaptive.checks} checks, {adaptive.misses} missed)")
+        except OSError as e:
+            draw_log.warning(f"[AdaptivePacing] Could not save pacing profile: {e}")
+
+    def cost_model(self):
+        '''Returns the cost model fitted to the past drawings with the current input backend and pacing profile'''
+        key = (self.input.name, self.pacing_profile, self.run_history.mtime())
+        if self._cost_model is None or self._cost_model_key != key:
+            runs = self.run_history.runs(self.input.name, self.pacing_profile) if self.run_history.enabled else []
+            self._cost_model, self._cost_model_key = estimate.CostModel().fit(runs), key
+        return self._cost_model
+
+    def estimate_tape(self, compiled):
+        '''Returns (seconds, low, high): the estimated drawing time of a compiled tape and its confidence interval'''
+        return self.cost_model().predict(estimate.tape_features(compiled))
+
+    def plan_features(self, cmap):
+        '''
+        The cost model features of drawing cmap, without compiling it into a tape or resolving its
+        colors. Stroke and jump features are computed as the tape would have them; the switch
+        waits come from one switch procedure per selection source lowered into a scratch tape.
+        '''
+        delay, jump_delay = self.settings[Bot.DELAY], self.settings[Bot.JUMP_DELAY]
+        features = {'strokes': 0, 'segments': 0, 'stroke_wait': 0.0, 'jumps': 0, 'jump_wait': 0.0}
+        okay_mode = self.color_button_okay.get('enabled', False)
+        # prepare_draw() loads a saved calibration before drawing, its colors are spectrum clicks then
+        calibrated = bool(self.color_calibration_map) or self.spectrum_model is not None or bool(self.calibration_file())
+        sources, last_end = {}, None
+
+        for color_idx, (c, lines) in enumerate(cmap.items()):
+            if color_idx == 0 and self.skip_first_color:
+                continue
+            strokes = Bot._stroke_array(lines, absolute=True)
+            for name, value in tape.stroke_features(strokes, delay, jump_delay, self.jump_threshold, last_end).items():
+                features[name] += value
+            if len(strokes):
+                last_end = strokes[-1, 2:].tolist()
+
+            c = tuple(int(v) for v in c)
+            if not okay_mode and self._palette is not None and c in self._palette.colors:
+                source = 'palette'
+            else:
+                source = 'spectrum' if calibrated else 'keyboard'
+            sources.setdefault(source, [0, c])[0] += 1
+
+        switch_wait = 0.0
+        for source, (count, c) in sources.items():
+            position = {'palette': self._palette.colors_pos[c] if source == 'palette' else None, 'spectrum': (0, 0)}.get(source)
+            b = tape.TapeBuilder()
+            try:
+                self._compile_switch(b, c, colorindex.ColorResolution([c], [source], [position], [0.0], self.gamut_tolerance))
+            except NoCustomColorsError:
+                pass  # Keyboard entry without custom colors, the drawing itself reports it
+            switch_wait += count * estimate.tape_features(b.build([c], [0], [], [0]))['switch_wait']
+
+        counts = {source: count for source, (count, _) in sources.items()}
+        features.update(switch_wait=switch_wait, keyboard_switches=counts.get('keyboard', 0),
+                        click_switches=counts.get('palette', 0) + counts.get('spectrum', 0))
+        return features
+
+    def estimate_plan(self, cmap):
+        '''Returns (seconds, low, high) like estimate_tape(), from the plan alone (see plan_features())'''
+        return self.cost_model().predict(self.plan_features(cmap))
+
+    def _record_run(self, compiled):
+        '''Adds the measured phases of a completed drawing to the run history'''
+        if not self.run_history.enabled:
+            return
+        phases = dict(zip(('stroke', 'jump', 'switch'), (ns / 1e9 for ns in self._draw_phases)))
+        draw_log.info(f"Phases:   strokes {self._format_time(phases['stroke'])}, jumps {self._format_time(phases['jump'])}, "
+                      f"color switches {self._format_time(phases['switch'])}")
+        try:
+            self.run_history.append(estimate.tape_features(compiled), phases, self.input.name, self.pacing_profile)
+        except OSError as e:
+            draw_log.warning(f"[Estimate] Could not save run history: {e}")
+
+    @staticmethod
+    def _at_pause_point(compiled, i):
+        '''
+        True if a pause may start before event i: at a COLOR marker or the first event of a
+        stroke. Anywhere else the press of a stroke or a click of the switch procedure may be
+        pending, and the cursor can be moved while paused.
+        '''
+        if compiled.ops[i] == tape.COLOR:
+            return True
+        offsets = compiled.stroke_offsets
+        k = int(np.searchsorted(offsets, i))
+        return k < len(offsets) and offsets[k] == i
+
+    def _pause_replay(self, compiled, i, start):
+        '''Waits while paused. Returns the event index to continue at, rewinding to replay the last stroke'''
+        if self.control.paused:
+            draw_log.info("Paused after completing stroke - press resume to continue")
+            # Ensure any stuck modifier keys are released once when the pause starts
+            try:
+                self.input.key_up('shift')
+                self.input.key_up('alt')
+                self.input.key_up('ctrl')
+            except Exception:
+                pass  # Ignore errors if keys are already released
+        # Blocks without polling until resumed or terminated
+        if not self.control.wait_while_paused():
+            return i
+
+        # Resume - replay the stroke finished right before the pause to ensure clean result
+        ops, args = compiled.ops, compiled.args
+        if i > start and ops[i - 1] == tape.STROKE:
+            stroke = int(args[i - 1, 0])
+            self.progress_channel.completed -= 1
+        else:
+            return i
+        color_idx, _ = compiled.stroke_position(stroke)
+        draw_log.info(f"Resuming - replaying current stroke for color {compiled.colors[color_idx]}")
+        return max(start, int(compiled.stroke_offsets[stroke]))
+
+    def _report_draw_progress(self):
+        '''Logs the overall progress with the remaining time'''
+        completed, total, estimated_remaining = self.progress_channel.snapshot()
+        draw_log.info(f"Total progress: {completed}/{total} strokes - {self._format_time(estimated_remaining)} remaining")
+
+    @property
+    def completed_strokes(self):
+        return self.progress_channel.completed
+
+    @property
+    def total_strokes(self):
+        return self.progress_channel.total
+
+    @property
+    def paused(self):
+        return self.control.paused
+
+    @paused.setter
+    def paused(self, value):
+        if value:
+            self.control.pause()
+        else:
+            self.control.resume()
+
+    @property
+    def terminate(self):
+        return self.control.terminated
+
+    @terminate.setter
+    def terminate(self, value):
+        if value:
+            self.control.terminate()
+        else:
+            self.control.clear_terminate()
+
     def test_draw(self, cmap, max_lines=20):
         '''
         Test draw the first max_lines from the coordinate map.
@@ -1242,32 +1916,30 @@ class Bot:
         self.start_time = time.time()  # Track start time for test draw
 
         # Load calibration data if file exists - always load if file exists to ensure latest data is used
-        if os.path.exists('color_calibration.json'):
+        calibration_file = self.calibration_file()
+        if calibration_file:
             if self.color_calibration_map is None or not self.color_calibration_map:
-                print("[Calibration] Loading calibration data from color_calibration.json")
-                self.load_color_calibration('color_calibration.json')
+                calibration_log.info(f"[Calibration] Loading calibration data from {calibration_file}")
+                self.load_color_calibration(calibration_file)
             else:
-                print(f"[Calibration] Calibration data already loaded from color_calibration.json ({len(self.color_calibration_map)} colors)")
+                calibration_log.info(f"[Calibration] Calibration data already loaded from {calibration_file} ({len(self.color_calibration_map)} colors)")
         else:
-            print("[Calibration] No calibration data available")
+            calibration_log.info("[Calibration] No calibration data available")
 
-        # Create progress overlay window
-        self.create_progress_overlay()
-        if self.overlay_window:
-            self.update_progress_overlay(0, min(max_lines, sum(len(lines) for lines in cmap.values())), 0)
+        self.progress_channel.begin(min(max_lines, sum(len(lines) for lines in cmap.values())))
 
         # Estimate time for the full cmap (not just test lines)
         self.estimated_time_seconds = self._estimate_drawing_time_seconds(cmap)
         estimated_str = self._format_time(self.estimated_time_seconds)
-        print(f"Estimated drawing time (full): {estimated_str}")
+        draw_log.info(f"Estimated drawing time (full): {estimated_str}")
 
         for color_idx, (c, lines) in enumerate(cmap.items()):
             if lines_drawn >= max_lines:
                 break
 
             # Log color change
-            print(f"[DEBUG] Color Button Okay enabled: {self.color_button_okay.get('enabled', False)}")
-            print(f"Switching to color {c} for test draw")
+            draw_log.debug(f"Color Button Okay enabled: {self.color_button_okay.get('enabled', False)}")
+            draw_log.info(f"Switching to color {c} for test draw")
 
             # Only perform automatic color selection if Color Button Okay is NOT enabled
             # When Color Button Okay is enabled, user is expected to manually select the color
@@ -1275,62 +1947,48 @@ class Bot:
                 # Check if palette exists and color is in palette before accessing it
                 if self._palette is not None and c in self._palette.colors:
                     px, py = self._palette.colors_pos[c]
-                    print(f"[DEBUG] Using palette click at: {(px, py)}")
+                    draw_log.debug(f"Using palette click at: {(px, py)}")
                     # Use mouseDown/mouseUp with delay for more reliable clicks (like color button mode)
-                    pyautogui.mouseDown(px, py, button='left')
+                    self.input.mouse_down(px, py, button='left')
                     time.sleep(0.08)
-                    pyautogui.mouseUp(px, py, button='left')
+                    self.input.mouse_up(px, py, button='left')
                 else:
                     # Try to find the color in the spectrum map
                     # Use tolerance of 20 (same as calibration default) to ensure accurate color selection
                     spectrum_pos = self.get_calibrated_color_position(c, tolerance=20)
                     if spectrum_pos:
-                        print(f"[DEBUG] Using spectrum click at: {spectrum_pos}")
+                        draw_log.debug(f"Using spectrum click at: {spectrum_pos}")
                         
                         # MSPaint Mode: Double-click on spectrum instead of single click
                         if self.mspaint_mode.get('enabled', False):
                             # First click
-                            pyautogui.click(spectrum_pos)
+                            self.input.click(*spectrum_pos)
                             # Wait for configured delay between clicks
                             mspaint_delay = self.mspaint_mode.get('delay', 0.5)
-                            print(f"[MSPaintMode] Waiting {mspaint_delay} seconds between double-click...")
+                            draw_log.debug(f"[MSPaintMode] Waiting {mspaint_delay} seconds between double-click...")
                             time.sleep(mspaint_delay)
                             # Second click on the same position
-                            pyautogui.click(spectrum_pos)
-                            print(f"[MSPaintMode] Double-click completed at {spectrum_pos}")
+                            self.input.click(*spectrum_pos)
+                            draw_log.debug(f"[MSPaintMode] Double-click completed at {spectrum_pos}")
                             # Use color button delay after double-click
                             delay = self.color_button.get('delay', 0.1)
-                            print(f"[DEBUG] Waiting {delay} seconds after spectrum double-click...")
+                            draw_log.debug(f"Waiting {delay} seconds after spectrum double-click...")
                             time.sleep(delay)
                         else:
                             # Simple click (original behavior)
-                            pyautogui.click(spectrum_pos)
+                            self.input.click(*spectrum_pos)
                             # Wait for the application to register the color selection (use same delay as color button)
                             delay = self.color_button.get('delay', 0.1)
                             time.sleep(delay)
                     else:
-                        # Check if color_calibration.json exists (calibration data available)
+                        # Check if a calibration file exists (calibration data available)
                         # If so, skip the keyboard input method since calibration should find the color
-                        if not os.path.exists('color_calibration.json'):
+                        if not self.calibration_file():
                             # Fallback to keyboard input method
-                            try:
-                                cc_box = self._custom_colors
-                                print(f"[DEBUG] Using keyboard input method - clicking center of box at: ({cc_box[0] + cc_box[2] // 2}, {cc_box[1] + cc_box[3] // 2})")
-                                pyautogui.click((cc_box[0] + cc_box[2] // 2, cc_box[1] + cc_box[3] // 2), clicks=3, interval=.15)
-                            except:
-                                raise NoCustomColorsError('Bot could not continue because custom colors are not initialized')
-                            print(f"[DEBUG] Using keyboard input method - typing RGB: {c}")
-                            pyautogui.press('tab', presses=7, interval=.05)
-                            for val in c:
-                                numbers = (d for d in str(val))
-                                for n in numbers:
-                                    pyautogui.press(str(n))
-                                pyautogui.press('tab')
-                            pyautogui.press('tab')
-                            pyautogui.press('enter')
-                            pyautogui.PAUSE = 0.0
+                            draw_log.debug(f"Using keyboard input method - entering {c}")
+                            self.color_entry.enter(self.input, c, self._color_entry_focus())
                         else:
-                            print(f"[DEBUG] Color calibration file exists - skipping keyboard input method")
+                            draw_log.debug(f"Color calibration file exists - skipping keyboard input method")
 
             # Only click okay button if Color Button Okay is enabled
             if self.color_button_okay.get('enabled', False):
@@ -1339,7 +1997,7 @@ class Bot:
                     cbo = self.color_button_okay
                     if cbo.get('coords'):
                         cx, cy = cbo['coords']
-                        print(f"[ColorButtonOkay] attempting click at {(cx, cy)} with mods={cbo.get('modifiers')}")
+                        draw_log.debug(f"[ColorButtonOkay] attempting click at {(cx, cy)} with mods={cbo.get('modifiers')}")
 
                         # Track which modifiers were pressed so we can release them in reverse order
                         pressed_modifiers = []
@@ -1348,32 +2006,32 @@ class Bot:
                         modifier_keys = [('ctrl', 'ctrl'), ('alt', 'alt'), ('shift', 'shift')]
                         for mod_key, pygui_key in modifier_keys:
                             if cbo['modifiers'].get(mod_key):
-                                pyautogui.keyDown(pygui_key)
+                                self.input.key_down(pygui_key)
                                 pressed_modifiers.append(pygui_key)
-                                print(f"[ColorButtonOkay] pressed modifier: {pygui_key}")
+                                draw_log.debug(f"[ColorButtonOkay] pressed modifier: {pygui_key}")
 
                         # Click the button with modifiers active
-                        print(f"[ColorButtonOkay] performing mouseDown at {(cx, cy)}")
-                        pyautogui.mouseDown(cx, cy, button='left')
+                        draw_log.debug(f"[ColorButtonOkay] performing mouseDown at {(cx, cy)}")
+                        self.input.mouse_down(cx, cy, button='left')
                         time.sleep(0.08)
-                        pyautogui.mouseUp(cx, cy, button='left')
-                        print(f"[ColorButtonOkay] mouse click performed at {(cx, cy)}")
+                        self.input.mouse_up(cx, cy, button='left')
+                        draw_log.debug(f"[ColorButtonOkay] mouse click performed at {(cx, cy)}")
 
                         # Release modifiers immediately after the click with robust handling
                         for pygui_key in reversed(pressed_modifiers):
-                            pyautogui.keyUp(pygui_key)
-                            print(f"[ColorButtonOkay] released modifier: {pygui_key}")
+                            self.input.key_up(pygui_key)
+                            draw_log.debug(f"[ColorButtonOkay] released modifier: {pygui_key}")
                             time.sleep(0.05)  # Small delay to ensure each key release is registered
 
                         # Brute-force release all modifiers as backup (in case tracked list missed any)
                         try:
-                            pyautogui.keyUp('shift')
+                            self.input.key_up('shift')
                             time.sleep(0.05)
-                            pyautogui.keyUp('alt')
+                            self.input.key_up('alt')
                             time.sleep(0.05)
-                            pyautogui.keyUp('ctrl')
+                            self.input.key_up('ctrl')
                             time.sleep(0.05)
-                            print(f"[ColorButtonOkay] force-released all modifiers as backup")
+                            draw_log.debug(f"[ColorButtonOkay] force-released all modifiers as backup")
                         except:
                             pass
 
@@ -1382,16 +2040,16 @@ class Bot:
 
                         # Wait for configured delay after clicking the Color Button Okay (use same delay as Color Button)
                         delay = self.color_button_okay.get('delay', 0.1)
-                        print(f"[ColorButtonOkay] waiting {delay} seconds before starting to draw...")
+                        draw_log.debug(f"[ColorButtonOkay] waiting {delay} seconds before starting to draw...")
                         time.sleep(delay)
 
                 except Exception as e:
-                    print(f"[ColorButtonOkay] Error during color button okay click: {e}")
+                    draw_log.warning(f"[ColorButtonOkay] Error during color button okay click: {e}")
                     # Ensure modifiers are released even if there's an error
                     try:
-                        pyautogui.keyUp('shift')
-                        pyautogui.keyUp('alt')
-                        pyautogui.keyUp('ctrl')
+                        self.input.key_up('shift')
+                        self.input.key_up('alt')
+                        self.input.key_up('ctrl')
                     except:
                         pass
 
@@ -1401,17 +2059,15 @@ class Bot:
 
                 # Log progress
                 lines_drawn += 1
-                print(f"Drawing test line {lines_drawn}/{max_lines} for color {c}")
+                draw_log.info(f"Drawing test line {lines_drawn}/{max_lines} for color {c}")
 
-                # Update overlay progress
-                if self.overlay_window:
-                    self.update_progress_overlay(lines_drawn, max_lines, 0)
+                self.progress_channel.completed = lines_drawn
 
                 # Check for pause/terminate
                 if self.terminate:
-                    pyautogui.mouseUp()
+                    self.input.mouse_up()
                     self.drawing = False  # Clear drawing flag on termination
-                    self.close_progress_overlay()  # Close overlay on termination
+                    self.progress_channel.end()
                     return 'terminated'
 
                 # Draw the line (simplified, no segmentation for test draw)
@@ -1419,12 +2075,12 @@ class Bot:
                 distance = ((end_pos[0] - start_pos[0]) ** 2 + (end_pos[1] - start_pos[1]) ** 2) ** 0.5
 
                 if distance < 1:  # Very short line
-                    pyautogui.moveTo(start_pos)
-                    pyautogui.dragTo(end_pos[0], end_pos[1], 0.2, button='left')
+                    self.input.move_to(*start_pos)
+                    self.input.drag_to(end_pos[0], end_pos[1], 0.2, button='left')
                 else:
                     # Simple drag for test draw with moderate speed
-                    pyautogui.moveTo(start_pos)
-                    pyautogui.dragTo(end_pos[0], end_pos[1], 0.2, button='left')
+                    self.input.move_to(*start_pos)
+                    self.input.drag_to(end_pos[0], end_pos[1], 0.2, button='left')
                     time.sleep(0.2)  # Delay between strokes
 
         # Show time comparison for test draw
@@ -1438,79 +2094,110 @@ class Bot:
         else:
             diff_str = f"Extra: {self._format_time(abs(diff_seconds))}"
         
-        print("=" * 50)
-        print(f"Test draw completed: {lines_drawn} lines drawn")
-        print(f"Estimated (full): {self._format_time(self.estimated_time_seconds)}")
-        print(f"Actual (test):   {actual_str}")
-        print(f"{diff_str}")
-        print("=" * 50)
+        draw_log.info("=" * 50)
+        draw_log.info(f"Test draw completed: {lines_drawn} lines drawn")
+        draw_log.info(f"Estimated (full): {self._format_time(self.estimated_time_seconds)}")
+        draw_log.info(f"Actual (test):   {actual_str}")
+        draw_log.info(f"{diff_str}")
+        draw_log.info("=" * 50)
         
-        # Close progress overlay
-        self.close_progress_overlay()
+        self.progress_channel.end()
         
         self.drawing = False  # Clear drawing flag
         return 'success'
 
+    def _palette_fingerprint(self):
+        """Short hash of the palette colors (positions do not affect the plan)"""
+        if self._palette is None:
+            return None
+        colors = sorted(tuple(int(v) for v in c) for c in self._palette.colors)
+        return hashlib.md5(str(colors).encode()).hexdigest()[:8]
+
+    def _plan_inputs(self, flags=0, mode=LAYERED):
+        """
+        Returns the inputs that actually change the output of process(). Delays and the
+        canvas position are left out on purpose so that tweaking them keeps the cache valid.
+        Returns None if the canvas is not initialized.
+        """
+        if self._canvas is None:
+            return None
+
+        custom = bool(flags & Bot.USE_CUSTOM_COLORS)
+        inputs = {
+            'step': int(self.settings[Bot.STEP]),
+            'flags': int(flags),
+            'mode': str(mode),
+            'canvas_size': [int(self._canvas[2]), int(self._canvas[3])],
+            'palette': None if custom else self._palette_fingerprint()
+        }
+        # Accuracy only matters for interval quantized custom colors, the calibration for calibrated ones
+        inputs.update(self._quantization_inputs(custom))
+        del inputs['custom']
+        return inputs
+
     def get_cache_filename(self, image_path, flags=0, mode=LAYERED):
-        """Generate a unique cache filename based on image and settings"""
+        """Generate a unique cache filename based on image and plan-affecting inputs"""
         # Read image file to compute hash
         with open(image_path, 'rb') as f:
             image_data = f.read()
         image_hash = hashlib.md5(image_data).hexdigest()[:8]
 
         # Create settings hash - handle case where canvas isn't initialized yet
-        canvas_info = getattr(self, '_canvas', None)
-        if canvas_info is None:
+        plan_inputs = self._plan_inputs(flags, mode)
+        if plan_inputs is None:
             # Canvas not initialized, can't generate cache filename
             return None
 
-        settings_str = f"{self.settings}_{flags}_{mode}_{canvas_info}"
+        settings_str = json.dumps(plan_inputs, sort_keys=True)
         settings_hash = hashlib.md5(settings_str.encode()).hexdigest()[:8]
 
         # Create cache directory if it doesn't exist
-        cache_dir = 'cache'
-        os.makedirs(cache_dir, exist_ok=True)
+        os.makedirs(self.cache.cache_dir, exist_ok=True)
 
-        return f"{cache_dir}/{image_hash}_{settings_hash}.json"
+        return self.cache.path(f"{image_hash}_{settings_hash}.plan")
+
+    @staticmethod
+    def _stroke_array(lines, absolute=False):
+        '''
+        Returns the strokes of one color as an (n, 4) array of (x1, y1, x2, y2). Memory-mapped
+        plans hand out their untranslated data without copying, which is fine for anything
+        that only looks at distances. Pass absolute=True to get screen coordinates.
+        '''
+        raw = getattr(lines, 'raw', None)
+        if raw is not None:
+            return raw + np.array(lines.origin * 2) if absolute else raw
+        return np.asarray(lines, dtype=np.int64).reshape(-1, 4)
 
     def _estimate_drawing_time_seconds(self, cmap):
         """Estimate drawing time in seconds (internal helper method)"""
         try:
-            total_strokes = sum(len(lines) for lines in cmap.values())
-            estimated_seconds = 0
-
-            # Calculate time for each color's strokes
-            for color, lines in cmap.items():
-                last_end_pos = None
-
-                for i, line in enumerate(lines):
-                    start_pos, end_pos = line
-
-                    # Calculate stroke distance
-                    distance = ((end_pos[0] - start_pos[0]) ** 2 + (end_pos[1] - start_pos[1]) ** 2) ** 0.5
-
-                    # Add normal delay for each stroke
-                    estimated_seconds += self.settings[Bot.DELAY]
-
-                    # Check for jump delay if this isn't the first stroke in this color
-                    if last_end_pos is not None:
-                        jump_distance = ((start_pos[0] - last_end_pos[0]) ** 2 + (start_pos[1] - last_end_pos[1]) ** 2) ** 0.5
-                        if jump_distance > self.jump_threshold:
-                            estimated_seconds += self.settings[Bot.JUMP_DELAY]
-
-                    # Update last position for next jump check
-                    last_end_pos = end_pos
-
-            # Add color switching overhead (~0.5 seconds per color)
-            num_colors = len(cmap)
-            estimated_seconds += num_colors * 0.5
+            return float(self.estimate_plan(cmap)[0])
+        except (ValueError, TypeError, OSError) as e:
+            draw_log.warning(f"[Estimate] Could not estimate the drawing time: {e}")
+            return 0.0
 
-            return estimated_seconds
+    def _format_estimate(self):
+        '''Formats the estimate of the current drawing, with its confidence interval if it has one'''
+        text = self._format_time(self.estimated_time_seconds)
+        if self.estimated_time_range:
+            low, high = self.estimated_time_range
+            text += f" ({self._format_time(low)}-{self._format_time(high)})"
+        return text
 
-        except Exception:
-            return 0.0
+    @staticmethod
+    def stroke_delay(drawing_settings):
+        '''
+        Returns the Delay of the drawing_settings section of config.json, the duration of every
+        stroke. Sections saved without delay_per_stroke spread a stroke over Delay / segments,
+        their Delay is converted to the duration long strokes had.
+        '''
+        delay = float(drawing_settings.get('delay', 0.01))
+        if 'delay' in drawing_settings and not drawing_settings.get('delay_per_stroke'):
+            delay = max(0.01, round(delay / Bot.LEGACY_DELAY_DIVISOR, 3))
+        return delay
 
-    def _format_time(self, seconds):
+    @staticmethod
+    def _format_time(seconds):
         """Format seconds into a human-readable time string"""
         if seconds < 60:
             return f"{seconds:.0f}s"
@@ -1523,49 +2210,66 @@ class Bot:
             minutes = int((seconds % 3600) // 60)
             return f"{hours}:{minutes:02d}h"
 
-    def estimate_drawing_time(self, cmap):
-        """Estimate how long drawing might take based on coordinate data"""
+    def estimate_drawing_time(self, cmap, compiled=None):
+        """
+        Estimate how long drawing might take based on coordinate data, followed by the
+        confidence interval learned from past drawings. Pass the compiled tape if there is one,
+        otherwise the estimate is computed from the plan without compiling it
+        """
         try:
-            estimated_seconds = self._estimate_drawing_time_seconds(cmap)
+            estimated_seconds, low, high = self.estimate_tape(compiled) if compiled is not None else self.estimate_plan(cmap)
+            interval = f" ({self._format_time(low)}-{self._format_time(high)})"
 
             # Format nicely
             if estimated_seconds < 10:
-                return f"~{estimated_seconds:.1f} seconds"
+                return f"~{estimated_seconds:.1f} seconds{interval}"
             elif estimated_seconds < 60:
-                return f"~{estimated_seconds:.0f} seconds"
+                return f"~{estimated_seconds:.0f} seconds{interval}"
             elif estimated_seconds < 3600:
                 minutes = int(estimated_seconds // 60)
                 seconds = estimated_seconds % 60
-                return f"~{minutes}:{seconds:02.0f} minutes"
+                return f"~{minutes}:{seconds:02.0f} minutes{interval}"
             else:
                 hours = int(estimated_seconds // 3600)
                 minutes = int((estimated_seconds % 3600) // 60)
-                return f"~{hours}:{minutes:02.0f} hours"
+                return f"~{hours}:{minutes:02.0f} hours{interval}"
 
-        except Exception:
+        except (ValueError, TypeError, OSError) as e:
+            draw_log.warning(f"[Estimate] Could not estimate the drawing time: {e}")
             return "Unknown (unable to analyze)"
 
-    def precompute(self, image_path, flags=0, mode=LAYERED):
-        """Pre-compute the image processing and save to cache"""
+    def precompute(self, image_path, flags=0, mode=LAYERED, skip_existing=False):
+        """
+        Pre-compute the image processing and save to cache. With skip_existing, a valid
+        plan that is already cached (e.g. written by another batch worker) is reused.
+        """
         cache_file = self.get_cache_filename(image_path, flags, mode)
         if cache_file is None:
             raise RuntimeError("Cannot precompute: canvas not initialized")
 
-        print("Pre-computing image...")
+        # Only one process at a time may compute and write the same plan
+        with self.cache.lock(os.path.basename(cache_file)):
+            cache_data = self.load_cached(cache_file, lookup=True) if skip_existing else None
+            if cache_data is not None:
+                cache_data['cmap'].close()
+                cache_log.info(f"Plan already cached: {cache_file}")
+                return cache_file
+            return self._precompute_locked(image_path, cache_file, flags, mode)
+
+    def _precompute_locked(self, image_path, cache_file, flags=0, mode=LAYERED):
+        cache_log.info("Pre-computing image...")
 
         start_time = time.time()
 
-        # Process the image
-        cmap = self.process(image_path, flags, mode)
+        # Process the image. Strokes are stored relative to the canvas origin so the canvas
+        # can be moved without invalidating the cache, load_cached() translates them back.
+        layout = self._plan_layout(image_path, flags, mode)
 
-        # Prepare cache data - convert tuple keys to strings for JSON serialization
-        cmap_json = {str(k): v for k, v in cmap.items()}
         cache_data = {
-            'cmap': cmap_json,
+            'plan_inputs': self._plan_inputs(flags, mode),
             'settings': self.settings.copy(),
             'flags': flags,
             'mode': mode,
-            'canvas': self._canvas,
             'image_hash': hashlib.md5(open(image_path, 'rb').read()).hexdigest()[:8],
             'timestamp': time.time(),
             'palette_info': {
@@ -1574,59 +2278,64 @@ class Bot:
             } if hasattr(self, '_palette') else None
         }
 
-        # Save to cache file
-        with open(cache_file, 'w') as f:
-            json.dump(cache_data, f, indent=2)
+        # Save to cache file and register it with the store (may evict old plans)
+        with atomic_write(cache_file, 'wb') as f:
+            planfile.write_plan(f, layout, cache_data)
+        self.cache.add(os.path.basename(cache_file))
 
         actual_time = time.time() - start_time
-        print(f"Pre-computation completed in {actual_time:.2f} seconds")
-        print(f"Cache saved to: {cache_file}")
+        cache_log.info(f"Pre-computation completed in {actual_time:.2f} seconds")
+        cache_log.info(f"Cache saved to: {cache_file}")
 
         return cache_file
 
-    def load_cached(self, cache_file):
-        """Load and validate cached computation results"""
+    def load_cached(self, cache_file, lookup=False):
+        """
+        Load and validate cached computation results. The plan is memory-mapped, strokes are
+        read from disk on demand and translated to the current canvas position. Release the
+        mapping with Bot.release_plan(cache_data['cmap']) once the plan is no longer needed.
+        With lookup, the hit or miss is counted in the cache statistics in the same index
+        write that marks the entry as used.
+        """
+        cache_data = self._load_plan(cache_file)
+        key = os.path.basename(cache_file)
+        if lookup:
+            self.cache.record_lookup(key, cache_data is not None)
+        elif cache_data is not None:
+            self.cache.touch(key)
+        return cache_data
+
+    def _load_plan(self, cache_file):
+        plan = None
         try:
-            with open(cache_file, 'r') as f:
-                cache_data = json.load(f)
+            plan = planfile.MappedPlan(cache_file, origin=(self._canvas[0], self._canvas[1]))
+            cache_data = dict(plan.meta)
 
             # Basic validation
-            required_keys = ['cmap', 'settings', 'flags', 'mode', 'canvas', 'timestamp']
+            required_keys = ['plan_inputs', 'flags', 'mode', 'timestamp']
             if not all(key in cache_data for key in required_keys):
+                plan.close()
                 return None
 
-            # Check if cache is recent (within 24 hours)
-            if time.time() - cache_data['timestamp'] > 24 * 3600:
+            # Validate that everything affecting the plan still matches
+            if cache_data['plan_inputs'] != self._plan_inputs(cache_data['flags'], cache_data['mode']):
+                plan.close()
                 return None
 
-            # Validate settings match
-            if cache_data['settings'] != self.settings:
-                return None
-
-            # Validate canvas matches
-            if tuple(cache_data['canvas']) != tuple(self._canvas):
-                return None
-
-            # Convert string keys back to tuples for cmap
-            cmap_restored = {}
-            for k, v in cache_data['cmap'].items():
-                # Parse tuple from string like "(255, 0, 0)"
-                try:
-                    # Remove parentheses and split by comma
-                    tuple_str = k.strip('()')
-                    tuple_parts = [int(x.strip()) for x in tuple_str.split(',')]
-                    tuple_key = tuple(tuple_parts)
-                    cmap_restored[tuple_key] = v
-                except (ValueError, TypeError):
-                    # Skip invalid keys
-                    continue
-
-            cache_data['cmap'] = cmap_restored
+            cache_data['cmap'] = plan
             return cache_data
 
-        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        except (OSError, ValueError, KeyError, TypeError, struct.error):
+            if plan is not None:
+                plan.close()
             return None
 
+    @staticmethod
+    def release_plan(cmap):
+        '''Unmaps cmap if it is a memory-mapped plan from load_cached(), plain color tables are left alone'''
+        if isinstance(cmap, planfile.MappedPlan):
+            cmap.close()
+
     def process_region(self, file, region, flags=0, mode=LAYERED, canvas_target=None):
         '''
         Processes a specific region of an image as per the flags submitted and returns
@@ -1662,7 +2371,6 @@ class Bot:
             # Position at the target location
             xo = target_x
             y_start = target_y
-            x = xo  # Initialize x for the loop
         else:
             # Default behavior: scale to fit canvas and center
             cropped_w, cropped_h = img_cropped.size
@@ -1674,111 +2382,15 @@ class Bot:
             offset_y = (canvas_h - scaled_h) // 2
             xo = canvas_x + offset_x
             y_start = canvas_y + offset_y
-            x = xo  # Initialize x for the loop
 
         # Calculate pixel step for the scaled image
         tw, th = scaled_w // step, scaled_h // step
 
-        try:
-            # Try newer PIL syntax
-            img_small = img_cropped.resize((tw, th), resample=Image.Resampling.NEAREST)
-        except AttributeError:
-            # Fallback to older PIL syntax
-            img_small = img_cropped.resize((tw, th), resample=Image.NEAREST)  # type: ignore
-        pix = img_small.load()
-        w, h = img_small.size
-        start = xo, y_start
-
-        nearest_colors = dict()
-        cmap = dict()
-
-        col_freq = dict()
-        table_lines = list()
-        table_colors = list()
-
-        old_col = None
-
-        # Create interval size from normalized accuracy value
-        # Also setting a lower bound value of 1 to prevent interval_size from reaching 0
-        interval_size = max((1 - self.settings[Bot.ACCURACY]) * 255, 1)
-
-        for i in range(h):
-            if mode is Bot.LAYERED:
-                table_lines.append(list())
-                table_colors.append(set())
-
-            for j in range(w):
-                r, g, b = pix[j, i][:3]
-                col = near = (r, g, b)
-
-                # DESIGNATING COLOR OF THE CURRENT PIXEL
-                # Deciding what to do with new RGB triplet
-                if (r, g, b) not in nearest_colors:
-                    if flags & Bot.USE_CUSTOM_COLORS:
-                        # Obtain the closest color
-                        # round(color_component / interval_size) * interval_size
-                        col = tuple(int(round(v / interval_size) * interval_size) for v in col)
-                    else:
-                        # Find the nearest color from the palette
-                        col = self._palette.nearest_color((r, g, b))
-
-                    # Save the nearest color for this RGB triplet to avoid recomputing it
-                    nearest_colors[(r, g, b)] = col
-                else:
-                    col = nearest_colors[(r, g, b)]
-
-                # DESIGNATING COLOR LINES
-                # End brush stroke when...
-                # 1. a new color is encountered
-                # 2. the brush is at the end of the row
-                if j == w - 1 or (old_col != None and old_col != col):
-                    end = (x, y_start)
-                    if mode is Bot.SLOTTED and not (old_col == (255, 255, 255) and flags & Bot.IGNORE_WHITE):
-                        lines = cmap.get(old_col, [])
-                        lines.append( (start, end) )
-                        cmap[old_col] = lines
-                    if mode is Bot.LAYERED:
-                        table_lines[i].append((old_col, (start, end)))
-                        table_colors[i].add(old_col)
-                        col_freq[old_col] = col_freq.get(old_col, 0) + end[0] - start[0] + 1
-                    start = (xo, y_start + step) if j == w - 1 else (x + step, y_start)
-
-                self.progress = 100 * (i * w + (j + 1)) / (w * h)
-
-                old_col = col
-                x += step
-
-            x = xo
-            y_start += step
-
-        if mode is Bot.SLOTTED:
-            return cmap
-
-        # Sort colors in decreasing order of their frequency and maintain a height level index for each color
-        col_freq = tuple(k for k, _ in sorted(col_freq.items(), key=lambda item : item [1], reverse=True))
-        col_index = {col_freq[i]: i for i in range(len(col_freq))}
-
-        # This loop will attempt to merge lines in favour of reducing the number of brush strokes when drawing.
-        # Lines of lower layer colors can be easily merged into fewer strokes since they will be repainted over
-        # again by colors from a higher layer
-        for idc, col in enumerate(col_freq):
-            for idr, row in enumerate(table_lines):
-                if col not in table_colors[idr] or (col == (255, 255, 255) and flags & Bot.IGNORE_WHITE):
-                    continue
-
-                start, end, exposed = None, None, False
-                for idl, line in enumerate(row):
-                    if idc <= col_index[line[0]]:
-                        start = line[1][0] if start is None else start
-                        end = line[1][1]
-                        exposed = exposed or idc == col_index[line[0]]
-                    if start is not None and (idc > col_index[line[0]] or idl == len(row) - 1):
-                        if exposed:
-                            lines = cmap.get(col, [])
-                            lines.append((start, end))
-                            cmap[col] = lines
-                        start, exposed = None, False
-
+        grid = pipeline.image_grid(img_cropped, (tw, th))
+        quant = self._quantize(grid, flags)
+        runs = pipeline.build_runs(quant['index'])
+        cmap = Bot._layout_to_cmap(self._layout_runs(runs, quant['colors'], (xo, y_start), flags, mode))
+        self.progress = 100
         return cmap
 
     def simple_test_draw(self):
@@ -1794,7 +2406,7 @@ class Bot:
             raise NoCanvasError('Bot could not continue because canvas is not initialized')
 
         self.drawing = True
-        print("Starting simple test draw...")
+        draw_log.info("Starting simple test draw...")
 
         # Calculate 1/4 of canvas width
         quarter_width = canvas_w // 4
@@ -1809,149 +2421,30 @@ class Bot:
             end_x = canvas_x + quarter_width
             end_y = canvas_y + y_offset
 
-            print(f"Drawing line {i + 1}/5: from ({start_x}, {start_y}) to ({end_x}, {end_y})")
+            draw_log.info(f"Drawing line {i + 1}/5: from ({start_x}, {start_y}) to ({end_x}, {end_y})")
 
             # Move to start position
-            pyautogui.moveTo(start_x, start_y)
+            self.input.move_to(start_x, start_y)
             time.sleep(0.1)
 
             # Draw the line
-            pyautogui.mouseDown(button='left')
-            pyautogui.dragTo(end_x, end_y, 0.2, button='left')
-            pyautogui.mouseUp()
+            self.input.mouse_down(button='left')
+            self.input.drag_to(end_x, end_y, 0.2, button='left')
+            self.input.mouse_up()
 
             # Small delay between lines
             time.sleep(0.2)
 
-        print("Simple test draw completed!")
+        draw_log.info("Simple test draw completed!")
         self.drawing = False
         return 'success'
 
-    def create_progress_overlay(self):
-        '''
-        Create and show an always-on-top progress overlay window.
-        The window displays current drawing progress and ETA.
-        '''
-        if not self.progress_overlay_enabled:
-            return None
-
-        try:
-            # Create the overlay window
-            self.overlay_window = tk.Toplevel()
-            self.overlay_window.title("pyaint Progress")
-
-            # Set window to always on top and remove decorations
-            self.overlay_window.attributes("-topmost", True)
-            self.overlay_window.overrideredirect(True)
-
-            # Set window size and position (top center of screen)
-            window_width = 240
-            window_height = 20
-            screen_width = self.overlay_window.winfo_screenwidth()
-            x_position = (screen_width - window_width) // 2
-            y_position = 10
-
-            self.overlay_window.geometry(f"{window_width}x{window_height}+{x_position}+{y_position}")
-
-            # Create a dark background frame with border
-            border_frame = tk.Frame(
-                self.overlay_window,
-                bg="#4a4a4a",
-                width=window_width,
-                height=window_height
-            )
-            border_frame.pack(fill=tk.BOTH, expand=True)
-
-            # Inner frame for content
-            self.overlay_frame = tk.Frame(
-                border_frame,
-                bg="#2c2c2c",
-                width=window_width - 2,
-                height=window_height - 2
-            )
-            self.overlay_frame.place(x=1, y=1, width=window_width - 2, height=window_height - 2)
-
-            # Create centered label for progress text
-            self.overlay_label = tk.Label(
-                self.overlay_frame,
-                text="Initializing...",
-                bg="#2c2c2c",
-                fg="#00ff00",  # Green text for progress
-                font=("Arial", 9, "bold"),
-                relief=tk.FLAT
-            )
-            self.overlay_label.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
-
-            # Create stop event for thread
-            self.overlay_stop_event = threading.Event()
-
-            # Keep window responsive
-            self.overlay_window.update()
-
-            print("[ProgressOverlay] Overlay window created")
-            return self.overlay_window
-
-        except Exception as e:
-            print(f"[ProgressOverlay] Error creating overlay: {e}")
-            return None
-
-    def update_progress_overlay(self, completed, total, eta_seconds):
-        '''
-        Update the progress overlay with current progress and ETA.
-        '''
-        if self.overlay_window is None or self.overlay_label is None or not self.progress_overlay_enabled:
-            return
-
-        try:
-            # Format ETA string
-            if eta_seconds < 60:
-                eta_str = f"{eta_seconds:.0f}s"
-            elif eta_seconds < 3600:
-                minutes = int(eta_seconds // 60)
-                seconds = int(eta_seconds % 60)
-                eta_str = f"{minutes}:{seconds:02d}"
-            else:
-                hours = int(eta_seconds // 3600)
-                minutes = int((eta_seconds % 3600) // 60)
-                eta_str = f"{hours}:{minutes:02d}h"
-
-            # Create progress text
-            progress_text = f"{completed}/{total} Strokes (ETA: {eta_str})"
-
-            # Update label
-            self.overlay_label.config(text=progress_text)
-            self.overlay_window.update()
-
-        except Exception as e:
-            print(f"[ProgressOverlay] Error updating overlay: {e}")
-
-    def close_progress_overlay(self):
-        '''
-        Close the progress overlay window and cleanup resources.
-        '''
-        if self.overlay_window is not None:
-            try:
-                # Stop any running threads
-                if self.overlay_stop_event:
-                    self.overlay_stop_event.set()
-
-                # Close the window
-                self.overlay_window.destroy()
-                self.overlay_window = None
-                self.overlay_label = None
-                self.overlay_frame = None
-                print("[ProgressOverlay] Overlay window closed")
-            except Exception as e:
-                print(f"[ProgressOverlay] Error closing overlay: {e}")
-                # Force cleanup
-                self.overlay_window = None
-                self.overlay_label = None
-                self.overlay_frame = None
-
     def get_cached_status(self, image_path, flags=0, mode=LAYERED):
         """Check if valid cached computation exists"""
         cache_file = self.get_cache_filename(image_path, flags, mode)
         if cache_file is None:
             return False, None
-        cache_data = self.load_cached(cache_file)
+        cache_data = self.load_cached(cache_file, lookup=True)
+        if cache_data is not None:
+            cache_data['cmap'].close()
         return cache_data is not None, cache_file
\ No newline at end of file
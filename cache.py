@@ -0,0 +1,329 @@
+'''
+Size-capped store for pre-computed drawing plans.
+
+Every file written to the cache directory is recorded in a small JSON index holding
+its size, last access time, hit count and format version. When the directory grows
+past the configured byte cap, the least recently used entries are evicted first.
+
+Several processes may share the store (see batch.py). Files are written atomically and
+the index as well as individual entries are guarded by lock files, so concurrent runs
+never corrupt an entry.
+
+The store can be pruned without opening the UI:
+
+    python cache.py stats
+    python cache.py prune --max-mb 128
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+
+class FileLock:
+    '''
+    Cross-process lock based on exclusively creating a lock file. Works the same on
+    Windows and POSIX. Lock files older than `stale` seconds are assumed to be left
+    behind by a crashed process and are broken.
+    '''
+
+    def __init__(self, path, timeout=None, stale=600.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale = stale
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if deadline is not None and time.time() > deadline:
+                    raise TimeoutError(f'Could not acquire lock: {self.path}')
+                time.sleep(0.05)
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    '''
+    Opens a temporary file next to path and moves it over path once the block finishes.
+    Readers either see the old file or the complete new one, never a partial write.
+    '''
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        # Windows refuses to replace a file that is currently open elsewhere, retry briefly
+        for attempt in range(20):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                if attempt == 19:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class CacheStore:
+    # Bump FORMAT_VERSION whenever the layout of cached files changes, outdated entries are evicted
+    INDEX_VERSION = 1
+    FORMAT_VERSION = 2
+    INDEX_FILE = 'index.json'
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir='cache', max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index = None
+        self._index_locked = False
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, CacheStore.INDEX_FILE)
+
+    def path(self, key):
+        '''Returns the path of the file belonging to the given key'''
+        return os.path.join(self.cache_dir, key)
+
+    def lock(self, key, timeout=None):
+        '''Returns a lock guarding the entry for key against concurrent writers'''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return FileLock(self.path(key) + '.lock', timeout=timeout)
+
+    @contextlib.contextmanager
+    def _locked_index(self):
+        '''Holds the index lock and works on a freshly loaded copy of the index'''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with FileLock(self.index_path + '.lock', timeout=30.0, stale=30.0):
+            self._index = None
+            self._index_locked = True
+            try:
+                yield self._load_index()
+                self._save_index()
+            finally:
+                self._index_locked = False
+
+    def _load_index(self):
+        # Outside of a lock the index is always re-read, other processes may have changed it
+        if self._index is not None and self._index_locked:
+            return self._index
+
+        index = None
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != CacheStore.INDEX_VERSION:
+                index = None
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            pass
+
+        if index is None:
+            index = {
+                'version': CacheStore.INDEX_VERSION,
+                'stats': {'hits': 0, 'misses': 0, 'evictions': 0},
+                'entries': {}
+            }
+        self._index = index
+        return index
+
+    def _save_index(self):
+        with atomic_write(self.index_path) as f:
+            json.dump(self._index, f, indent=2)
+
+    def contains(self, key):
+        '''Checks whether a current-format entry for key exists on disk'''
+        entry = self._load_index()['entries'].get(key)
+        return entry is not None and entry.get('format') == CacheStore.FORMAT_VERSION and os.path.exists(self.path(key))
+
+    def record_lookup(self, key, hit):
+        '''Updates hit/miss statistics for a lookup of key, a hit also marks key as recently used'''
+        with self._locked_index() as index:
+            if hit:
+                index['stats']['hits'] += 1
+                entry = index['entries'].get(key)
+                if entry is not None:
+                    entry['hits'] = entry.get('hits', 0) + 1
+                    entry['last_access'] = time.time()
+            else:
+                index['stats']['misses'] += 1
+
+    def touch(self, key):
+        '''Marks key as recently used'''
+        with self._locked_index() as index:
+            entry = index['entries'].get(key)
+            if entry is not None:
+                entry['last_access'] = time.time()
+
+    def add(self, key):
+        '''
+        Registers a file that has just been written under key and evicts least recently
+        used entries if the store is now over its byte cap. The new entry is never evicted.
+        '''
+        with self._locked_index() as index:
+            now = time.time()
+            previous = index['entries'].get(key, {})
+            index['entries'][key] = {
+                'size': os.path.getsize(self.path(key)),
+                'created': now,
+                'last_access': now,
+                'hits': previous.get('hits', 0),
+                'format': CacheStore.FORMAT_VERSION
+            }
+            self._evict(keep=key)
+
+    def remove(self, key):
+        '''Deletes the entry and its file'''
+        with self._locked_index() as index:
+            index['entries'].pop(key, None)
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def total_bytes(self):
+        return sum(e['size'] for e in self._load_index()['entries'].values())
+
+    def _evict(self, keep=None, max_bytes=None):
+        '''Removes stale and least recently used entries until the store fits under max_bytes'''
+        index = self._load_index()
+        entries = index['entries']
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = []
+
+        # Drop entries whose file vanished or whose format is outdated
+        for key, entry in list(entries.items()):
+            if key == keep:
+                continue
+            if entry.get('format') != CacheStore.FORMAT_VERSION or not os.path.exists(self.path(key)):
+                removed.append(key)
+
+        total = sum(e['size'] for k, e in entries.items() if k not in removed)
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get('last_access', 0)):
+            if total <= max_bytes:
+                break
+            if key == keep or key in removed:
+                continue
+            removed.append(key)
+            total -= entry['size']
+
+        evicted = []
+        for key in removed:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # Still memory-mapped by a running draw (Windows), try again next time
+                continue
+            entries.pop(key, None)
+            evicted.append(key)
+        index['stats']['evictions'] += len(evicted)
+        return evicted
+
+    def prune(self, max_bytes=None):
+        '''
+        Brings the store under max_bytes (defaults to the configured cap). Files in the cache
+        directory that are missing from the index are treated as least recently used.
+        Returns the list of evicted keys.
+        '''
+        with self._locked_index() as index:
+            for name in os.listdir(self.cache_dir):
+                path = self.path(name)
+                if name == CacheStore.INDEX_FILE or name.endswith(('.tmp', '.lock')) or not os.path.isfile(path):
+                    continue
+                if name not in index['entries']:
+                    index['entries'][name] = {
+                        'size': os.path.getsize(path),
+                        'created': 0,
+                        'last_access': 0,
+                        'hits': 0,
+                        'format': CacheStore.FORMAT_VERSION
+                    }
+            return self._evict(max_bytes=max_bytes)
+
+    def stats(self):
+        '''Returns hit/miss statistics and the current size of the store'''
+        index = self._load_index()
+        hits, misses = index['stats']['hits'], index['stats']['misses']
+        lookups = hits + misses
+        return {
+            'entries': len(index['entries']),
+            'bytes': self.total_bytes(),
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'evictions': index['stats']['evictions'],
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+
+def _read_max_bytes(config_file):
+    '''Reads the cache byte cap from config.json, falling back to the default'''
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            max_mb = json.load(f).get('cache_settings', {}).get('max_mb')
+        if max_mb is not None:
+            return int(float(max_mb) * 1024 * 1024)
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        pass
+    return CacheStore.DEFAULT_MAX_BYTES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the pyaint plan cache.')
+    parser.add_argument('command', choices=('stats', 'prune', 'clear'))
+    parser.add_argument('--dir', default='cache', help='cache directory (default: cache)')
+    parser.add_argument('--config', default='config.json', help='config file holding the cache byte cap')
+    parser.add_argument('--max-mb', type=float, default=None, help='byte cap in megabytes, overrides the config')
+    args = parser.parse_args(argv)
+
+    max_bytes = _read_max_bytes(args.config) if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+    store = CacheStore(args.dir, max_bytes)
+
+    if args.command == 'prune':
+        removed = store.prune()
+        print(f"[Cache] Evicted {len(removed)} entries")
+    elif args.command == 'clear':
+        removed = store.prune(max_bytes=0)
+        print(f"[Cache] Removed {len(removed)} entries")
+
+    stats = store.stats()
+    print(f"[Cache] {stats['entries']} entries, {stats['bytes'] / (1024 * 1024):.1f}/{stats['max_bytes'] / (1024 * 1024):.1f} MB")
+    print(f"[Cache] Hits: {stats['hits']}, Misses: {stats['misses']} ({stats['hit_rate'] * 100:.1f}% hit rate), Evictions: {stats['evictions']}")
+
+
+if __name__ == '__main__':
+    main()
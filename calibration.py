@@ -0,0 +1,253 @@
+'''
+Fast calibration of the custom colors spectrum: sweep and coarse-to-fine sampling.
+
+The grid calibration of Bot.calibrate_custom_colors moves to every grid point, waits for the
+preview to update and grabs the preview pixel, over 10 ms per point. A sweep instead drags
+the cursor along the rows of the spectrum at a constant speed, alternating direction, while
+PreviewSampler grabs the preview pixel on its own thread as fast as the screen allows and
+stamps every sample with its capture time. Every move is timestamped as well, so a sample is
+mapped back to the cursor position at its capture time minus the display lag of the app:
+
+    x(sample) = x of the row timeline at (t - lag)
+
+The lag is not known up front. After the sweep a short verification pass moves to a few
+fixed points, waits for the preview and grabs it like the grid calibration. The lag under
+which the sweep shows the verified colors closest to their verified positions is used to
+build the map, and the verified points are added to it.
+
+Adaptive calibration (adaptive_samples) spends its samples where the spectrum changes: it
+samples a coarse grid, then keeps splitting the cell whose corner colors differ most (CIE76
+delta E) into four until every cell is within the target delta E, cells reach the step size
+or the sample budget is spent. CoverageReport tells how much of the spectrum was resolved.
+'''
+
+import heapq
+import threading
+import time
+
+import numpy as np
+
+LAGS = np.arange(0.0, 0.1001, 0.002)  # Candidate display lags in seconds
+
+
+class PreviewSampler:
+    '''Grabs the preview pixel on a background thread until stopped, recording (time, color) samples'''
+
+    def __init__(self, grab):
+        self.grab = grab
+        self.times = []
+        self.colors = []
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='preview-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            before = time.perf_counter()
+            try:
+                color = self.grab()
+            except Exception:
+                self.errors += 1
+                continue
+            # The grab saw the screen somewhere between the two stamps
+            self.times.append((before + time.perf_counter()) / 2)
+            self.colors.append(tuple(color[:3]))
+
+    def interval(self):
+        '''Mean seconds between two samples so far, or None before the second sample'''
+        if len(self.times) < 2:
+            return None
+        return (self.times[-1] - self.times[0]) / (len(self.times) - 1)
+
+    def arrays(self):
+        '''Returns the samples as a (n,) float array of times and an (n, 3) int array of colors'''
+        count = min(len(self.times), len(self.colors))
+        return (np.array(self.times[:count], dtype=np.float64),
+                np.array(self.colors[:count], dtype=np.int32).reshape(-1, 3))
+
+
+class SweepRow:
+    '''Timestamped cursor moves along one row of the spectrum'''
+
+    def __init__(self, y):
+        self.y = y
+        self.times = []
+        self.xs = []
+
+    def record(self, x):
+        self.times.append(time.perf_counter())
+        self.xs.append(x)
+
+    def positions(self, times, lag):
+        '''
+        Returns (window, xs): the slice of the sorted sample times that fall within the row after
+        subtracting lag, and the interpolated cursor x of each of them
+        '''
+        start, stop = np.searchsorted(times - lag, (self.times[0], self.times[-1]), side='left')
+        shifted = times[start:stop] - lag
+        return slice(start, stop), np.rint(np.interp(shifted, self.times, self.xs)).astype(np.int32)
+
+
+def build_map(times, colors, rows, lag):
+    '''Returns {(r, g, b): (x, y)} of every sample that falls within a row, later samples winning'''
+    calibration_map = {}
+    for row in rows:
+        if len(row.times) < 2:
+            continue
+        window, xs = row.positions(times, lag)
+        for color, x in zip(map(tuple, colors[window].tolist()), xs.tolist()):
+            calibration_map[color] = (x, row.y)
+    return calibration_map
+
+
+def verification_error(times, colors, rows, verified, lag):
+    '''
+    Mean distance in pixels between every verified point and the sample of its row whose
+    color is closest to the verified color under lag
+    '''
+    by_y = {row.y: row for row in rows if len(row.times) >= 2}
+    errors = []
+    for x, y, color in verified:
+        row = by_y.get(y)
+        if row is None:
+            continue
+        window, xs = row.positions(times, lag)
+        if not len(xs):
+            continue
+        diff = np.abs(colors[window] - np.asarray(color, dtype=np.int32)).sum(axis=1)
+        errors.append(abs(int(xs[int(np.argmin(diff))]) - x))
+    return float(np.mean(errors)) if errors else 0.0
+
+
+def fit_lag(times, colors, rows, verified):
+    '''Returns (lag, error) of the candidate lag that best explains the verified points'''
+    errors = [verification_error(times, colors, rows, verified, lag) for lag in LAGS]
+    best = int(np.argmin(errors))  # First minimum, ties go to the shorter lag
+    return float(LAGS[best]), errors[best]
+
+
+def verification_points(grid_x, grid_width, row_ys, count, seed=0):
+    '''Picks count (x, y) points on the swept rows, spread over the rows and at random columns'''
+    if not row_ys or count <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    picks = np.linspace(0, len(row_ys) - 1, min(count, len(row_ys))).round().astype(int)
+    return [(int(rng.integers(grid_x, grid_x + max(grid_width, 1))), int(row_ys[i])) for i in picks]
+
+
+def lab(colors):
+    '''Converts (n, 3) sRGB colors to CIE L*a*b* (D65)'''
+    rgb = np.asarray(colors, dtype=np.float64).reshape(-1, 3) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ np.array([[0.4124, 0.3576, 0.1805],
+                             [0.2126, 0.7152, 0.0722],
+                             [0.0193, 0.1192, 0.9505]]).T
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def spread(colors):
+    '''Largest CIE76 color difference (delta E) between any two of colors'''
+    points = lab(colors)
+    return float(np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)).max())
+
+
+class CoverageReport:
+    '''How well an adaptive calibration resolved the spectrum'''
+
+    def __init__(self, samples, uniform_samples, area, resolved_area, cells, max_delta_e, target_delta_e):
+        self.samples = samples
+        self.uniform_samples = uniform_samples
+        self.area = area
+        self.resolved_area = resolved_area
+        self.cells = cells
+        self.max_delta_e = max_delta_e
+        self.target_delta_e = target_delta_e
+
+    @property
+    def coverage(self):
+        '''Fraction of the spectrum area whose cells are within the target delta E'''
+        return self.resolved_area / self.area if self.area else 1.0
+
+    def summary(self):
+        return (f"{self.samples} samples ({self.samples / max(self.uniform_samples, 1) * 100:.0f}% of a uniform grid), "
+                f"{self.coverage * 100:.1f}% of the spectrum within delta E {self.target_delta_e:g}, "
+                f"worst cell delta E {self.max_delta_e:.1f}")
+
+
+def adaptive_samples(probe, box, step, coarse_step=16, target_delta_e=5.0, budget=0, should_stop=None):
+    '''
+    Samples the spectrum box (x, y, w, h) coarse to fine. probe(x, y) returns the preview color
+    at a point. A coarse grid of coarse_step cells is sampled first; then the cell whose corners
+    differ most is split into four, sampling its center and edge midpoints, until every cell is
+    within target_delta_e, cells reached step pixels, budget samples were taken (0 for half of
+    a uniform step grid) or should_stop() returns True.
+
+    Returns ({(x, y): color}, CoverageReport)
+    '''
+    x0, y0, w, h = (int(v) for v in box)
+    x1, y1 = x0 + max(w, 1) - 1, y0 + max(h, 1) - 1
+    uniform = ((w - 1) // step + 1) * ((h - 1) // step + 1)
+    budget = budget or max(uniform // 2, 4)
+    samples = {}
+
+    def sample(x, y):
+        if (x, y) not in samples:
+            samples[(x, y)] = tuple(probe(x, y))
+        return samples[(x, y)]
+
+    def axis(lo, hi):
+        points = list(range(lo, hi, coarse_step))
+        return points + [hi] if points[-1] != hi else points
+
+    xs, ys = axis(x0, x1), axis(y0, y1)
+    queue, done = [], []
+
+    def push(cell):
+        xa, ya, xb, yb = cell
+        corners = [sample(xa, ya), sample(xb, ya), sample(xa, yb), sample(xb, yb)]
+        heapq.heappush(queue, (-spread(corners), cell))
+
+    for ya, yb in zip(ys, ys[1:] or ys):
+        for xa, xb in zip(xs, xs[1:] or xs):
+            if should_stop is not None and should_stop():
+                break
+            push((xa, ya, xb, yb))
+
+    while queue:
+        if should_stop is not None and should_stop():
+            break
+        delta, cell = queue[0]
+        xa, ya, xb, yb = cell
+        if -delta <= target_delta_e or (xb - xa <= step and yb - ya <= step):
+            done.append(heapq.heappop(queue))
+            continue
+        if len(samples) + 5 > budget:
+            break
+        heapq.heappop(queue)
+        mx, my = (xa + xb) // 2, (ya + yb) // 2
+        for sub in ((xa, ya, mx, my), (mx, ya, xb, my), (xa, my, mx, yb), (mx, my, xb, yb)):
+            if sub[2] > sub[0] or sub[3] > sub[1]:
+                push(sub)
+
+    leaves = done + queue
+    area = resolved = 0.0
+    for delta, (xa, ya, xb, yb) in leaves:
+        size = max(xb - xa, 1) * max(yb - ya, 1)
+        area += size
+        if -delta <= target_delta_e:
+            resolved += size
+    max_delta_e = max((-delta for delta, _ in leaves), default=0.0)
+    return samples, CoverageReport(len(samples), uniform, area, resolved, len(leaves), max_delta_e, target_delta_e)
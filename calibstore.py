@@ -0,0 +1,160 @@
+'''
+Binary, versioned store of the color calibration.
+
+    header    magic, version, metadata length, record count          (struct '<8sIIQ')
+    metadata  UTF-8 JSON: grid box, preview point, step, mode, time, whether the run
+              completed, the next row to scan if it did not, and the spectrum model of a
+              model calibration
+    records   one 12 byte record per color: r, g, b, padding, int32 x, int32 y
+
+A map of tens of thousands of colors loads with a single numpy read instead of parsing
+"r,g,b" string keys. Calibration checkpoints its progress every few seconds and when
+cancelled, so a cancelled run of the same grid resumes at the row it stopped at. Checkpoints
+go to a separate partial file (color_calibration.partial.bin); the store itself is only
+replaced by a completed run, so cancelling a new run keeps the previous calibration. Every
+write replaces its file atomically, a crash leaves the previous version behind.
+
+color_calibration.json files of earlier versions are still read by Bot.load_color_calibration.
+'''
+
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from cache import atomic_write
+
+MAGIC = b'PYAINTCL'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQ')
+RECORD = np.dtype([('color', 'u1', (3,)), ('pad', 'u1'), ('pos', '<i4', (2,))])
+
+
+class StoredCalibration:
+    '''Calibration map and metadata read from a store'''
+
+    def __init__(self, calibration_map, meta):
+        self.calibration_map = calibration_map
+        self.meta = meta
+
+    @property
+    def complete(self):
+        return bool(self.meta.get('complete', True))
+
+    @property
+    def next_row(self):
+        return self.meta.get('next_row')
+
+    def matches(self, grid_box, preview_point, step, mode):
+        '''True if the calibration was run on the same grid with the same settings'''
+        return (self.meta.get('grid_box') == [int(v) for v in grid_box]
+                and self.meta.get('preview_point') == [int(v) for v in preview_point]
+                and self.meta.get('step') == int(step) and self.meta.get('mode') == mode)
+
+
+def write_calibration(f, calibration_map, meta):
+    '''Writes calibration_map {(r, g, b): (x, y)} and the JSON serializable meta to the binary file object f'''
+    records = np.zeros(len(calibration_map), dtype=RECORD)
+    if calibration_map:
+        records['color'] = np.array(list(calibration_map.keys()), dtype=np.uint8)
+        records['pos'] = np.array(list(calibration_map.values()), dtype=np.int32)
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    f.write(_HEADER.pack(MAGIC, VERSION, len(meta_bytes), len(records)))
+    f.write(meta_bytes)
+    f.write(records.tobytes())
+
+
+def read_calibration(data):
+    '''Parses the bytes of a store, raises ValueError if they are not a complete store of this version'''
+    if len(data) < _HEADER.size:
+        raise ValueError('Calibration store is truncated')
+    magic, version, meta_len, count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a calibration store of version {VERSION}')
+    start = _HEADER.size + meta_len
+    if len(data) != start + count * RECORD.itemsize:
+        raise ValueError('Calibration store is truncated')
+    meta = json.loads(data[_HEADER.size:start].decode('utf-8'))
+    records = np.frombuffer(data, dtype=RECORD, count=count, offset=start)
+    # Zipping the channel columns builds the key tuples faster than converting row by row
+    calibration_map = dict(zip(zip(*records['color'].T.tolist()), zip(*records['pos'].T.tolist())))
+    return StoredCalibration(calibration_map, meta)
+
+
+def is_store(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class CalibrationStore:
+    '''
+    Calibration file of the bot and the partial file next to it. Completed calibrations are
+    saved to path, incomplete ones to partial_path. checkpoint() saves at most every
+    every_seconds, so the calibration loop can call it after every row.
+    '''
+
+    def __init__(self, path='color_calibration.bin', every_seconds=5.0, partial_path=None):
+        self.path = path
+        self.every_seconds = every_seconds
+        if partial_path is None:
+            root, ext = os.path.splitext(path)
+            partial_path = root + '.partial' + ext
+        self.partial_path = partial_path
+        self._last_save = 0.0
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return read_calibration(data)
+
+    def load(self):
+        '''Returns the StoredCalibration, or None if there is no store'''
+        return self._read(self.path)
+
+    def load_partial(self):
+        '''Returns the StoredCalibration of the last cancelled run, or None if there is none'''
+        return self._read(self.partial_path)
+
+    def discard_partial(self):
+        try:
+            os.remove(self.partial_path)
+        except FileNotFoundError:
+            pass
+
+    def save(self, calibration_map, grid_box=None, preview_point=None, step=None, mode=None, next_row=None, model=None):
+        '''
+        Saves the calibration, next_row is the first row still to scan of an incomplete run.
+        An incomplete run only replaces the partial file, a complete one replaces the store
+        and discards the partial file.
+        '''
+        meta = {
+            'grid_box': [int(v) for v in grid_box] if grid_box is not None else None,
+            'preview_point': [int(v) for v in preview_point] if preview_point is not None else None,
+            'step': int(step) if step is not None else None,
+            'mode': mode,
+            'time': time.time(),
+            'complete': next_row is None,
+            'next_row': int(next_row) if next_row is not None else None,
+            'model': model
+        }
+        with atomic_write(self.path if next_row is None else self.partial_path, 'wb') as f:
+            write_calibration(f, calibration_map, meta)
+        self._last_save = time.time()
+        if next_row is None:
+            self.discard_partial()
+
+    def checkpoint(self, calibration_map, **meta):
+        '''Saves an incomplete calibration if the last save is older than every_seconds'''
+        if time.time() - self._last_save < self.every_seconds:
+            return False
+        self.save(calibration_map, **meta)
+        return True
@@ -0,0 +1,96 @@
+'''
+Keyboard entry of colors into the custom colors dialog.
+
+When a color is neither on the palette nor calibrated on the spectrum, the bot focuses the
+custom colors dialog and types the color in. ColorEntry builds the whole key sequence of
+one color once, so the tape replays it as a single batched write (see InputBackend.write)
+instead of one press per key with a pause after every Tab:
+
+    rgb     Tab x tabs_to_field, red, next_field, green, next_field, blue,
+            Tab x tabs_after, confirm
+    hex     Tab x tabs_to_field, rrggbb, Tab x tabs_after, confirm
+
+With paste set, every field value is put on the clipboard and pasted with paste_keys
+instead of being typed digit by digit, for apps that ignore synthetic key presses in
+their text fields but accept the clipboard.
+'''
+
+METHODS = ('rgb', 'hex')
+
+
+class ColorEntry:
+    '''
+    Key sequence settings of the custom colors dialog. The defaults reproduce the Windows
+    color dialog: seven Tabs from the focused box to the red field, Tab between the fields,
+    two Tabs and Enter to apply.
+    '''
+
+    def __init__(self, method='rgb', tabs_to_field=7, next_field='tab', tabs_after=2, confirm='enter',
+                 paste=False, paste_keys=('ctrl', 'v'), uppercase=False,
+                 focus_clicks=3, focus_interval=0.05, key_interval=0.0):
+        if method not in METHODS:
+            raise ValueError(f"Unknown color entry method '{method}', expected one of: {', '.join(METHODS)}")
+        self.method = method
+        self.tabs_to_field = int(tabs_to_field)
+        self.next_field = next_field
+        self.tabs_after = int(tabs_after)
+        self.confirm = confirm
+        self.paste = bool(paste)
+        self.paste_keys = tuple(paste_keys)
+        self.uppercase = bool(uppercase)
+        self.focus_clicks = int(focus_clicks)
+        self.focus_interval = float(focus_interval)
+        self.key_interval = float(key_interval)
+
+    @classmethod
+    def from_config(cls, settings):
+        '''Creates the entry from the color_entry_settings section of config.json'''
+        known = ('method', 'tabs_to_field', 'next_field', 'tabs_after', 'confirm', 'paste', 'paste_keys',
+                 'uppercase', 'focus_clicks', 'focus_interval', 'key_interval')
+        return cls(**{k: v for k, v in settings.items() if k in known})
+
+    def fields(self, color):
+        '''Returns the text of every field the color is entered into'''
+        r, g, b = (int(v) for v in color)
+        if self.method == 'hex':
+            text = f"{r:02x}{g:02x}{b:02x}"
+            return [text.upper() if self.uppercase else text]
+        return [str(r), str(g), str(b)]
+
+    def sequence(self, color):
+        '''
+        Returns the entry of color after the dialog is focused, as a list of ('keys', [key, ...])
+        and ('paste', text) parts. Consecutive keys are merged into one part.
+        '''
+        parts = []
+
+        def keys(*names):
+            if parts and parts[-1][0] == 'keys':
+                parts[-1][1].extend(names)
+            else:
+                parts.append(('keys', list(names)))
+
+        keys(*['tab'] * self.tabs_to_field)
+        for n, text in enumerate(self.fields(color)):
+            if n:
+                keys(self.next_field)
+            if self.paste:
+                parts.append(('paste', text))
+            else:
+                keys(*text)
+        keys(*['tab'] * self.tabs_after + [self.confirm])
+        return [part for part in parts if part[0] != 'keys' or part[1]]
+
+    def enter(self, target, color, focus):
+        '''
+        Clicks focus to focus the dialog and enters color. target is an input backend, which
+        does it right away, or a TapeBuilder, which lowers it onto a tape. Both share the
+        click, write, copy and hotkey methods used here.
+        '''
+        target.click(*focus, clicks=self.focus_clicks, interval=self.focus_interval)
+        for kind, value in self.sequence(color):
+            if kind == 'keys':
+                target.write(value, self.key_interval)
+            else:
+                target.copy(value)
+                target.hotkey(*self.paste_keys)
@@ -0,0 +1,200 @@
+'''
+Spatial index of the color calibration map.
+
+Bot.get_calibrated_color_position answers two queries against the calibrated spectrum
+colors on every color switch: the first entry within a Manhattan tolerance, and the k
+nearest entries by Euclidean distance for interpolating a position. Scanning a map of tens
+of thousands of entries for each of them dominates the color switch.
+
+ColorIndex bins the colors into a regular 3D grid of BIN-sized cubes, stored as one array
+of entry indices sorted by bin plus the start offset of every bin. A query only reads the
+bins overlapping its search box: the tolerance query the box around the L1 ball, the
+nearest neighbor query a cube of bins grown until the k-th nearest candidate is closer than
+any point outside of it. Both return exactly what the linear scan returned, ties included:
+entries are ordered by their position in the map.
+
+ColorIndex.resolve answers both queries for all colors of a plan at once, with one distance
+matrix per chunk of colors for small maps and the bins for large ones. Bot.resolve_colors
+uses it before a drawing starts.
+ColorResolution holds the result: where and how every color is selected, and which colors
+lie outside the calibrated gamut.
+'''
+
+import hashlib
+
+import numpy as np
+
+BIN = 8
+BINS = 256 // BIN
+
+
+class ColorIndex:
+    '''Binned grid over the colors of a {(r, g, b): (x, y)} calibration map'''
+
+    def __init__(self, calibration_map):
+        self.size = len(calibration_map)
+        self.colors = np.array(list(calibration_map.keys()), dtype=np.int32).reshape(-1, 3)
+        self.positions = list(calibration_map.values())
+
+        cells = self.colors // BIN
+        ids = (cells[:, 0] * BINS + cells[:, 1]) * BINS + cells[:, 2]
+        # Stable, so the entries of one bin stay in map order
+        self.order = np.argsort(ids, kind='stable')
+        self.starts = np.searchsorted(ids[self.order], np.arange(BINS ** 3 + 1))
+
+    def digest(self):
+        '''Short hash of the indexed colors and positions, identifies the calibration in cache keys'''
+        h = hashlib.md5(self.colors.astype(np.int32).tobytes())
+        h.update(np.asarray(self.positions, dtype=np.int64).tobytes())
+        return h.hexdigest()[:12]
+
+    def _candidates(self, low, high):
+        '''Indices of the entries in the bins from low to high (inclusive, per channel)'''
+        low = np.clip(low, 0, BINS - 1)
+        high = np.clip(high, 0, BINS - 1)
+        r, g, b = np.meshgrid(*(np.arange(lo, hi + 1) for lo, hi in zip(low, high)), indexing='ij')
+        ids = ((r * BINS + g) * BINS + b).ravel()
+        starts, ends = self.starts[ids], self.starts[ids + 1]
+        counts = ends - starts
+        total = int(counts.sum())
+        if not total:
+            return np.empty(0, dtype=np.intp)
+        # Concatenated ranges starts[j]..ends[j] without a Python loop
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return self.order[offsets + np.arange(total)]
+
+    def within(self, target, tolerance):
+        '''
+        Returns (color, difference, position) of the first entry within tolerance (Manhattan
+        distance) of target, or None
+        '''
+        target = np.asarray(target, dtype=np.int32)
+        candidates = self._candidates((target - tolerance) // BIN, (target + tolerance) // BIN)
+        if not len(candidates):
+            return None
+        diff = np.abs(self.colors[candidates] - target).sum(axis=1)
+        hits = candidates[diff <= tolerance]
+        if not len(hits):
+            return None
+        first = int(hits.min())
+        return tuple(int(v) for v in self.colors[first]), int(diff[candidates == first][0]), self.positions[first]
+
+    def nearest(self, target, k):
+        '''Returns the (distance, color, position) of the k nearest entries to target, nearest first'''
+        target = np.asarray(target, dtype=np.int32)
+        k = min(k, self.size)
+        cell = target // BIN
+        radius = 0
+        while True:
+            # Once the cube holds more bins than the map has entries, scanning the entries is cheaper
+            covers_all = (2 * radius + 1) ** 3 >= self.size or (np.all(cell - radius <= 0) and np.all(cell + radius >= BINS - 1))
+            if covers_all:
+                candidates = np.arange(self.size)
+            else:
+                candidates = self._candidates(cell - radius, cell + radius)
+            if len(candidates) >= k:
+                dist = np.sqrt(((self.colors[candidates] - target) ** 2).sum(axis=1))
+                # Sorted by distance, ties in map order like the stable sort of the linear scan
+                best = np.lexsort((candidates, dist))[:k]
+                # Every entry outside the searched bins is at least radius * BIN away
+                if covers_all or dist[best[-1]] < radius * BIN:
+                    return [(float(dist[j]), tuple(int(v) for v in self.colors[candidates[j]]), self.positions[candidates[j]])
+                            for j in best]
+            radius = radius * 2 or 1
+
+    def resolve(self, targets, tolerance=20, k=4, epsilon=0.0001, brute_force_size=2048, chunk_cells=1 << 20):
+        '''
+        Batch version of Bot.get_calibrated_color_position for (n, 3) targets. Returns (positions,
+        distances): the (n, 2) click positions, taken from the first entry within tolerance or
+        interpolated from the k nearest entries, and the Euclidean distance of each target to
+        the entry it matched or, if none is within tolerance, to its nearest entry.
+        '''
+        targets = np.asarray(targets, dtype=np.int64).reshape(-1, 3)
+        positions = np.zeros((len(targets), 2), dtype=np.int64)
+        distances = np.zeros(len(targets))
+        if not self.size or not len(targets):
+            return positions, distances
+        k = min(k, self.size)
+        if self.size > brute_force_size:
+            # The bins beat a full distance matrix on large maps
+            for i, target in enumerate(targets):
+                match = self.within(target, tolerance)
+                if match is not None:
+                    positions[i] = match[2]
+                    distances[i] = np.sqrt(((np.array(match[0]) - target) ** 2).sum())
+                    continue
+                neighbors = self.nearest(target, k)
+                distances[i] = neighbors[0][0]
+                weights = np.array([1.0 / (d + epsilon) for d, _, _ in neighbors])
+                weights /= weights.sum()
+                positions[i] = (weights[:, None] * np.array([pos for _, _, pos in neighbors], dtype=np.float64)).sum(axis=0)
+            return positions, distances
+
+        colors = self.colors.astype(np.int64)
+        points = np.asarray(self.positions, dtype=np.float64).reshape(-1, 2)
+        index = np.arange(self.size)
+        rows = max(1, chunk_cells // self.size)
+
+        for start in range(0, len(targets), rows):
+            block = targets[start:start + rows]
+            diff = colors[None, :, :] - block[:, None, :]
+            manhattan = np.abs(diff).sum(axis=2)
+            squared = (diff * diff).sum(axis=2)
+
+            within = manhattan <= tolerance
+            exact = within.any(axis=1)
+            first = np.where(exact, within.argmax(axis=1), squared.argmin(axis=1))
+            distances[start:start + len(block)] = np.sqrt(np.take_along_axis(squared, first[:, None], axis=1)[:, 0])
+            out = positions[start:start + len(block)]
+            out[exact] = points[first[exact]]
+
+            if not exact.all():
+                # Unique keys ordered by distance, then by map order like the stable sort of the scan
+                keys = squared[~exact] * self.size + index
+                nearest = np.argpartition(keys, k - 1, axis=1)[:, :k]
+                nearest = np.take_along_axis(nearest, np.argsort(np.take_along_axis(keys, nearest, axis=1), axis=1), axis=1)
+                weights = 1.0 / (np.sqrt(np.take_along_axis(squared[~exact], nearest, axis=1)) + epsilon)
+                weights /= weights.sum(axis=1, keepdims=True)
+                out[~exact] = (weights[:, :, None] * points[nearest]).sum(axis=1).astype(np.int64)
+        return positions, distances
+
+
+class ColorResolution:
+    '''
+    How every color of a plan is selected: source is 'palette', 'spectrum', 'keyboard' or
+    'none' (a calibration exists but cannot place the color), position the click position of
+    palette and spectrum colors. distance is how far the nearest calibrated color is from a
+    spectrum color; colors further away than the gamut tolerance are out_of_gamut.
+    '''
+
+    def __init__(self, colors, sources, positions, distances, gamut_tolerance):
+        self.colors = [tuple(int(v) for v in c) for c in colors]
+        self.sources = list(sources)
+        self.positions = [tuple(int(v) for v in p) if p is not None else None for p in positions]
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.gamut_tolerance = gamut_tolerance
+        self._lookup = {c: i for i, c in enumerate(self.colors)}
+
+    def __len__(self):
+        return len(self.colors)
+
+    def get(self, color):
+        '''Returns (source, position) of color'''
+        i = self._lookup[tuple(int(v) for v in color)]
+        return self.sources[i], self.positions[i]
+
+    @property
+    def out_of_gamut(self):
+        '''(color, distance) of the spectrum colors the calibration does not reach'''
+        return [(c, float(d)) for c, source, d in zip(self.colors, self.sources, self.distances)
+                if source == 'spectrum' and d > self.gamut_tolerance]
+
+    def summary(self):
+        counts = {}
+        for source in self.sources:
+            counts[source] = counts.get(source, 0) + 1
+        text = ', '.join(f"{n} {source}" for source, n in counts.items())
+        outside = self.out_of_gamut
+        if outside:
+            text += f", {len(outside)} outside the calibrated gamut"
+        return text
@@ -0,0 +1,84 @@
+'''
+Pause, resume and terminate signals of the drawing.
+
+The keyboard listener (main.py) and the window request pauses and terminations from their
+own threads while the draw thread replays the tape. DrawControl keeps both requests behind
+a lock and mirrors them into two threading.Events the draw thread can use without locking:
+
+    go      set while the drawing may continue, checked between tape events (a pause
+            takes effect before the next stroke or color switch)
+    wake    set unless paused, a paused draw thread blocks on it and wakes up as soon as
+            the drawing is resumed or terminated
+
+A paused bot does not poll and uses no CPU, and resuming takes effect immediately.
+'''
+
+import threading
+
+
+class DrawControl:
+    '''Thread-safe pause/terminate state of the bot'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paused = False
+        self._terminated = False
+        self.go = threading.Event()
+        self.wake = threading.Event()
+        self.go.set()
+        self.wake.set()
+
+    def _update(self):
+        # Called with the lock held
+        if self._paused or self._terminated:
+            self.go.clear()
+        else:
+            self.go.set()
+        if self._paused and not self._terminated:
+            self.wake.clear()
+        else:
+            self.wake.set()
+
+    def _set(self, paused=None, terminated=None):
+        with self._lock:
+            if paused is not None:
+                self._paused = paused
+            if terminated is not None:
+                self._terminated = terminated
+            self._update()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    def pause(self):
+        self._set(paused=True)
+
+    def resume(self):
+        self._set(paused=False)
+
+    def toggle_pause(self):
+        '''Pauses a running drawing or resumes a paused one. Returns True if now paused'''
+        with self._lock:
+            self._paused = not self._paused
+            self._update()
+            return self._paused
+
+    def terminate(self):
+        self._set(terminated=True)
+
+    def clear_terminate(self):
+        self._set(terminated=False)
+
+    def reset(self):
+        '''Clears both requests before a new drawing'''
+        self._set(paused=False, terminated=False)
+
+    def wait_while_paused(self, timeout=None):
+        '''Blocks while paused. Returns False if the drawing was terminated'''
+        self.wake.wait(timeout)
+        return not self._terminated
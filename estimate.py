@@ -0,0 +1,167 @@
+'''
+Drawing time estimates learned from run history.
+
+A drawing spends its time in three phases, which Bot._replay() times separately:
+
+    stroke   pressing, moving and releasing the button, including the segment waits
+    jump     the jump delays before strokes that start far from the previous one
+    switch   color switch procedures (helper clicks, palette/spectrum clicks, typing)
+
+The cost of each phase is modelled as a linear function of features of the event tape
+(see tape_features): the planned waits of the phase plus per-event overheads, e.g. a
+switch costs its planned waits times a factor plus a fixed cost for its selection mode.
+
+    stroke = a1 * stroke_wait + a2 * strokes + a3 * segments
+    jump   = b1 * jump_wait + b2 * jumps
+    switch = c1 * switch_wait + c2 * click_switches + c3 * keyboard_switches
+
+Every completed drawing appends its features and the measured phase durations to a local
+history file. CostModel fits the coefficients per phase with a ridge regression that pulls
+them towards a prior (planned waits taken at face value plus small overheads), so a few
+runs already refine the estimate without overfitting it. The spread of the past relative
+errors gives a confidence interval around every estimate.
+
+Estimates shown before a tape exists (test draw, pre-compute) use Bot.plan_features, which
+derives the same features from the plan's strokes and colors without compiling it.
+'''
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+import tape
+
+PHASES = {
+    'stroke': (('stroke_wait', 'strokes', 'segments'), (1.0, 0.004, 0.002)),
+    'jump': (('jump_wait', 'jumps'), (1.0, 0.002)),
+    'switch': (('switch_wait', 'click_switches', 'keyboard_switches'), (1.0, 0.1, 0.3))
+}
+
+
+def tape_features(compiled):
+    '''Counts and planned waits of a compiled EventTape, the inputs of the cost model'''
+    ops, args = compiled.ops, compiled.args
+    waits = ops == tape.WAIT
+    kinds = args[:, 1]
+    segment_waits = waits & (kinds == tape.SEGMENT_WAIT)
+    jump_waits = waits & (kinds == tape.JUMP_WAIT)
+    switch_waits = waits & (kinds == 0)
+
+    # A switch types its color if a key sequence is written between its COLOR marker and the next one
+    offsets = np.asarray(compiled.color_offsets)
+    starts = np.sort(offsets[offsets >= 0])
+    typed = np.flatnonzero((ops == tape.TYPE) | (ops == tape.CLIP))
+    keyboard = len(np.unique(np.searchsorted(starts, typed, side='right'))) if len(typed) else 0
+
+    return {
+        'strokes': int(np.count_nonzero(ops == tape.STROKE)),
+        'segments': int(np.count_nonzero(segment_waits)),
+        'stroke_wait': float(args[segment_waits, 0].astype(np.float64).sum()),
+        'jumps': int(np.count_nonzero(jump_waits)),
+        'jump_wait': float(args[jump_waits, 0].astype(np.float64).sum()),
+        'switch_wait': float(args[switch_waits, 0].astype(np.float64).sum() + args[ops == tape.READY, 1].astype(np.float64).sum()),
+        'click_switches': len(starts) - keyboard,
+        'keyboard_switches': keyboard
+    }
+
+
+class RunHistory:
+    '''
+    Append-only JSON lines file of completed drawings. Each record holds the tape features,
+    the measured seconds per phase and the input backend and pacing profile it ran with.
+    Only the last max_runs records are used.
+    '''
+
+    def __init__(self, path='draw_history.jsonl', max_runs=200):
+        self.path = path
+        self.max_runs = max_runs
+        self.enabled = True
+
+    def append(self, features, phases, backend, profile):
+        entry = {'time': time.time(), 'backend': backend, 'profile': profile,
+                 'features': features, 'phases': {k: round(v, 4) for k, v in phases.items()}}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def runs(self, backend=None, profile=None):
+        '''Returns the recorded runs, optionally only those of one backend and profile'''
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+
+        runs = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn record
+            if not isinstance(entry, dict) or not isinstance(entry.get('features'), dict) or not isinstance(entry.get('phases'), dict):
+                continue
+            if backend is not None and entry.get('backend') != backend:
+                continue
+            if profile is not None and entry.get('profile') != profile:
+                continue
+            runs.append(entry)
+        return runs[-self.max_runs:]
+
+    def mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+
+class CostModel:
+    '''
+    Per-phase linear cost model. prior_weight is how many runs the prior counts as,
+    prior_error the relative error assumed before any run was recorded and z the
+    quantile of the confidence interval (1.645 for 90%).
+    '''
+
+    def __init__(self, prior_weight=1.0, prior_error=0.5, z=1.645):
+        self.prior_weight = prior_weight
+        self.prior_error = prior_error
+        self.z = z
+        self.coefficients = {phase: np.array(prior, dtype=np.float64) for phase, (_, prior) in PHASES.items()}
+        self.log_error = math.log1p(prior_error)
+        self.runs = 0
+
+    def fit(self, runs):
+        '''Fits the coefficients of every phase to the recorded runs'''
+        self.runs = len(runs)
+        if not runs:
+            return self
+        for phase, (names, prior) in PHASES.items():
+            x = np.array([[float(run['features'].get(n, 0.0)) for n in names] for run in runs])
+            y = np.array([float(run['phases'].get(phase, 0.0)) for run in runs])
+            prior = np.array(prior, dtype=np.float64)
+            # Ridge towards the prior, each feature regularized on its own scale
+            lam = self.prior_weight * np.maximum((x ** 2).mean(axis=0), 1e-9)
+            w = np.linalg.solve(x.T @ x + np.diag(lam), x.T @ y + lam * prior)
+            self.coefficients[phase] = np.maximum(w, 0.0)
+
+        # Spread of the log ratio of actual to predicted time, pooled with the prior error
+        ratios = []
+        for run in runs:
+            predicted = self.predict_phases(run['features'])
+            actual = sum(float(v) for v in run['phases'].values())
+            if predicted > 0 and actual > 0:
+                ratios.append(math.log(actual / predicted))
+        n0 = 2.0
+        self.log_error = math.sqrt((n0 * math.log1p(self.prior_error) ** 2 + sum(r * r for r in ratios)) / (n0 + len(ratios)))
+        return self
+
+    def predict_phases(self, features):
+        return sum(float(np.dot(self.coefficients[phase], [float(features.get(n, 0.0)) for n in names]))
+                   for phase, (names, _) in PHASES.items())
+
+    def predict(self, features):
+        '''Returns (seconds, low, high), the estimate and its confidence interval'''
+        seconds = self.predict_phases(features)
+        spread = math.exp(self.z * self.log_error)
+        return seconds, seconds / spread, seconds * spread
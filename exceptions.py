@@ -12,3 +12,6 @@ class NoCanvasError(NoToolError):
 
 class NoCustomColorsError(NoToolError):
     pass
+
+class InputBackendError(Exception):
+    pass
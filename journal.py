@@ -0,0 +1,114 @@
+'''
+Crash-safe draw checkpoints.
+
+While a drawing runs, the bot appends a checkpoint to a small journal file every
+every_strokes strokes or every_seconds seconds, whichever comes first. Every record is
+one JSON line holding the hash of the plan (EventTape.digest()), the color and line index
+of the last completed stroke and the stroke counts:
+
+    {"plan": "3f1c...", "color_idx": 4, "line_idx": 117, "stroke": 2981, "total": 40210, "time": ...}
+
+Records are flushed and fsynced as they are written, but only at the checkpoint rate, so
+the draw loop pays for one small write every few seconds. A record torn by a crash or power
+loss is ignored when reading and the one before it is used instead.
+
+The journal is removed when a drawing completes. If the app is closed or crashes midway,
+the next Start of the same plan offers to resume from the last checkpoint. A resumed
+drawing appends to the journal and records the position it resumes from right away, so
+the checkpoint survives a crash before the first new one is due.
+'''
+
+import json
+import os
+import time
+
+
+class Checkpoint:
+    '''Last recorded position of a drawing'''
+
+    def __init__(self, plan, color_idx, line_idx, stroke, total, time):
+        self.plan = plan
+        self.color_idx = color_idx
+        self.line_idx = line_idx
+        self.stroke = stroke
+        self.total = total
+        self.time = time
+
+
+class CheckpointJournal:
+    '''Append-only checkpoint file of the running drawing'''
+
+    def __init__(self, path='draw_checkpoint.jsonl', every_strokes=250, every_seconds=10.0):
+        self.path = path
+        self.every_strokes = every_strokes
+        self.every_seconds = every_seconds
+        self.enabled = True
+        self._file = None
+        self._plan = None
+        self._total = 0
+
+    def begin(self, plan, total, resume=None):
+        '''
+        Starts the journal of a drawing, replacing the one of any previous drawing. A drawing
+        resumed at resume (color_idx, line_idx, stroke) keeps the journal and records it.
+        '''
+        self.close()
+        self._plan = plan
+        self._total = total
+        if resume is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        except OSError:
+            torn = False  # Missing or empty
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write('\n')  # Start on a new line after a torn record
+        self.record(*resume)
+
+    def record(self, color_idx, line_idx, stroke):
+        '''Appends a checkpoint and makes sure it reached the disk'''
+        if self._file is None:
+            return
+        entry = {'plan': self._plan, 'color_idx': color_idx, 'line_idx': line_idx,
+                 'stroke': stroke, 'total': self._total, 'time': time.time()}
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        '''Closes the journal and keeps it, so the drawing can be resumed later'''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        '''Closes and removes the journal of a completed drawing'''
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def last(self, plan=None):
+        '''Returns the last intact Checkpoint, or None. If plan is given it must match'''
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+
+        for line in reversed(lines):
+            try:
+                entry = json.loads(line)
+                checkpoint = Checkpoint(entry['plan'], int(entry['color_idx']), int(entry['line_idx']),
+                                        int(entry['stroke']), int(entry['total']), float(entry['time']))
+            except (ValueError, KeyError, TypeError):
+                continue  # Torn or foreign record
+            if plan is not None and checkpoint.plan != plan:
+                return None
+            return checkpoint
+        return None
@@ -0,0 +1,112 @@
+'''
+Leveled, asynchronous logging.
+
+Every subsystem logs through its own logger:
+
+    draw         drawing, test draws and tape compilation
+    calibration  custom color calibration and spectrum lookups
+    cache        plan pre-computation and the plan cache
+    overlay      progress overlays
+    input        input backends
+
+Records are handed to a queue and formatted and written by a background thread, so
+console I/O never blocks the draw loop. Levels are configured in config.json:
+
+    "log_settings": {
+        "level": "INFO",
+        "levels": {"calibration": "DEBUG"},
+        "progress_interval": 1.0
+    }
+
+At DEBUG level the draw logger reports every single stroke, otherwise progress is
+sampled every progress_interval seconds.
+'''
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+ROOT = 'pyaint'
+SUBSYSTEMS = ('draw', 'calibration', 'cache', 'overlay', 'input')
+
+_listener = None
+
+
+class _Formatter(logging.Formatter):
+    '''Plain messages like the print() output they replace, with the level for warnings and errors'''
+
+    def format(self, record):
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            return f"{record.levelname}: {message}"
+        return message
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that leaves formatting to the listener thread. The stock handler merges
+    the message arguments in the logging thread, which is exactly the work to keep off
+    the hot path. Arguments must therefore not be mutated after logging.
+    '''
+
+    def prepare(self, record):
+        return record
+
+
+def _start(stream=None):
+    global _listener
+    if _listener is not None:
+        return
+
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(_Formatter('%(message)s'))
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(shutdown)
+
+    root = logging.getLogger(ROOT)
+    root.addHandler(_DeferredQueueHandler(records))
+    root.setLevel(logging.INFO)
+    root.propagate = False
+
+
+def get_logger(subsystem):
+    '''Returns the logger of a subsystem, starting the background writer on first use'''
+    _start()
+    return logging.getLogger(f'{ROOT}.{subsystem}')
+
+
+def configure(level='INFO', levels=None):
+    '''
+    Sets the default level and optional per-subsystem levels, e.g.
+    configure('WARNING', {'draw': 'INFO'}). Unknown level names raise ValueError.
+    '''
+    _start()
+    logging.getLogger(ROOT).setLevel(_level(level))
+    levels = levels or {}
+    for subsystem in SUBSYSTEMS:
+        logging.getLogger(f'{ROOT}.{subsystem}').setLevel(_level(levels[subsystem]) if subsystem in levels else logging.NOTSET)
+
+
+def _level(name):
+    if isinstance(name, int):
+        return name
+    level = logging.getLevelName(str(name).upper())
+    if not isinstance(level, int):
+        raise ValueError(f'Unknown log level: {name}')
+    return level
+
+
+def shutdown():
+    '''Writes out all queued records and stops the background writer'''
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger(ROOT)
+        for handler in list(root.handlers):
+            if isinstance(handler, _DeferredQueueHandler):
+                root.removeHandler(handler)
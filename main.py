@@ -9,7 +9,7 @@ def on_pynput_key(key):
     try:
         # Handle ESC key for termination
         if key == pynput_keyboard.Key.esc:
-            bot.terminate = True
+            bot.control.terminate()
             return
 
         # Handle pause/resume when bot is actively drawing
@@ -25,8 +25,7 @@ def on_pynput_key(key):
 
             # Check if it matches the pause key
             if key_name == bot.pause_key.lower():
-                bot.paused = not bot.paused
-                print(f"Pause toggled: {bot.paused}")
+                print(f"Pause toggled: {bot.control.toggle_pause()}")
                 return
 
     except Exception as e:
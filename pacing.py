@@ -0,0 +1,211 @@
+'''
+High resolution pacing of brush strokes.
+
+time.sleep() overshoots by up to a millisecond on most systems (and up to ~15 ms on older
+Windows timers), which adds up over the segments of a stroke. The segment timestamps of
+every stroke are planned up front on the event tape (see tape.py) and StrokeScheduler
+waits for them with a hybrid strategy: it sleeps while the deadline is far away and
+busy-waits on perf_counter_ns() for the last stretch. Deadlines are absolute, so a late
+segment never delays the ones after it.
+
+The difference between planned and actual stroke duration is tracked, so the effect of
+lowering the Delay setting can be checked after every drawing.
+
+AdaptivePacing goes one step further and tunes the delays while drawing: it checks that
+strokes actually leave paint on the canvas and scales the stroke and jump waits of the
+tape down while they do and up when they do not. What it learned is stored per app
+profile by PacingProfiles and used as the starting point of the next drawing.
+'''
+
+import json
+import time
+
+import numpy as np
+from PIL import ImageGrab
+
+import log
+from cache import atomic_write
+
+draw_log = log.get_logger('draw')
+
+
+class PacingStats:
+    '''Accumulated timing error of the strokes drawn by a scheduler'''
+
+    def __init__(self):
+        self.strokes = 0
+        self.total_error_ns = 0
+        self.max_error_ns = 0
+        self.late_waits = 0
+        self.waits = 0
+
+    def record_stroke(self, target_ns, actual_ns):
+        error = abs(actual_ns - target_ns)
+        self.strokes += 1
+        self.total_error_ns += error
+        self.max_error_ns = max(self.max_error_ns, error)
+
+    @property
+    def mean_error_ms(self):
+        return self.total_error_ns / self.strokes / 1e6 if self.strokes else 0.0
+
+    @property
+    def max_error_ms(self):
+        return self.max_error_ns / 1e6
+
+    def summary(self):
+        return (f"{self.strokes} strokes, stroke time error mean {self.mean_error_ms:.2f} ms, "
+                f"max {self.max_error_ms:.2f} ms, {self.late_waits}/{self.waits} segment deadlines missed")
+
+
+class StrokeScheduler:
+    '''
+    Waits for segment deadlines and keeps track of the timing error of drawn strokes.
+    spin_ms is how long before a deadline the scheduler stops sleeping and starts spinning.
+    late_ms is how far past a deadline a segment may be before it counts as missed.
+    '''
+
+    def __init__(self, spin_ms=1.5, late_ms=1.0):
+        self.spin_ns = int(spin_ms * 1e6)
+        self.late_ns = int(late_ms * 1e6)
+        self.stats = PacingStats()
+
+    def reset(self):
+        self.stats = PacingStats()
+
+    def wait_until(self, deadline_ns):
+        '''Waits until perf_counter_ns() reaches deadline_ns. Returns how late it woke up in ns'''
+        while True:
+            remaining = deadline_ns - time.perf_counter_ns()
+            if remaining <= 0:
+                return -remaining
+            if remaining > self.spin_ns:
+                time.sleep((remaining - self.spin_ns) / 1e9)
+
+
+class AdaptivePacing:
+    '''
+    Closed-loop tuning of the stroke and jump delays. Every check_every strokes the canvas
+    pixels under the next stroke are sampled right before and right after it is drawn. The
+    delays (as a scale of the configured ones) are lowered after every streak of strokes
+    that landed. A missed stroke raises them by backoff and puts a floor at the last scale
+    that still worked, so the scale converges on the fastest reliable rate.
+    '''
+
+    def __init__(self, check_every=25, speedup=0.85, backoff=1.5, streak=3, min_scale=0.1, max_scale=4.0,
+                 render_delay=0.03, threshold=24, grab=None):
+        self.check_every = check_every
+        self.speedup = speedup
+        self.backoff = backoff
+        self.streak = streak
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.render_delay = render_delay
+        self.threshold = threshold
+        self.grab = grab or (lambda box: ImageGrab.grab(bbox=box))
+        self.enabled = True
+        self.scale = 1.0
+        self.reset()
+
+    def reset(self, scale=1.0):
+        self.scale = min(self.max_scale, max(self.min_scale, scale))
+        self.floor = self.min_scale
+        self.pending = None
+        self.checks = 0
+        self.misses = 0
+        self._landed_streak = 0
+
+    def _sample(self, points):
+        xs = [int(p[0]) for p in points]
+        ys = [int(p[1]) for p in points]
+        box = (min(xs) - 1, min(ys) - 1, max(xs) + 2, max(ys) + 2)
+        try:
+            return box, np.asarray(self.grab(box).convert('RGB'), dtype=np.int16)
+        except Exception as e:
+            draw_log.warning(f"[AdaptivePacing] Screen capture failed, adaptive pacing disabled: {e}")
+            self.enabled = False
+            return None
+
+    def prepare(self, stroke, points, color):
+        '''Samples the canvas under points of the stroke that is drawn next'''
+        self.pending = None
+        if not self.enabled or not points:
+            return
+        sample = self._sample(points)
+        if sample is not None:
+            self.pending = (stroke, points, np.array(color, dtype=np.int16), sample)
+
+    def cancel(self):
+        self.pending = None
+
+    def verify(self, stroke):
+        '''
+        Checks whether the prepared stroke left paint on the canvas and adapts the scale.
+        Returns True if it landed, False if it was missed and None if it could not be told.
+        '''
+        pending, self.pending = self.pending, None
+        if pending is None or pending[0] != stroke:
+            return None
+        _, points, color, (box, before) = pending
+        time.sleep(self.render_delay)  # Let the app render the stroke
+        sample = self._sample(points)
+        if sample is None:
+            return None
+        after = sample[1]
+
+        conclusive = landed = 0
+        for x, y in points:
+            cx, cy = int(x) - box[0], int(y) - box[1]
+            old = before[max(0, cy - 1):cy + 2, max(0, cx - 1):cx + 2]
+            new = after[max(0, cy - 1):cy + 2, max(0, cx - 1):cx + 2]
+            # Canvas already close to the stroke color, painting it would not show
+            if np.abs(old - color).max(axis=-1).min() <= self.threshold:
+                continue
+            conclusive += 1
+            if np.abs(new - old).max() > self.threshold:
+                landed += 1
+        if not conclusive:
+            return None
+
+        self.checks += 1
+        if landed * 2 >= conclusive:
+            self._landed_streak += 1
+            if self._landed_streak >= self.streak:
+                self._landed_streak = 0
+                self.scale = max(self.floor, self.scale * self.speedup)
+            return True
+
+        self.misses += 1
+        self._landed_streak = 0
+        # The scale before the last speedup still worked, never go below it again
+        self.floor = min(self.max_scale, max(self.floor, self.scale / self.speedup))
+        self.scale = min(self.max_scale, max(self.floor, self.scale * self.backoff))
+        return False
+
+    def summary(self):
+        return f"scale {self.scale:.2f}, {self.checks} checks, {self.misses} missed"
+
+
+class PacingProfiles:
+    '''Learned delays per app profile, stored as JSON: {profile: {"delay": s, "jump_delay": s, ...}}'''
+
+    def __init__(self, path='pacing_profiles.json'):
+        self.path = path
+
+    def _load_all(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                profiles = json.load(f)
+            return profiles if isinstance(profiles, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, profile):
+        return self._load_all().get(profile)
+
+    def save(self, profile, delay, jump_delay, checks=0, misses=0):
+        profiles = self._load_all()
+        profiles[profile] = {'delay': delay, 'jump_delay': jump_delay, 'checks': checks,
+                             'misses': misses, 'updated': time.time()}
+        with atomic_write(self.path) as f:
+            json.dump(profiles, f, indent=2)
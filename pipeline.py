@@ -0,0 +1,234 @@
+'''
+Stages of the image processing pipeline used by Bot.process().
+
+    decode_grid    image file -> downscaled RGB grid
+    quantize_grid  RGB grid   -> index grid + color table (interval_quantizer, cluster_quantizer
+                   or the nearest palette color)
+    build_runs     index grid -> run table
+    slot_runs / merge_runs      run table -> plan in grid units
+
+Each stage only depends on its own inputs, which lets the bot cache them separately.
+Coordinates produced here are in grid units (columns/rows). Bot translates them into
+screen coordinates using the pixel size and the canvas origin.
+
+A run table is an int32 array of shape (n, 4), one row per brush stroke, holding
+(color index, row, start column, end column) in drawing order.
+'''
+
+import numpy as np
+import utils
+
+from PIL import Image
+
+
+def _resize_nearest(img, size):
+    try:
+        # Try newer PIL syntax
+        return img.resize(size, resample=Image.Resampling.NEAREST)
+    except AttributeError:
+        # Fallback to older PIL syntax
+        return img.resize(size, resample=Image.NEAREST)  # type: ignore
+
+
+def decode_grid(file, canvas_size, step):
+    '''
+    Opens the image, shrinks it to fit the canvas at the given pixel size and returns
+    the RGB grid as an (h, w, 3) uint8 array.
+    '''
+    img = Image.open(file).convert('RGBA')
+    tw, th = tuple(int(p // step) for p in utils.adjusted_img_size(img, canvas_size))
+    return image_grid(img, (tw, th))
+
+
+def image_grid(img, size):
+    '''Returns an (h, w, 3) uint8 array of img resized to size with nearest neighbour sampling'''
+    img_small = _resize_nearest(img.convert('RGBA'), size)
+    return np.asarray(img_small, dtype=np.uint8)[:, :, :3].copy()
+
+
+def grid_origin(grid, canvas_size, step):
+    '''Returns the (x, y) offset from the canvas origin that centers the grid on the canvas'''
+    th, tw = grid.shape[:2]
+    cw, ch = canvas_size
+    return (cw - tw * step) // 2, (ch - th * step) // 2
+
+
+def quantize_grid(grid, nearest):
+    '''
+    Maps every pixel of grid to the color returned by nearest(rgb). The function is only
+    evaluated once per distinct color. Returns (index grid, color table) where the index
+    grid holds positions into the color table.
+    '''
+    h, w = grid.shape[:2]
+    packed = (grid[:, :, 0].astype(np.uint32) << 16) | (grid[:, :, 1].astype(np.uint32) << 8) | grid[:, :, 2]
+    uniques, inverse = np.unique(packed.ravel(), return_inverse=True)
+
+    colors = []
+    color_index = {}
+    lut = np.empty(len(uniques), dtype=np.int32)
+    for i, p in enumerate(uniques.tolist()):
+        col = tuple(int(v) for v in nearest(((p >> 16) & 255, (p >> 8) & 255, p & 255)))
+        if col not in color_index:
+            color_index[col] = len(colors)
+            colors.append(col)
+        lut[i] = color_index[col]
+
+    return lut[inverse].reshape(h, w), colors
+
+
+def interval_quantizer(accuracy):
+    '''Returns the custom color quantizer that snaps each component to an accuracy dependent interval'''
+    # Create interval size from normalized accuracy value
+    # Also setting a lower bound value of 1 to prevent interval_size from reaching 0
+    interval_size = max((1 - accuracy) * 255, 1)
+    return lambda col: tuple(int(round(v / interval_size) * interval_size) for v in col)
+
+
+def _nearest_rows(points, table, chunk_cells=1 << 20):
+    '''Index of the nearest row of table (Euclidean) for every row of points'''
+    nearest = np.empty(len(points), dtype=np.intp)
+    norms = (table ** 2).sum(axis=1)
+    rows = max(1, chunk_cells // max(len(table), 1))
+    for start in range(0, len(points), rows):
+        block = points[start:start + rows]
+        # |p - t|^2 without the |p|^2 term, which is the same for every t
+        nearest[start:start + len(block)] = (norms[None, :] - 2 * block @ table.T).argmin(axis=1)
+    return nearest
+
+
+def cluster_quantizer(grid, count, snap, iterations=8, seed=0):
+    '''
+    Returns the quantizer that maps every color of grid to one of at most count reachable
+    colors. The distinct colors of grid are clustered with k-means weighted by their pixel
+    count, every center is moved to snap(center), the nearest color that can actually be
+    selected, and each grid color goes to the nearest of the snapped colors. Centers that
+    snap to the same color are merged, so the returned colors are all distinct.
+    '''
+    packed = (grid[:, :, 0].astype(np.uint32) << 16) | (grid[:, :, 1].astype(np.uint32) << 8) | grid[:, :, 2]
+    uniques, weights = np.unique(packed.ravel(), return_counts=True)
+    points = np.stack([(uniques >> 16) & 255, (uniques >> 8) & 255, uniques & 255], axis=1).astype(np.float64)
+    weights = weights.astype(np.float64)
+
+    if len(points) <= count:
+        centers = points
+    else:
+        # k-means++ seeding with a fixed seed, the result is cached with the plan
+        rng = np.random.default_rng(seed)
+        centers = np.empty((count, 3))
+        centers[0] = points[np.argmax(weights)]
+        closest = ((points - centers[0]) ** 2).sum(axis=1)
+        for i in range(1, count):
+            p = closest * weights
+            centers[i] = points[rng.choice(len(points), p=p / p.sum())] if p.sum() > 0 else points[i]
+            closest = np.minimum(closest, ((points - centers[i]) ** 2).sum(axis=1))
+        for _ in range(iterations):
+            labels = _nearest_rows(points, centers)
+            mass = np.bincount(labels, weights=weights, minlength=count)
+            sums = np.stack([np.bincount(labels, weights=weights * points[:, c], minlength=count) for c in range(3)], axis=1)
+            moved = np.where(mass[:, None] > 0, sums / np.maximum(mass, 1)[:, None], centers)
+            if np.allclose(moved, centers):
+                break
+            centers = moved
+
+    table = list(dict.fromkeys(tuple(int(v) for v in snap(c)) for c in centers.tolist()))
+    colors = np.array(table, dtype=np.float64)
+    lut = dict(zip(uniques.tolist(), (table[i] for i in _nearest_rows(points, colors).tolist())))
+    return lambda col: lut[(int(col[0]) << 16) | (int(col[1]) << 8) | int(col[2])]
+
+
+def build_runs(index):
+    '''
+    Splits the index grid into horizontal brush strokes. The grid is walked row by row and a
+    stroke of the previous color ends whenever the color changes or the end of a row is reached.
+    Strokes include the pixel at which they end, the next stroke starts right after it.
+    '''
+    h, w = index.shape
+    seq = index.ravel()
+    if seq.size == 0:
+        return np.empty((0, 4), dtype=np.int32)
+
+    prev = np.empty_like(seq)
+    prev[0] = -1
+    prev[1:] = seq[:-1]
+
+    pos = np.arange(seq.size)
+    ends = pos[(pos % w == w - 1) | ((prev != -1) & (prev != seq))]
+    # A 1 pixel wide image ends its very first stroke before any color has been seen
+    ends = ends[prev[ends] != -1]
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+
+    runs = np.empty((len(ends), 4), dtype=np.int32)
+    runs[:, 0] = prev[ends]
+    runs[:, 1] = ends // w
+    runs[:, 2] = starts % w
+    runs[:, 3] = ends % w
+    return runs
+
+
+def slot_runs(runs, skip=None):
+    '''
+    SLOTTED plan: every stroke is drawn with its own color. Returns {color index: [(row, x1, x2)]}
+    ordered by first appearance of each color. Strokes of the skip color index are dropped.
+    '''
+    plan = dict()
+    for ci, row, x1, x2 in runs.tolist():
+        if ci == skip:
+            continue
+        plan.setdefault(ci, []).append((row, x1, x2))
+    return plan
+
+
+def merge_runs(runs, step, skip=None):
+    '''
+    LAYERED plan: colors are drawn in decreasing order of coverage. Neighbouring strokes of
+    colors drawn later are merged into a single stroke of the current color, since they will
+    be painted over again by their own color afterwards.
+    Returns {color index: [(row, x1, x2)]} in drawing order. The skip color is never drawn
+    but still acts as a layer.
+    '''
+    if len(runs) == 0:
+        return dict()
+
+    colors, rows, x1s, x2s = runs[:, 0], runs[:, 1], runs[:, 2], runs[:, 3]
+
+    # Coverage of each color in screen pixels, ties are broken by first appearance
+    coverage = np.bincount(colors, weights=(x2s - x1s) * step + 1)
+    present, first_seen = np.unique(colors, return_index=True)
+    order = sorted(present.tolist(), key=lambda c: (-coverage[c], first_seen[np.searchsorted(present, c)]))
+    level = np.empty(int(colors.max()) + 1, dtype=np.int64)
+    level[order] = np.arange(len(order))
+    run_levels = level[colors]
+
+    # Index of the first run of every row, used to split groups at row boundaries
+    row_change = np.empty(len(runs), dtype=bool)
+    row_change[0] = True
+    row_change[1:] = rows[1:] != rows[:-1]
+
+    plan = dict()
+    for lvl, col in enumerate(order):
+        if col == skip:
+            continue
+
+        # Consecutive runs that are drawn at this layer or later form one candidate stroke
+        coverable = run_levels >= lvl
+        group_start = coverable & (row_change | np.concatenate(([True], ~coverable[:-1])))
+        group_id = np.cumsum(group_start) - 1
+        members = np.flatnonzero(coverable)
+        if members.size == 0:
+            continue
+        gids = group_id[members]
+
+        # Only keep groups that actually expose the current color
+        exposed = np.zeros(gids[-1] + 1, dtype=bool)
+        exposed[gids[colors[members] == col]] = True
+        firsts = members[np.r_[True, gids[1:] != gids[:-1]]]
+        lasts = members[np.r_[gids[1:] != gids[:-1], True]]
+        keep = exposed[group_id[firsts]]
+
+        lines = list(zip(rows[firsts[keep]].tolist(), x1s[firsts[keep]].tolist(), x2s[lasts[keep]].tolist()))
+        if lines:
+            plan[col] = lines
+
+    return plan
@@ -0,0 +1,153 @@
+'''
+Binary, memory-mappable format for cached drawing plans.
+
+    header    magic, version, metadata length, data offset      (struct '<8sIIQ')
+    metadata  UTF-8 JSON: plan inputs, settings, ... and the color table, which holds
+              the stroke offset and stroke count of every color
+    data      int32 strokes (x1, y1, x2, y2) relative to the canvas origin, stored
+              color after color and aligned to 16 bytes
+
+MappedPlan maps the data section and hands out strokes on demand, so even plans with
+millions of strokes open instantly and use constant memory while drawing. Close it (or use
+it as a context manager) once the plan has been drawn: a mapped file cannot be replaced or
+deleted on Windows, which would make recomputing or evicting the plan fail.
+'''
+
+import json
+import mmap
+import struct
+
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+MAGIC = b'PYAINTPL'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQ')
+
+
+def write_plan(f, plan, meta):
+    '''
+    Writes a plan to the binary file object f. plan is a list of (color, strokes) pairs where
+    strokes is an (n, 4) integer array relative to the canvas origin. meta must be JSON
+    serializable and is returned again by MappedPlan.meta.
+    '''
+    header = _HEADER
+    color_table, offset = [], 0
+    for col, strokes in plan:
+        color_table.append({'color': [int(v) for v in col], 'offset': offset, 'count': len(strokes)})
+        offset += len(strokes)
+
+    meta_bytes = json.dumps(dict(meta, colors=color_table)).encode('utf-8')
+    data_offset = -(-(header.size + len(meta_bytes)) // 16) * 16
+
+    f.write(header.pack(MAGIC, VERSION, len(meta_bytes), data_offset))
+    f.write(meta_bytes)
+    f.write(b'\0' * (data_offset - header.size - len(meta_bytes)))
+    for _, strokes in plan:
+        f.write(np.ascontiguousarray(strokes, dtype='<i4').tobytes())
+
+
+class StrokeSequence(Sequence):
+    '''Read-only view of the strokes of one color, translated to screen coordinates on access'''
+
+    def __init__(self, ints, origin=(0, 0)):
+        self._ints = ints
+        self._dx, self._dy = origin
+
+    def __len__(self):
+        return len(self._ints) // 4
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('stroke index out of range')
+        x1, y1, x2, y2 = self._ints[i * 4:i * 4 + 4]
+        return ((x1 + self._dx, y1 + self._dy), (x2 + self._dx, y2 + self._dy))
+
+    def __iter__(self):
+        ints, dx, dy = self._ints, self._dx, self._dy
+        for i in range(0, len(ints), 4):
+            yield ((ints[i] + dx, ints[i + 1] + dy), (ints[i + 2] + dx, ints[i + 3] + dy))
+
+    @property
+    def origin(self):
+        '''(x, y) offset added to the stored strokes on access'''
+        return self._dx, self._dy
+
+    @property
+    def raw(self):
+        '''(n, 4) int32 array view of the untranslated strokes, no copy is made'''
+        return np.frombuffer(self._ints, dtype=np.int32).reshape(-1, 4)
+
+
+class MappedPlan(Mapping):
+    '''
+    Color table backed by a memory-mapped plan file. Behaves like the dict returned by
+    Bot.process(): keys are RGB tuples in drawing order and values are stroke sequences.
+    '''
+
+    def __init__(self, path, origin=(0, 0)):
+        header = _HEADER
+        with open(path, 'rb') as f:
+            magic, version, meta_len, data_offset = header.unpack(f.read(header.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'Not a plan file of version {VERSION}: {path}')
+            self.meta = json.loads(f.read(meta_len).decode('utf-8'))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        total = sum(c['count'] for c in self.meta['colors'])
+        data = memoryview(self._mmap)[data_offset:data_offset + total * 16]
+        if len(data) != total * 16:
+            data.release()
+            self._mmap.close()
+            raise ValueError(f'Plan file is truncated: {path}')
+        ints = data.cast('i')
+        self._views = [data, ints]
+
+        self._lines = {
+            tuple(c['color']): StrokeSequence(ints[c['offset'] * 4:(c['offset'] + c['count']) * 4], origin)
+            for c in self.meta['colors']
+        }
+
+    @property
+    def closed(self):
+        return self._mmap is None
+
+    def close(self):
+        '''
+        Unmaps the plan file, its strokes cannot be read afterwards. Returns False if arrays
+        handed out by StrokeSequence.raw are still alive, the file is then unmapped once they
+        are garbage collected.
+        '''
+        if self._mmap is None:
+            return True
+        try:
+            # Views of the mapping must be released before it can be closed
+            for lines in self._lines.values():
+                lines._ints.release()
+            for view in reversed(self._views):
+                view.release()
+            self._mmap.close()
+        except BufferError:
+            return False
+        self._mmap = None
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, color):
+        return self._lines[color]
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def __len__(self):
+        return len(self._lines)
@@ -0,0 +1,51 @@
+'''
+Lock-free progress reporting from the draw thread to the UI.
+
+The draw loop must not touch Tk: widgets may only be used from the thread running the
+Tk main loop, and redrawing a window on every stroke makes the overlay cost grow with
+the stroke rate. Instead the bot writes plain counters into a ProgressChannel and the
+window reads them from its main loop at a fixed rate (see Window._render_progress_overlay).
+
+There is exactly one writer (the draw thread) and every field is written with a single
+attribute assignment, which is atomic in CPython, so no locks are needed. A reader may see
+counters from two consecutive strokes, which is harmless for a progress display.
+'''
+
+import time
+
+
+class ProgressChannel:
+    '''Stroke counters of the running drawing, written by the draw thread only'''
+
+    def __init__(self):
+        self.completed = 0
+        self.total = 0
+        self.started = 0.0
+        self.active = False
+
+    def begin(self, total, completed=0):
+        '''Starts a new drawing session of total strokes'''
+        self.total = total
+        self.completed = completed
+        self.started = time.time()
+        self.active = True
+
+    def end(self):
+        self.active = False
+
+    def snapshot(self):
+        '''Returns (completed, total, eta seconds). The ETA assumes the average rate so far'''
+        completed, total, started = self.completed, self.total, self.started
+        if completed <= 0:
+            return completed, total, 0.0
+        elapsed = time.time() - started
+        return completed, total, elapsed / completed * max(0, total - completed)
+
+
+def format_eta(seconds):
+    '''Compact ETA for the progress overlay: 42s, 3:07 or 1:15h'''
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+    return f"{int(seconds // 3600)}:{int((seconds % 3600) // 60):02d}h"
@@ -0,0 +1,114 @@
+'''
+Readiness detection for the color switch procedure.
+
+Target apps usually react to a helper click (New Layer, Color Button, a spectrum click,
+Color Button Okay) long before the fixed delays configured for the slowest machine run
+out. ReadinessProbe samples a small screen region instead: it takes a baseline right
+before the click and, after the click, proceeds as soon as the region has changed and
+settled. A region that does not change waits out the fixed delay, which is kept as the
+timeout: a slow app that has not reacted yet looks the same as one that never will. A
+quiet period after which an unchanged region counts as ready can be opted into.
+
+    region                  watched after
+    layer panel             New Layer (the square around the button unless configured)
+    custom colors box       Color Button and Color Button Okay (the dialog opens / closes)
+    color preview spot      a palette or spectrum click
+
+If the screen can not be captured the probe disables itself and every wait falls back
+to the fixed delay.
+'''
+
+import time
+
+import numpy as np
+from PIL import ImageGrab
+
+import log
+
+draw_log = log.get_logger('draw')
+
+
+class ReadinessStats:
+    '''Outcome of the readiness waits of one drawing'''
+
+    def __init__(self):
+        self.waits = 0
+        self.timeouts = 0
+        self.saved_seconds = 0.0
+
+    def summary(self):
+        return f"{self.waits} waits, {self.timeouts} timed out, {self.saved_seconds:.1f}s saved"
+
+
+class ReadinessProbe:
+    '''
+    Waits for a screen region to react. interval is the time between two samples, settle
+    how long a region must stay the same to count as settled and quiet, if not 0, how long
+    an unchanged region is watched before it is assumed the app was already ready. Points
+    are watched through the square of half size radius around them.
+    '''
+
+    def __init__(self, interval=0.02, settle=0.06, quiet=0.0, radius=8, grab=None):
+        self.enabled = True
+        self.radius = radius
+        self.interval = interval
+        self.settle = settle
+        self.quiet = quiet
+        self.grab = grab or (lambda box: ImageGrab.grab(bbox=box))
+        self.stats = ReadinessStats()
+
+    def reset(self):
+        self.stats = ReadinessStats()
+
+    def square(self, point):
+        '''Region around a point, as (x1, y1, x2, y2)'''
+        x, y = int(point[0]), int(point[1])
+        return (x - self.radius, y - self.radius, x + self.radius + 1, y + self.radius + 1)
+
+    def sample(self, box):
+        '''Returns the pixels of box as an array, or None if the screen can not be captured'''
+        if not self.enabled:
+            return None
+        try:
+            return np.asarray(self.grab(tuple(int(v) for v in box)))
+        except Exception as e:
+            draw_log.warning(f"[Readiness] Screen capture failed, using fixed delays: {e}")
+            self.enabled = False
+            return None
+
+    def wait(self, box, baseline, timeout):
+        '''
+        Waits until box has changed from baseline (taken before the click) and settled, or
+        stayed unchanged for the quiet period if one is set, at most timeout seconds. Returns
+        True if the region became ready before the timeout.
+        '''
+        start = time.perf_counter()
+        deadline = start + timeout
+        previous = None
+        stable_since = None
+        while self.enabled:
+            frame = self.sample(box)
+            if frame is None:
+                break
+            now = time.perf_counter()
+            if previous is None or not np.array_equal(frame, previous):
+                stable_since = now
+            previous = frame
+
+            if now - stable_since >= self.settle:
+                changed = baseline is not None and not np.array_equal(frame, baseline)
+                if changed or (self.quiet > 0 and now - start >= self.quiet):
+                    self.stats.waits += 1
+                    self.stats.saved_seconds += max(0.0, deadline - now)
+                    return True
+            if now >= deadline:
+                self.stats.waits += 1
+                self.stats.timeouts += 1
+                return False
+            time.sleep(min(self.interval, deadline - now))
+
+        # No screen access, wait out the fixed delay
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return False
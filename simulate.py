@@ -0,0 +1,206 @@
+'''
+Offline simulation of a drawing.
+
+The plan of an image is compiled and replayed exactly like Start does, but through the
+simulation input backend (backends.SimulationBackend): strokes are painted onto an in-memory
+canvas with a configurable brush and every delay, jump and color switch only advances a
+virtual clock. A drawing that takes an hour runs in seconds and needs no display, so
+planners and settings can be compared in CI:
+
+    python simulate.py image.png --out render.png
+    python simulate.py image.png --mode slotted --delay 0.05 --brush 3 --json
+
+Every run reports
+    duration    simulated drawing time, including all waits of the color switches
+    fidelity    similarity of the rendered canvas to the source image, 0 to 1
+    mismatched  grid cells that do not show the color the plan puts there (see verify.py)
+
+The canvas, palette, helper buttons and settings are taken from config.json. Readiness waits
+are simulated at their fixed delay and adaptive pacing is off, the simulated app never
+drops a stroke.
+'''
+
+import argparse
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+import backends
+import colorentry
+import log
+import pipeline
+import verify
+from batch import bot_from_config
+from bot import Bot
+
+
+class SimulationResult:
+    '''Outcome of a simulated drawing'''
+
+    def __init__(self, image, duration, estimated, fidelity, report, strokes, events, color_switches):
+        self.image = image
+        self.duration = duration
+        self.estimated = estimated
+        self.fidelity = fidelity
+        self.report = report
+        self.strokes = strokes
+        self.events = events
+        self.color_switches = color_switches
+
+    def summary(self):
+        return (f"{self.strokes} strokes, {self.color_switches} color selections, {self.events} events - "
+                f"simulated {Bot._format_time(self.duration)} (estimated {Bot._format_time(self.estimated)}), "
+                f"fidelity {self.fidelity * 100:.2f}%, {self.report.mismatched}/{self.report.cells} cells mismatched")
+
+    def to_dict(self):
+        return {
+            'duration': round(self.duration, 3), 'estimated': round(self.estimated, 3),
+            'fidelity': round(self.fidelity, 5), 'mismatched': self.report.mismatched,
+            'cells': self.report.cells, 'strokes': self.strokes, 'events': self.events,
+            'color_switches': self.color_switches
+        }
+
+
+def fidelity(rendered, target):
+    '''Similarity of two (h, w, 3) images: 1 minus the mean absolute channel difference, scaled to 0..1'''
+    diff = np.abs(np.asarray(rendered, dtype=np.int16)[:, :, :3] - np.asarray(target, dtype=np.int16)[:, :, :3])
+    return float(1.0 - diff.mean() / 255.0) if diff.size else 1.0
+
+
+def drawing_area(canvas_image, shape, origin, step):
+    '''
+    Returns the part of the canvas covered by a grid of the given shape: the step x step
+    block centered on the stroke anchor of every cell. Blocks past the canvas border repeat
+    the edge pixels.
+    '''
+    h, w = shape
+    padded = np.pad(canvas_image, ((step, step), (step, step), (0, 0)), mode='edge')
+    y0 = origin[1] - step // 2 + step
+    x0 = origin[0] - step // 2 + step
+    return padded[y0:y0 + h * step, x0:x0 + w * step]
+
+
+def pickers(bot):
+    '''Screen positions that select a color when clicked: palette cells and calibrated spectrum points'''
+    positions = {}
+    if bot.color_calibration_map:
+        positions.update({tuple(int(v) for v in pos): color for color, pos in bot.color_calibration_map.items()})
+    if bot._palette is not None:
+        positions.update({tuple(int(v) for v in pos): color for color, pos in bot._palette.colors_pos.items()})
+    return positions
+
+
+def simulate(bot, file, flags=0, mode=Bot.LAYERED, brush=1, shape='round', event_seconds=0.0, tolerance=40):
+    '''
+    Draws the plan of file with the simulation backend and returns a SimulationResult.
+    The input backend, adaptive pacing and draw state of bot are restored afterwards.
+    '''
+    if bot._canvas is None:
+        raise RuntimeError("Cannot simulate: canvas not initialized")
+
+    cmap = bot.process(file, flags, mode)
+    sim = backends.SimulationBackend(bot._canvas, brush, shape, event_seconds=event_seconds)
+
+    saved = bot.input, bot.adaptive_pacing, dict(bot.draw_state)
+    bot.input, bot.adaptive_pacing = sim, None
+    try:
+        bot.draw_state.update(color_idx=0, line_idx=0, segment_idx=0, current_color=None)
+        compiled = bot.prepare_draw(cmap)
+        # Calibration data is loaded by prepare_draw, the pickers are known only now
+        sim.pickers = pickers(bot)
+        sim.dialog = bot._custom_colors
+        sim.entry = bot.color_entry
+        result = bot.draw_tape(compiled)
+        if result != 'success':
+            raise RuntimeError(f"Simulated drawing did not complete: {result}")
+
+        index, colors, origin = bot._draw_target(file, flags)
+        color_list = [tuple(c) for c in colors.tolist()]
+        skip = None
+        if flags & Bot.IGNORE_WHITE and (255, 255, 255) in color_list:
+            skip = color_list.index((255, 255, 255))
+        report = verify.VerifyReport(0, bot.verify_canvas(index, colors, origin, tolerance, skip), index, colors)
+        estimated = bot.estimated_time_seconds
+    finally:
+        bot.input, bot.adaptive_pacing = saved[0], saved[1]
+        bot.draw_state.update(saved[2])
+
+    step = int(bot.settings[Bot.STEP])
+    area = drawing_area(sim.image, index.shape, origin, step)
+    with Image.open(file) as img:
+        source = pipeline.image_grid(img, (area.shape[1], area.shape[0]))
+
+    return SimulationResult(sim.image, sim.clock, estimated, fidelity(area, source), report,
+                            compiled.total_strokes, sim.events, sim.color_switches)
+
+
+def _apply_color_switch_settings(bot, config_file):
+    '''Loads the helper buttons and color switch options, the parts of config.json batch.bot_from_config skips'''
+    with open(config_file, 'r', encoding='utf-8') as f:
+        tools = json.load(f)
+
+    for key, state in (('New Layer', bot.new_layer), ('Color Button', bot.color_button), ('Color Button Okay', bot.color_button_okay)):
+        config = tools.get(key)
+        if not config:
+            continue
+        if config.get('coords'):
+            state['coords'] = tuple(int(v) for v in config['coords'][:2])
+        # Like the window, a New Layer without an explicit enabled flag follows its setup status
+        default = config.get('status', False) if key == 'New Layer' else False
+        state['enabled'] = bool(config.get('enabled', default))
+        if 'delay' in config:
+            state['delay'] = float(config['delay'])
+        state['modifiers'].update({k: bool(v) for k, v in config.get('modifiers', {}).items()})
+
+    if tools.get('MSPaint Mode'):
+        bot.mspaint_mode['enabled'] = bool(tools['MSPaint Mode'].get('enabled', False))
+        bot.mspaint_mode['delay'] = float(tools['MSPaint Mode'].get('delay', 0.5))
+    bot.skip_first_color = bool(tools.get('skip_first_color', 0))
+    bot.jump_threshold = tools.get('drawing_settings', {}).get('jump_threshold', bot.jump_threshold)
+    bot.color_entry = colorentry.ColorEntry.from_config(tools.get('color_entry_settings', {}))
+    if tools.get('Custom Colors', {}).get('box'):
+        # Only the box is needed, the spectrum scan of init_custom_colors needs the real screen
+        ccbox = tools['Custom Colors']['box']
+        bot._custom_colors = ccbox[0], ccbox[1], ccbox[2] - ccbox[0], ccbox[3] - ccbox[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate drawing an image without touching the mouse.')
+    parser.add_argument('image', help='image file to draw')
+    parser.add_argument('--config', default='config.json', help='config file with canvas, palette and settings')
+    parser.add_argument('--mode', choices=(Bot.LAYERED, Bot.SLOTTED), default=Bot.LAYERED)
+    parser.add_argument('--delay', type=float, default=None, help='override the stroke delay')
+    parser.add_argument('--jump-delay', type=float, default=None, help='override the jump delay')
+    parser.add_argument('--pixel-size', type=int, default=None, help='override the pixel size')
+    parser.add_argument('--brush', type=int, default=1, help='brush diameter in pixels (default: 1)')
+    parser.add_argument('--shape', choices=('round', 'square'), default='round')
+    parser.add_argument('--event-ms', type=float, default=0.0, help='simulated latency of every input event')
+    parser.add_argument('--out', default=None, help='write the rendered canvas to this image file')
+    parser.add_argument('--json', action='store_true', help='print the result as one JSON line')
+    args = parser.parse_args(argv)
+
+    if args.json:
+        log.configure('WARNING')  # Keep stdout a single JSON line
+    bot, flags = bot_from_config(args.config)
+    _apply_color_switch_settings(bot, args.config)
+    for index, value in ((Bot.DELAY, args.delay), (Bot.JUMP_DELAY, args.jump_delay), (Bot.STEP, args.pixel_size)):
+        if value is not None:
+            bot.settings[index] = value
+
+    start = time.time()
+    result = simulate(bot, args.image, flags, args.mode, args.brush, args.shape, args.event_ms / 1000)
+    if args.out:
+        Image.fromarray(result.image).save(args.out)
+
+    if args.json:
+        print(json.dumps(dict(result.to_dict(), image=args.image, mode=args.mode, brush=args.brush)))
+    else:
+        print(f"[Simulate] {result.summary()}")
+        print(f"[Simulate] Ran in {time.time() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+'''
+Parametric model of the custom colors spectrum.
+
+The spectra of most color pickers are analytic: the x axis sweeps one HSV or HSL channel
+linearly (usually hue), the y axis another one (saturation or value) and the third channel
+is fixed, e.g. the Windows color dialog shows hue x saturation at lightness 0.5. Instead of
+mapping the spectrum point by point, SpectrumModel.fit probes a small grid of points, tries
+every color space, axis assignment and orientation, and keeps the model that reproduces the
+probed colors best:
+
+    channel_x = a_x + b_x * u      u = (x - left) / (width - 1)
+    channel_y = a_y + b_y * v      v = (y - top) / (height - 1)
+    channel_fixed = c
+
+Inverting it gives the click position of any color in closed form (SpectrumModel.position),
+the color a point shows (SpectrumModel.color_at) renders the equivalent calibration map.
+'''
+
+import numpy as np
+
+SPACES = ('hsv', 'hsl')
+CHANNELS = {'hsv': ('hue', 'saturation', 'value'), 'hsl': ('hue', 'saturation', 'lightness')}
+
+
+def rgb_to_space(rgb, space):
+    '''Converts (n, 3) RGB colors in 0..255 to (n, 3) HSV or HSL channels in 0..1'''
+    rgb = np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255.0
+    high, low = rgb.max(axis=1), rgb.min(axis=1)
+    chroma = high - low
+    r, g, b = rgb.T
+
+    hue = np.zeros(len(rgb))
+    safe = np.where(chroma > 0, chroma, 1.0)
+    hue = np.where(high == r, ((g - b) / safe) % 6, hue)
+    hue = np.where(high == g, (b - r) / safe + 2, hue)
+    hue = np.where(high == b, (r - g) / safe + 4, hue)
+    hue = np.where(chroma > 0, hue / 6 % 1.0, 0.0)
+
+    if space == 'hsv':
+        saturation = np.where(high > 0, chroma / np.where(high > 0, high, 1.0), 0.0)
+        return np.stack([hue, saturation, high], axis=1)
+    lightness = (high + low) / 2
+    divisor = 1 - np.abs(2 * lightness - 1)
+    saturation = np.where(divisor > 0, chroma / np.where(divisor > 0, divisor, 1.0), 0.0)
+    return np.stack([hue, saturation, lightness], axis=1)
+
+
+def space_to_rgb(channels, space):
+    '''Converts (n, 3) HSV or HSL channels in 0..1 to (n, 3) RGB colors in 0..255'''
+    channels = np.asarray(channels, dtype=np.float64).reshape(-1, 3)
+    hue = channels[:, 0] % 1.0
+    saturation = np.clip(channels[:, 1], 0, 1)
+    third = np.clip(channels[:, 2], 0, 1)
+    if space == 'hsv':
+        chroma = third * saturation
+        low = third - chroma
+    else:
+        chroma = (1 - np.abs(2 * third - 1)) * saturation
+        low = third - chroma / 2
+
+    # Each channel is chroma scaled by its distance to the hue, plus the minimum
+    k = (np.array([5.0, 3.0, 1.0]) + hue[:, None] * 6) % 6
+    weight = np.clip(np.minimum(k, 4 - k), 0, 1)
+    return (low[:, None] + chroma[:, None] * (1 - weight)) * 255.0
+
+
+class SpectrumModel:
+    '''
+    Linear HSV/HSL spectrum over box (x, y, w, h). axes holds the channel index swept by x
+    and by y, lines the (a, b) coefficients of each and fixed the value of the third channel.
+    '''
+
+    def __init__(self, space, axes, lines, fixed, box, residual=None):
+        self.space = space
+        self.axes = tuple(axes)
+        self.lines = tuple(tuple(float(c) for c in line) for line in lines)
+        self.fixed = float(fixed)
+        self.box = tuple(int(v) for v in box)
+        self.residual = residual
+
+    def to_dict(self):
+        return {'space': self.space, 'axes': list(self.axes), 'lines': [list(line) for line in self.lines],
+                'fixed': self.fixed, 'box': list(self.box), 'residual': self.residual}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['space'], data['axes'], data['lines'], data['fixed'], data['box'], data.get('residual'))
+
+    def describe(self):
+        names = CHANNELS[self.space]
+        (ax, bx), (ay, by) = self.lines
+        return (f"{self.space.upper()}: x {names[self.axes[0]]} {ax:.2f}{bx:+.2f}u, "
+                f"y {names[self.axes[1]]} {ay:.2f}{by:+.2f}v, {names[self._third()]} {self.fixed:.2f}")
+
+    def _third(self):
+        return 3 - self.axes[0] - self.axes[1]
+
+    def _normalized(self, xs, ys):
+        x0, y0, w, h = self.box
+        return (np.asarray(xs, dtype=np.float64) - x0) / max(w - 1, 1), (np.asarray(ys, dtype=np.float64) - y0) / max(h - 1, 1)
+
+    def color_at(self, xs, ys):
+        '''Returns the (n, 3) RGB colors the model predicts at the points (xs, ys)'''
+        u, v = self._normalized(np.atleast_1d(xs), np.atleast_1d(ys))
+        channels = np.empty((len(u), 3))
+        for axis, t, (a, b) in zip(self.axes, (u, v), self.lines):
+            channels[:, axis] = a + b * t
+        channels[:, self._third()] = self.fixed
+        return space_to_rgb(channels, self.space)
+
+    def position(self, rgb):
+        '''Returns the (x, y) screen position whose color is closest to rgb on the spectrum'''
+        channels = rgb_to_space([rgb], self.space)[0]
+        x0, y0, w, h = self.box
+        coords = []
+        for axis, (a, b) in zip(self.axes, self.lines):
+            if abs(b) < 1e-9:
+                t = 0.5
+            else:
+                t = (channels[axis] - a) / b
+                if axis == 0:
+                    # Hue wraps around, take the turn that lands on or closest to the spectrum
+                    turns = t + np.arange(-2, 3) / b
+                    t = turns[np.argmin(np.abs(turns - np.clip(turns, 0, 1)))]
+            coords.append(float(np.clip(t, 0, 1)))
+        return int(round(x0 + coords[0] * (w - 1))), int(round(y0 + coords[1] * (h - 1)))
+
+    def render(self, step):
+        '''Returns the {(r, g, b): (x, y)} calibration map of the model sampled every step pixels'''
+        x0, y0, w, h = self.box
+        ys, xs = np.mgrid[y0:y0 + h:step, x0:x0 + w:step]
+        colors = np.rint(self.color_at(xs.ravel(), ys.ravel())).astype(int)
+        return {tuple(c): (int(x), int(y)) for c, x, y in zip(colors.tolist(), xs.ravel(), ys.ravel())}
+
+    def error(self, xs, ys, colors):
+        '''Mean absolute channel difference between the predicted and the given colors'''
+        return float(np.abs(self.color_at(xs, ys) - np.asarray(colors, dtype=np.float64).reshape(-1, 3)).mean())
+
+    @staticmethod
+    def _fit_line(t, values, circular, chromatic):
+        '''Least squares line values = a + b * t, unwrapping hue along t over the chromatic samples'''
+        if circular:
+            # Greys have no hue, they would break the unwrapping
+            if chromatic.sum() >= 2:
+                t, values = t[chromatic], values[chromatic]
+            order = np.argsort(t, kind='stable')
+            t = t[order]
+            values = np.unwrap(values[order] * 2 * np.pi) / (2 * np.pi)
+        if np.ptp(t) == 0:
+            return float(values.mean()), 0.0
+        b, a = np.polyfit(t, values, 1)
+        return float(a), float(b)
+
+    @classmethod
+    def fit(cls, xs, ys, colors, box):
+        '''Fits every space and axis assignment to the probed colors and returns the best model'''
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        rgb = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+        chromatic = np.ptp(rgb, axis=1) > 25
+        best = None
+        for space in SPACES:
+            channels = rgb_to_space(colors, space)
+            for ax in range(3):
+                for ay in range(3):
+                    if ax == ay:
+                        continue
+                    model = cls(space, (ax, ay), ((0, 0), (0, 0)), 0, box)
+                    u, v = model._normalized(xs, ys)
+                    lines = (cls._fit_line(u, channels[:, ax], ax == 0, chromatic),
+                             cls._fit_line(v, channels[:, ay], ay == 0, chromatic))
+                    third = 3 - ax - ay
+                    if third == 0:
+                        hues = channels[chromatic, 0] if chromatic.any() else channels[:, 0]
+                        angle = np.angle(np.exp(2j * np.pi * hues).mean()) / (2 * np.pi)
+                        fixed = angle % 1.0
+                    else:
+                        fixed = float(np.median(channels[:, third]))
+                    model = cls(space, (ax, ay), lines, fixed, box)
+                    model.residual = model.error(xs, ys, colors)
+                    if best is None or model.residual < best.residual:
+                        best = model
+        return best
@@ -0,0 +1,323 @@
+'''
+Flat input-event tapes.
+
+Bot.compile_tape() lowers a plan together with every color switch procedure (new layer,
+color button, palette or spectrum click, keyboard entry, ...) into a flat list of primitive
+events. Bot.draw_tape() then executes the tape in a tight loop, so no planning, string
+formatting or UI work happens between two mouse events.
+
+Every event is an opcode plus two float64 arguments, which hold stroke, key and probe
+indices exactly even on plans with far more than 2^24 strokes:
+
+    MOVE    x, y            move the mouse (absolute screen coordinates)
+    DOWN    -               press the left button
+    UP      -               release the left button
+    KEY_DOWN / KEY_UP  key  press / release keys[key]
+    WAIT    seconds, kind   wait, paced with the stroke scheduler while the button is held.
+                            kind 1 marks stroke segment waits and kind 2 jump delays, both
+                            are scaled by adaptive pacing (see pacing.py)
+    COLOR   color           marker: the switch to colors[color] starts here
+    STROKE  stroke, target  marker: global stroke index has been drawn, target is the
+                            intended stroke duration (negative for single dots)
+    MARK    probe           take the baseline of screen region probes[probe] (see readiness.py)
+    READY   probe, timeout  wait until probes[probe] reacted, at most timeout seconds
+    TYPE    keys, interval  press the key sequence keys[keys] in one batched write
+    CLIP    text            put keys[text] on the clipboard
+
+Tapes are saved as .npz files and can be replayed later without replanning, as long as
+the canvas and the helper buttons have not moved on screen.
+'''
+
+import hashlib
+import json
+
+import numpy as np
+
+MOVE, DOWN, UP, KEY_DOWN, KEY_UP, WAIT, COLOR, STROKE, MARK, READY, TYPE, CLIP = range(12)
+SEGMENT_WAIT, JUMP_WAIT = 1, 2
+VERSION = 4
+
+
+class EventTape:
+    '''
+    Compiled drawing job. color_offsets[i] is the event index of the COLOR marker of
+    colors[i] (-1 if the color is not drawn), stroke_offsets[k] the index of the first
+    event of global stroke k and stroke_counts[i] the number of strokes of colors[i].
+    '''
+
+    def __init__(self, ops, args, keys, colors, color_offsets, stroke_offsets, stroke_counts, probes=()):
+        self.ops = ops
+        self.args = args
+        self.keys = keys
+        self.probes = list(probes)
+        self.colors = colors
+        self.color_offsets = color_offsets
+        self.stroke_offsets = stroke_offsets
+        self.stroke_counts = stroke_counts
+        self._digest = None
+
+    def __len__(self):
+        return len(self.ops)
+
+    @property
+    def total_strokes(self):
+        return int(np.count_nonzero(self.ops == STROKE))
+
+    def wait_seconds(self):
+        '''Sum of all waits and readiness timeouts on the tape, an upper bound for the time spent waiting'''
+        waits = self.args[self.ops == WAIT, 0].astype(np.float64).sum()
+        timeouts = self.args[self.ops == READY, 1].astype(np.float64).sum()
+        return float(waits + timeouts)
+
+    def digest(self):
+        '''Hash of every event and color, identifies the plan together with its screen positions'''
+        if self._digest is None:
+            h = hashlib.sha1()
+            h.update(np.ascontiguousarray(self.ops).tobytes())
+            h.update(np.ascontiguousarray(self.args).tobytes())
+            h.update(json.dumps([self.keys, [list(c) for c in self.colors], self.probes]).encode('utf-8'))
+            h.update(np.ascontiguousarray(self.stroke_counts, dtype=np.int64).tobytes())
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def first_stroke(self, color_idx):
+        '''Global index of the first stroke of colors[color_idx]'''
+        return int(np.sum(self.stroke_counts[:color_idx]))
+
+    def stroke_position(self, stroke):
+        '''Returns (color idx, line idx) of a global stroke index'''
+        ends = np.cumsum(self.stroke_counts)
+        color_idx = int(np.searchsorted(ends, stroke, side='right'))
+        return color_idx, stroke - (int(ends[color_idx - 1]) if color_idx else 0)
+
+    def save(self, f):
+        '''Writes the tape to the binary file object or path f'''
+        meta = {'version': VERSION, 'keys': self.keys, 'colors': [list(c) for c in self.colors], 'probes': self.probes}
+        np.savez(f, ops=self.ops, args=self.args, color_offsets=self.color_offsets,
+                 stroke_offsets=self.stroke_offsets, stroke_counts=self.stroke_counts,
+                 meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, f):
+        with np.load(f) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            # Version 1 tapes only lack the readiness probes, version 2 tapes the batched key ops,
+            # version 3 tapes stored the arguments as float32
+            if meta.get('version') not in (1, 2, 3, VERSION):
+                raise ValueError(f'Not an event tape of version {VERSION}')
+            return cls(data['ops'], data['args'].astype(np.float64), meta['keys'], [tuple(c) for c in meta['colors']],
+                       data['color_offsets'], data['stroke_offsets'], data['stroke_counts'], meta.get('probes', []))
+
+
+def _stroke_layout(strokes, jump_delay, jump_threshold, last_end):
+    '''Per stroke of an (n, 4) float array: whether it is a dot, its segment count and whether a jump wait precedes it'''
+    n = len(strokes)
+    x1, y1, x2, y2 = strokes.T
+    length = np.hypot(x2 - x1, y2 - y1)
+    dot = length < 1
+    segments = np.where(dot, 1, np.clip((length / 10).astype(np.int64), 2, 10))
+
+    jump = np.zeros(n, dtype=np.int64)
+    jump[1:] = np.hypot(x1[1:] - x2[:-1], y1[1:] - y2[:-1]) > jump_threshold
+    if last_end is not None and n:
+        jump[0] = np.hypot(x1[0] - last_end[0], y1[0] - last_end[1]) > jump_threshold
+    if jump_delay <= 0:
+        jump[:] = 0
+    return dot, segments, jump
+
+
+def stroke_features(strokes, delay, jump_delay, jump_threshold, last_end=None):
+    '''
+    The stroke and jump features (see estimate.tape_features) TapeBuilder.strokes would put on
+    the tape for the same arguments, without building any events
+    '''
+    strokes = np.asarray(strokes, dtype=np.float64).reshape(-1, 4)
+    dot, segments, jump = _stroke_layout(strokes, jump_delay, jump_threshold, last_end)
+    lines = segments[~dot]
+    # The segment waits of a stroke add up to delay
+    segment_wait = delay / lines.astype(np.float64)
+    return {
+        'strokes': len(strokes),
+        'segments': int(lines.sum()),
+        'stroke_wait': float((segment_wait * lines).sum()),
+        'jumps': int(jump.sum()),
+        'jump_wait': float(jump_delay) * int(jump.sum())
+    }
+
+
+class TapeBuilder:
+    '''Collects events one by one for procedures and in bulk for strokes'''
+
+    def __init__(self):
+        self._chunks = []
+        self._ops = []
+        self._args = []
+        self._length = 0
+        self.keys = []
+        self._key_index = {}
+        self.probes = []
+        self._probe_index = {}
+
+    def __len__(self):
+        return self._length + len(self._ops)
+
+    def _event(self, op, a=0.0, b=0.0):
+        self._ops.append(op)
+        self._args.append((a, b))
+
+    def _flush(self):
+        if self._ops:
+            self._chunks.append((np.array(self._ops, dtype=np.uint8), np.array(self._args, dtype=np.float64)))
+            self._length += len(self._ops)
+            self._ops, self._args = [], []
+
+    def move(self, x, y):
+        self._event(MOVE, x, y)
+
+    def down(self):
+        self._event(DOWN)
+
+    def up(self):
+        self._event(UP)
+
+    def key_down(self, key):
+        self._event(KEY_DOWN, self._key(key))
+
+    def key_up(self, key):
+        self._event(KEY_UP, self._key(key))
+
+    def wait(self, seconds):
+        if seconds > 0:
+            self._event(WAIT, seconds)
+
+    def color(self, color_idx):
+        self._event(COLOR, color_idx)
+
+    def mark(self, box):
+        self._event(MARK, self._probe(box))
+
+    def ready(self, box, timeout):
+        '''Waits for screen region box to react, at most timeout seconds. Needs a mark(box) before'''
+        if timeout > 0:
+            self._event(READY, self._probe(box), timeout)
+
+    def _probe(self, box):
+        box = [int(v) for v in box]
+        key = tuple(box)
+        if key not in self._probe_index:
+            self._probe_index[key] = len(self.probes)
+            self.probes.append(box)
+        return self._probe_index[key]
+
+    def write(self, keys, interval=0.0):
+        '''Presses a sequence of keys as one batched write'''
+        self._event(TYPE, self._key(tuple(keys)), interval)
+
+    def copy(self, text):
+        self._event(CLIP, self._key(text))
+
+    def _key(self, key):
+        if key not in self._key_index:
+            self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        return self._key_index[key]
+
+    # pyautogui style helpers, lowered to primitive events
+
+    def click(self, x, y, clicks=1, interval=0.0):
+        for i in range(clicks):
+            if i:
+                self.wait(interval)
+            self.move(x, y)
+            self.down()
+            self.up()
+
+    def press(self, key, presses=1, interval=0.0):
+        for i in range(presses):
+            if i:
+                self.wait(interval)
+            self.key_down(key)
+            self.key_up(key)
+
+    def hotkey(self, *keys):
+        for key in keys:
+            self.key_down(key)
+        for key in reversed(keys):
+            self.key_up(key)
+
+    def strokes(self, strokes, first_stroke, delay, jump_delay, jump_threshold, last_end=None):
+        '''
+        Appends the events of an (n, 4) array of absolute (x1, y1, x2, y2) strokes. Strokes
+        shorter than a pixel are single dots, longer ones are split into 2-10 segments paced
+        evenly over delay. A jump_delay wait precedes every stroke that starts more than
+        jump_threshold pixels away from where the previous one ended (last_end for the first).
+        Returns the event offset of every stroke.
+        '''
+        self._flush()
+        strokes = np.asarray(strokes, dtype=np.float64).reshape(-1, 4)
+        n = len(strokes)
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+
+        x1, y1, x2, y2 = strokes.T
+        dx, dy = x2 - x1, y2 - y1
+        dot, segments, jump = _stroke_layout(strokes, jump_delay, jump_threshold, last_end)
+
+        # Per stroke: [WAIT] MOVE start, DOWN, (MOVE point, WAIT)*segments, UP, STROKE
+        # Dots skip the waits: [WAIT] MOVE start, DOWN, MOVE end, UP, STROKE
+        counts = jump + 4 + np.where(dot, 1, 2 * segments)
+        starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(counts[:-1], out=starts[1:])
+        total = int(counts.sum())
+
+        sid = np.repeat(np.arange(n), counts)
+        p = np.arange(total) - starts[sid] - jump[sid]
+        seg = segments[sid]
+        is_dot = dot[sid]
+        last = np.where(is_dot, 3, 2 + 2 * seg)
+
+        ops = np.full(total, MOVE, dtype=np.uint8)
+        args = np.zeros((total, 2), dtype=np.float64)
+
+        ops[p == -1] = WAIT
+        args[p == -1, 0] = jump_delay
+        args[p == -1, 1] = JUMP_WAIT
+
+        m = p == 0
+        args[m, 0], args[m, 1] = x1[sid[m]], y1[sid[m]]
+        ops[p == 1] = DOWN
+
+        q = p - 2
+        inner = (p >= 2) & (p < last)
+        moves = inner & (is_dot | (q % 2 == 0))
+        k = np.where(is_dot, 1, q // 2 + 1)[moves]
+        s = sid[moves]
+        args[moves, 0] = x1[s] + dx[s] * k / segments[s]
+        args[moves, 1] = y1[s] + dy[s] * k / segments[s]
+        waits = inner & ~is_dot & (q % 2 == 1)
+        ops[waits] = WAIT
+        args[waits, 0] = delay / seg[waits]
+        args[waits, 1] = SEGMENT_WAIT
+
+        ops[p == last] = UP
+        m = p == last + 1
+        ops[m] = STROKE
+        args[m, 0] = first_stroke + sid[m]
+        args[m, 1] = np.where(is_dot[m], -1.0, delay)
+
+        self._chunks.append((ops, args))
+        self._length += total
+        return starts + (self._length - total)
+
+    def build(self, colors, color_offsets, stroke_offsets, stroke_counts):
+        self._flush()
+        if self._chunks:
+            ops = np.concatenate([c[0] for c in self._chunks])
+            args = np.concatenate([c[1] for c in self._chunks])
+        else:
+            ops, args = np.empty(0, dtype=np.uint8), np.empty((0, 2), dtype=np.float64)
+        return EventTape(ops, args, list(self.keys), list(colors),
+                         np.asarray(color_offsets, dtype=np.int64),
+                         np.asarray(stroke_offsets, dtype=np.int64),
+                         np.asarray(stroke_counts, dtype=np.int64),
+                         self.probes)
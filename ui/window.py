@@ -5,6 +5,11 @@ import tkinter
 import traceback
 import urllib.request
 import urllib.error as urllib_error
+import batch
+import colorentry
+import log
+import pacing
+import progress
 import utils
 
 from ui.setup import SetupWindow
@@ -16,6 +21,9 @@ from PIL import (
     ImageTk,
 )
 from threading import Thread
+
+cache_log = log.get_logger('cache')
+overlay_log = log.get_logger('overlay')
 from tkinter import (
     Canvas, 
     StringVar, 
@@ -83,6 +91,10 @@ class Window:
         'Use custom colors. This option considerably lengthens the draw duration.'
     )
 
+    # The progress overlay is redrawn from the Tk main loop at this interval (ms), ~8 Hz,
+    # independent of how fast the bot draws strokes
+    PROGRESS_OVERLAY_INTERVAL = 125
+
     def __init__(self, title, bot, w, h, x, y):
         self._root = Tk()
         # Prevent saving during initial UI setup (slider.set etc.)
@@ -132,22 +144,19 @@ class Window:
         # Determine config file path relative to project root (one level up from ui/)
         self._config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
         self.load_config()  # Load saved config
+        # Point out a drawing that was interrupted by a crash or by closing the app
+        checkpoint = self.bot.journal.last() if self.bot.journal.enabled else None
+        if checkpoint is not None:
+            self.tlabel['text'] = f"Unfinished drawing found (stroke {checkpoint.stroke} of {checkpoint.total}). Press Start with the same image to resume."
         # UI initialization finished - allow saving
         self._initializing = False
 
+        self._progress_overlay_window = None
+        self._progress_overlay_label = None
+        self._root.after(Window.PROGRESS_OVERLAY_INTERVAL, self._render_progress_overlay)
+
         self._root.mainloop()
 
-    def __del__(self):
-        """Clean up cache directory on application exit"""
-        try:
-            import shutil
-            cache_dir = 'cache'
-            if os.path.exists(cache_dir):
-                shutil.rmtree(cache_dir)
-                print(f"Cleaned up cache directory: {cache_dir}")
-        except Exception as e:
-            print(f"Warning: Could not clean up cache directory: {e}")
-        
     def _init_cpanel(self):
         # CONTROL PANEL FRAME
         oframe = LabelFrame(self._root, text='Control Panel')          # Outer frame that will hold the canvas
@@ -177,6 +186,7 @@ class Window:
             'Setup',
             # 'Inspect',
             'Pre-compute',
+            'Batch Pre-compute',
             'Test Draw',
             'Simple Test Draw',
             'Run Calibration',
@@ -191,21 +201,23 @@ class Window:
         buttons[0]['command'] = self.setup
         # buttons[1]['command'] = self.test
         buttons[1]['command'] = self.start_precompute_thread
-        buttons[2]['command'] = self.start_test_draw_thread
-        buttons[3]['command'] = self.start_simple_test_draw_thread
-        buttons[4]['command'] = self.start_calibration_thread
-        buttons[5]['command'] = self.start_draw_thread
+        buttons[2]['command'] = self.start_batch_precompute_thread
+        buttons[3]['command'] = self.start_test_draw_thread
+        buttons[4]['command'] = self.start_simple_test_draw_thread
+        buttons[5]['command'] = self.start_calibration_thread
+        buttons[6]['command'] = self.start_draw_thread
 
+        curr_row = len(btn_names)
         self._teclbl = Label(self._cframe, text='Draw Mode', font=Window.TITLE_FONT)
-        self._teclbl.grid(column=0, row=6, columnspan=2, sticky='w', padx=5, pady=5)
+        self._teclbl.grid(column=0, row=curr_row, columnspan=2, sticky='w', padx=5, pady=5)
         modes = [Bot.SLOTTED, Bot.LAYERED]
         self._tecvar = StringVar()
         self._tecvar.set(modes[1])
         self._mode = modes[1]
         self._teclst = OptionMenu(self._cframe, self._tecvar, self._mode, *modes, command=self._update_mode)
-        self._teclst.grid(column=0, row=7, columnspan=2, sticky='ew', padx=5, pady=5)
+        self._teclst.grid(column=0, row=curr_row + 1, columnspan=2, sticky='ew', padx=5, pady=5)
 
-        curr_row = 8
+        curr_row += 2
 
         # For every slider option in options, option layout is    :    (name, default, from, to)
         defaults = self.bot.settings
@@ -696,11 +708,11 @@ class Window:
             
             # Update bot settings
             self.bot.settings[0] = round(val, 3)
-            self._optlabl[0]['text'] = f"{self._options[0][0]}: {val:.2f}"
+            self._optlabl[0]['text'] = f"{self._options[0][0]}: {val:.3f}"
             
             # Save drawing settings to config
             if 'drawing_settings' not in self.tools:
-                self.tools['drawing_settings'] = {}
+                self.tools['drawing_settings'] = {'delay_per_stroke': True}
             self.tools['drawing_settings']['delay'] = self.bot.settings[0]
             self.tools['drawing_settings']['pixel_size'] = self.bot.settings[1]
             self.tools['drawing_settings']['precision'] = self.bot.settings[2]
@@ -737,7 +749,7 @@ class Window:
 
         # Save drawing settings to config
         if 'drawing_settings' not in self.tools:
-            self.tools['drawing_settings'] = {}
+            self.tools['drawing_settings'] = {'delay_per_stroke': True}
         self.tools['drawing_settings']['delay'] = self.bot.settings[0]
         self.tools['drawing_settings']['pixel_size'] = self.bot.settings[1]
         self.tools['drawing_settings']['precision'] = self.bot.settings[2]
@@ -783,7 +795,7 @@ class Window:
             
             # Save to tools config
             if 'drawing_settings' not in self.tools:
-                self.tools['drawing_settings'] = {}
+                self.tools['drawing_settings'] = {'delay_per_stroke': True}
             self.tools['drawing_settings']['jump_threshold'] = val
             
             try:
@@ -888,6 +900,53 @@ class Window:
                 self._calib_step_var.set(str(calib_step))
             else:
                 self._calib_step_var.set('2')
+            self.bot.gamut_tolerance = float(self.tools.get('calibration_settings', {}).get('gamut_tolerance', 40.0))
+
+            # Load log levels (default INFO) and the progress report interval while drawing
+            log_settings = self.tools.get('log_settings', {})
+            try:
+                log.configure(log_settings.get('level', 'INFO'), log_settings.get('levels'))
+            except ValueError as e:
+                print(f"Invalid log settings: {e}")
+            self.bot.progress_interval = float(log_settings.get('progress_interval', 1.0))
+
+            # Load draw checkpoint journal settings
+            checkpoint_settings = self.tools.get('checkpoint_settings', {})
+            self.bot.journal.enabled = bool(checkpoint_settings.get('enabled', True))
+            self.bot.journal.every_strokes = int(checkpoint_settings.get('every_strokes', 250))
+            self.bot.journal.every_seconds = float(checkpoint_settings.get('every_seconds', 10.0))
+
+            # Load readiness probe settings, the waits after helper clicks end once the app reacted
+            readiness_settings = self.tools.get('readiness_settings', {})
+            self.bot.readiness.enabled = bool(readiness_settings.get('enabled', True))
+            self.bot.readiness.interval = float(readiness_settings.get('interval', 0.02))
+            self.bot.readiness.settle = float(readiness_settings.get('settle', 0.06))
+            self.bot.readiness.quiet = float(readiness_settings.get('quiet', 0.0))
+            self.bot.readiness.radius = int(readiness_settings.get('radius', 8))
+            self.bot.layer_panel_region = readiness_settings.get('layer_panel_region')
+            self.bot.color_preview_spot = self.tools.get('color_preview_spot', {}).get('coords')
+
+            # Load adaptive pacing, which tunes the delays per app profile while drawing
+            pacing_settings = self.tools.get('pacing_settings', {})
+            if pacing_settings.get('adaptive', False):
+                self.bot.adaptive_pacing = pacing.AdaptivePacing(check_every=int(pacing_settings.get('check_every', 25)))
+            else:
+                self.bot.adaptive_pacing = None
+            self.bot.pacing_profile = str(pacing_settings.get('profile', 'default'))
+
+            # Load how colors are typed into the custom colors dialog when they are not calibrated
+            try:
+                self.bot.color_entry = colorentry.ColorEntry.from_config(self.tools.get('color_entry_settings', {}))
+            except (TypeError, ValueError) as e:
+                print(f"Invalid color entry settings: {e}")
+
+            # Load input backend (pyautogui, xtest or recording)
+            self.bot.set_input_backend(self.tools.get('input_backend', 'pyautogui'))
+
+            # Load plan cache size cap (old plans are evicted least recently used first)
+            if 'cache_settings' in self.tools:
+                max_mb = float(self.tools['cache_settings'].get('max_mb', 256))
+                self.bot.cache.max_bytes = int(max_mb * 1024 * 1024)
 
             # Load jump threshold setting
             if 'drawing_settings' in self.tools:
@@ -901,9 +960,16 @@ class Window:
             # Load saved drawing settings
             if 'drawing_settings' in self.tools:
                 settings = self.tools['drawing_settings']
+                # Delay is the duration of a stroke, older configs are converted once and saved with the next change
+                delay = Bot.stroke_delay(settings)
+                if not settings.get('delay_per_stroke'):
+                    if 'delay' in settings:
+                        print(f"Converted delay {settings['delay']} to a stroke duration of {delay}")
+                        settings['delay'] = delay
+                    settings['delay_per_stroke'] = True
                 # Update bot settings
                 self.bot.settings = [
-                    settings.get('delay', 0.1),
+                    delay,
                     settings.get('pixel_size', 12),
                     settings.get('precision', 0.9),
                     settings.get('jump_delay', 0.5)
@@ -912,7 +978,7 @@ class Window:
                 for i, val in enumerate(self.bot.settings):
                     if i == 0:  # Delay - use entry field
                         self._delay_var.set(str(val))
-                        self._optlabl[0]['text'] = f"{self._options[0][0]}: {val:.2f}"
+                        self._optlabl[0]['text'] = f"{self._options[0][0]}: {val:.3f}"
                     elif i == 1:  # Pixel Size - force to integer
                         val = int(val)
                         self._optvars[i].set(val)
@@ -940,6 +1006,11 @@ class Window:
                 else:
                     self.draw_options &= ~Bot.USE_CUSTOM_COLORS
 
+            # How custom colors are quantized: accuracy interval or clustered calibration colors
+            options = self.tools.get('drawing_options', {})
+            self.bot.custom_quantization = options.get('custom_quantization', 'interval')
+            self.bot.custom_color_count = int(options.get('custom_color_count', 64))
+
             # Update URL entry field with last saved URL if available
             last_url = self.tools.get('last_image_url', '')
             if last_url:
@@ -1181,6 +1252,9 @@ class Window:
             for k, v in self._setup_tools.items():
                 self.tools[k] = v
 
+        # The color preview spot is watched by the readiness probe after color clicks
+        self.bot.color_preview_spot = self.tools.get('color_preview_spot', {}).get('coords')
+
         # If New Layer was configured during setup, apply it to bot state
         try:
             nl = self.tools.get('New Layer')
@@ -1257,7 +1331,7 @@ class Window:
 
         # Save current drawing settings
         if 'drawing_settings' not in self.tools:
-            self.tools['drawing_settings'] = {}
+            self.tools['drawing_settings'] = {'delay_per_stroke': True}
         self.tools['drawing_settings']['delay'] = self.bot.settings[0]
         self.tools['drawing_settings']['pixel_size'] = self.bot.settings[1]
         self.tools['drawing_settings']['precision'] = self.bot.settings[2]
@@ -1306,7 +1380,8 @@ class Window:
             # Load cached data to estimate drawing time
             cache_data = self.bot.load_cached(cache_file)
             if cache_data:
-                drawing_eta = self.bot.estimate_drawing_time(cache_data['cmap'])
+                with cache_data['cmap'] as cmap:
+                    drawing_eta = self.bot.estimate_drawing_time(cmap)
                 self.tlabel['text'] = f'Pre-compute completed! Estimated drawing time: {drawing_eta}'
             else:
                 self.tlabel['text'] = f'Pre-compute completed! Cache saved.'
@@ -1317,6 +1392,48 @@ class Window:
         finally:
             self._set_busy(False)
 
+    @is_free
+    def start_batch_precompute_thread(self):
+        folder = filedialog.askdirectory(title='Select a folder of images to pre-compute')
+        if not folder:
+            self._set_busy(False)
+            return
+
+        self._batch_images = batch.find_images(folder)
+        if not self._batch_images:
+            self.tlabel['text'] = f'No images found in {folder}'
+            self._set_busy(False)
+            return
+
+        self._batch_status = f'Batch pre-computing {len(self._batch_images)} images...'
+        self._batch_thread_obj = Thread(target=self.batch_precompute)
+        self._batch_thread_obj.start()
+        self._manage_batch_precompute_thread()
+
+    def _manage_batch_precompute_thread(self):
+        if getattr(self, '_batch_thread_obj', None) is not None and self._batch_thread_obj.is_alive() and self.busy:
+            self._root.after(500, self._manage_batch_precompute_thread)
+            self.tlabel['text'] = self._batch_status
+
+    def batch_precompute(self):
+        def on_result(result, done, total, eta_seconds):
+            batch._print_result(result, done, total, eta_seconds)
+            self._batch_status = f'Batch pre-compute: {done}/{total} images - ETA: {self.bot._format_time(eta_seconds)}'
+
+        try:
+            results = batch.precompute_batch(self.bot, self._batch_images, flags=self.draw_options, mode=self._mode, on_result=on_result)
+            failed = [r for r in results if r['error']]
+            strokes = sum(r['strokes'] for r in results)
+            self.tlabel['text'] = f'Batch pre-compute completed! {len(results) - len(failed)} cached ({strokes} strokes), {len(failed)} failed.'
+            if failed:
+                details = '\n'.join(f"{os.path.basename(r['image'])}: {r['error']}" for r in failed[:10])
+                messagebox.showwarning(self.title, f'{len(failed)} images could not be pre-computed:\n\n{details}')
+        except Exception as e:
+            traceback.print_exc()
+            messagebox.showerror(self.title, f'Batch pre-compute failed: {str(e)}')
+        finally:
+            self._set_busy(False)
+
     @is_free
     def start_test_draw_thread(self):
         self._test_draw_thread_obj = Thread(target=self.test_draw)
@@ -1473,11 +1590,11 @@ class Window:
             # Keep window responsive
             self._calib_overlay_window.update()
 
-            print("[CalibrationOverlay] Overlay window created")
+            overlay_log.info("[CalibrationOverlay] Overlay window created")
             return self._calib_overlay_window
 
         except Exception as e:
-            print(f"[CalibrationOverlay] Error creating overlay: {e}")
+            overlay_log.warning(f"[CalibrationOverlay] Error creating overlay: {e}")
             return None
 
     def _close_calibration_overlay(self):
@@ -1487,9 +1604,86 @@ class Window:
                 self._calib_overlay_window.destroy()
                 self._calib_overlay_window = None
                 self._calib_overlay_label = None
-                print("[CalibrationOverlay] Overlay window closed")
+                overlay_log.info("[CalibrationOverlay] Overlay window closed")
+        except Exception as e:
+            overlay_log.warning(f"[CalibrationOverlay] Error closing overlay: {e}")
+
+    def _create_progress_overlay(self):
+        """Create the always-on-top draw progress overlay (top center of the screen)"""
+        try:
+            window_width = 240
+            window_height = 20
+            x_position = (self._root.winfo_screenwidth() - window_width) // 2
+            y_position = 10
+
+            self._progress_overlay_window = tkinter.Toplevel(self._root)
+            self._progress_overlay_window.title("pyaint Progress")
+            self._progress_overlay_window.attributes("-topmost", True)
+            self._progress_overlay_window.overrideredirect(True)
+            self._progress_overlay_window.geometry(f"{window_width}x{window_height}+{x_position}+{y_position}")
+
+            # Dark background frame with border
+            border_frame = tkinter.Frame(
+                self._progress_overlay_window,
+                bg="#4a4a4a",
+                width=window_width,
+                height=window_height
+            )
+            border_frame.pack(fill=tkinter.BOTH, expand=True)
+
+            overlay_frame = tkinter.Frame(
+                border_frame,
+                bg="#2c2c2c",
+                width=window_width - 2,
+                height=window_height - 2
+            )
+            overlay_frame.place(x=1, y=1, width=window_width - 2, height=window_height - 2)
+
+            self._progress_overlay_label = tkinter.Label(
+                overlay_frame,
+                text="Initializing...",
+                bg="#2c2c2c",
+                fg="#00ff00",  # Green text for progress
+                font=("Arial", 9, "bold"),
+                relief=tkinter.FLAT
+            )
+            self._progress_overlay_label.place(relx=0.5, rely=0.5, anchor=tkinter.CENTER)
+            overlay_log.info("[ProgressOverlay] Overlay window created")
+        except Exception as e:
+            # Don't retry on every render tick
+            overlay_log.warning(f"[ProgressOverlay] Error creating overlay, overlay disabled: {e}")
+            self.bot.progress_overlay_enabled = False
+            self._progress_overlay_window = None
+            self._progress_overlay_label = None
+
+    def _close_progress_overlay(self):
+        """Close the draw progress overlay window"""
+        try:
+            self._progress_overlay_window.destroy()
+            overlay_log.info("[ProgressOverlay] Overlay window closed")
         except Exception as e:
-            print(f"[CalibrationOverlay] Error closing overlay: {e}")
+            overlay_log.warning(f"[ProgressOverlay] Error closing overlay: {e}")
+        self._progress_overlay_window = None
+        self._progress_overlay_label = None
+
+    def _render_progress_overlay(self):
+        """
+        Show, update or close the draw progress overlay from the bot's progress channel.
+        Runs on the Tk main loop every PROGRESS_OVERLAY_INTERVAL ms; the draw thread never
+        touches the overlay, it only bumps the channel's counters.
+        """
+        channel = self.bot.progress_channel
+        if channel.active and self.bot.progress_overlay_enabled:
+            if self._progress_overlay_window is None:
+                self._create_progress_overlay()
+            if self._progress_overlay_label is not None:
+                completed, total, eta_seconds = channel.snapshot()
+                text = f"{completed}/{total} Strokes (ETA: {progress.format_eta(eta_seconds)})"
+                if self._progress_overlay_label['text'] != text:
+                    self._progress_overlay_label['text'] = text
+        elif self._progress_overlay_window is not None:
+            self._close_progress_overlay()
+        self._root.after(Window.PROGRESS_OVERLAY_INTERVAL, self._render_progress_overlay)
 
     def _manage_calibration_thread(self):
         """Manage calibration thread and update progress"""
@@ -1524,7 +1718,7 @@ class Window:
                             try:
                                 self._calib_overlay_window.update()  # Force UI update
                             except Exception as e:
-                                print(f"[CalibrationOverlay] Error updating window: {e}")
+                                overlay_log.warning(f"[CalibrationOverlay] Error updating window: {e}")
                     self.tlabel['text'] = f"Calibrating: {current}/{total} colors ({percent:.1f}%) - ETA: {eta_str}"
                 else:
                     elapsed_time = time.time() - self._calibration_start_time
@@ -1534,7 +1728,7 @@ class Window:
                             try:
                                 self._calib_overlay_window.update()  # Force UI update
                             except Exception as e:
-                                print(f"[CalibrationOverlay] Error updating window: {e}")
+                                overlay_log.warning(f"[CalibrationOverlay] Error updating window: {e}")
                     self.tlabel['text'] = f"Calibrating: {current} colors... (Time: {elapsed_time:.0f}s)"
         elif self.busy:
             # Calibration finished or cancelled
@@ -1578,14 +1772,25 @@ class Window:
             self.bot._calibration_progress['total'] = total_positions
             
             # Run calibration
-            self.bot.calibrate_custom_colors(grid_box, preview_point, step=step)
+            calibration_settings = self.tools.get('calibration_settings', {})
+            self.bot.calibrate_custom_colors(grid_box, preview_point, step=step,
+                                             mode=calibration_settings.get('mode', 'grid'),
+                                             sweep_speed=calibration_settings.get('sweep_speed', 0),
+                                             verify_points=calibration_settings.get('verify_points', 12),
+                                             coarse_step=calibration_settings.get('coarse_step', 16),
+                                             target_delta_e=calibration_settings.get('target_delta_e', 5.0),
+                                             sample_budget=calibration_settings.get('sample_budget', 0),
+                                             model_probes=tuple(calibration_settings.get('model_probes', (7, 5))),
+                                             model_max_residual=calibration_settings.get('model_max_residual', 6.0),
+                                             model_fallback=calibration_settings.get('model_fallback', 'grid'))
             
-            # Save calibration data to file
-            calib_file = 'color_calibration.json'
-            if self.bot.save_color_calibration(calib_file):
-                self.tlabel['text'] = f'Calibration saved to {calib_file} with {len(self.bot.color_calibration_map)} colors'
-            else:
-                self.tlabel['text'] = 'Failed to save calibration data'
+            # The bot saved a completed calibration, a cancelled run only its progress to the partial file
+            calib_file = self.bot.calibration_store.path
+            if not self.bot.terminate:
+                if self.bot.calibration_saved:
+                    self.tlabel['text'] = f'Calibration saved to {calib_file} with {len(self.bot.color_calibration_map)} colors'
+                else:
+                    self.tlabel['text'] = 'Failed to save calibration data'
             
         except Exception as e:
             traceback.print_exc()
@@ -1651,7 +1856,7 @@ class Window:
             has_cache, cache_file = self.bot.get_cached_status(self._imname, flags=self.draw_options, mode=self._mode)
             if has_cache:
                 # Load from cache
-                print(f"Loading from cache: {cache_file}")
+                cache_log.info(f"Loading from cache: {cache_file}")
                 cache_data = self.bot.load_cached(cache_file)
                 if cache_data:
                     cmap = cache_data['cmap']
@@ -1659,17 +1864,17 @@ class Window:
                     num_colors = len(cmap)
                     total_points = sum(len(lines) for lines in cmap.values())
                     cache_time = time.ctime(cache_data['timestamp'])
-                    print(f"Cache loaded - {num_colors} colors, {total_points} coordinate points")
-                    print(f"Cached on: {cache_time}")
-                    print(f"Settings: Delay={cache_data['settings'][0]}, PixelSize={cache_data['settings'][1]}")
+                    cache_log.info(f"Cache loaded - {num_colors} colors, {total_points} coordinate points")
+                    cache_log.info(f"Cached on: {cache_time}")
+                    cache_log.info(f"Settings: PixelSize={cache_data['plan_inputs']['step']}, Mode={cache_data['mode']}")
                     self.tlabel['text'] = f"Using cached computation for test draw"
                 else:
                     # Cache invalid, fall back to processing
-                    print("Cache file invalid, processing live...")
+                    cache_log.warning("Cache file invalid, processing live...")
                     cmap = self.bot.process(self._imname, flags=self.draw_options, mode=self._mode)
             else:
                 # No cache, process normally
-                print("No cache available, processing live...")
+                cache_log.info("No cache available, processing live...")
                 cmap = self.bot.process(self._imname, flags=self.draw_options, mode=self._mode)
 
             # Count total lines and limit to first 20 (or fewer if less available)
@@ -1692,6 +1897,7 @@ class Window:
             }
 
             result = self.bot.test_draw(cmap, max_lines=test_lines)
+            Bot.release_plan(cmap)
             self._root.deiconify()  # type: ignore
             self._root.wm_state('normal')  # type: ignore
             if result == 'success':
@@ -1821,16 +2027,19 @@ class Window:
     def _on_delete_calibration(self):
         """Remove the color calibration file"""
         from tkinter import messagebox
-        if messagebox.askyesno(self.title, "Are you sure you want to remove the color calibration file?\n\nThis will delete: color_calibration.json"):
+        calib_files = (self.bot.calibration_store.path, self.bot.calibration_store.partial_path, 'color_calibration.json')
+        if messagebox.askyesno(self.title, f"Are you sure you want to remove the color calibration file?\n\nThis will delete: {' / '.join(calib_files)}"):
             try:
                 import os
-                calib_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'color_calibration.json')
-                if os.path.exists(calib_path):
-                    os.remove(calib_path)
+                calib_paths = [os.path.join(os.path.dirname(os.path.dirname(__file__)), name) for name in calib_files]
+                removed = [path for path in calib_paths if os.path.exists(path)]
+                if removed:
+                    for calib_path in removed:
+                        os.remove(calib_path)
+                        print(f"[File Management] Removed calibration file: {calib_path}")
                     self.tlabel['text'] = "Color calibration file removed successfully."
                     # Clear calibration data from bot
                     self.bot.color_calibration_map = None
-                    print(f"[File Management] Removed calibration file: {calib_path}")
                 else:
                     self.tlabel['text'] = "No calibration file found to remove."
             except Exception as e:
@@ -1919,7 +2128,7 @@ class Window:
                 'was_paused': False
             }
 
-            result = self.bot.draw(cmap)
+            result = self.bot.draw(cmap, checkpoint=False)
             self._root.deiconify()
             self._root.wm_state('normal')
 
@@ -2065,7 +2274,7 @@ class Window:
             has_cache, cache_file = self.bot.get_cached_status(self._imname, flags=self.draw_options, mode=self._mode)
             if has_cache:
                 # Load from cache
-                print(f"Loading from cache: {cache_file}")
+                cache_log.info(f"Loading from cache: {cache_file}")
                 cache_data = self.bot.load_cached(cache_file)
                 if cache_data:
                     cmap = cache_data['cmap']
@@ -2073,24 +2282,36 @@ class Window:
                     num_colors = len(cmap)
                     total_points = sum(len(lines) for lines in cmap.values())
                     cache_time = time.ctime(cache_data['timestamp'])
-                    print(f"Cache loaded - {num_colors} colors, {total_points} coordinate points")
-                    print(f"Cached on: {cache_time}")
-                    print(f"Settings: Delay={cache_data['settings'][0]}, PixelSize={cache_data['settings'][1]}")
+                    cache_log.info(f"Cache loaded - {num_colors} colors, {total_points} coordinate points")
+                    cache_log.info(f"Cached on: {cache_time}")
+                    cache_log.info(f"Settings: PixelSize={cache_data['plan_inputs']['step']}, Mode={cache_data['mode']}")
                     self.tlabel['text'] = f"Using cached computation"
                 else:
                     # Cache invalid, fall back to processing
-                    print("Cache file invalid, processing live...")
+                    cache_log.warning("Cache file invalid, processing live...")
                     cmap = self.bot.process(self._imname, flags=self.draw_options, mode=self._mode)
             else:
                 # No cache, process normally
-                print("No cache available, processing live...")
+                cache_log.info("No cache available, processing live...")
                 cmap = self.bot.process(self._imname, flags=self.draw_options, mode=self._mode)
 
+            compiled = self.bot.prepare_draw(cmap)
             # Show drawing time estimate
-            drawing_eta = self.bot.estimate_drawing_time(cmap)
+            drawing_eta = self.bot.estimate_drawing_time(cmap, compiled)
+            # The tape holds its own copy of the strokes, the plan file can be recomputed or evicted while drawing
+            Bot.release_plan(cmap)
             print(f"Estimated drawing time: {drawing_eta}")
             self.tlabel['text'] = f"Starting draw - ETA: {drawing_eta}"
 
+            # Offer to continue an unfinished drawing of the same plan (app closed or crashed midway)
+            checkpoint = self.bot.find_checkpoint(compiled)
+            if checkpoint is not None and not messagebox.askyesno(
+                    self.title,
+                    f'An unfinished drawing of this image was found ({time.ctime(checkpoint.time)}).\n\n'
+                    f'Resume from stroke {checkpoint.stroke} of {checkpoint.total}?\n'
+                    f'Choose No to start over.'):
+                checkpoint = None
+
             messagebox.showwarning(self.title, f'Press ESC to stop the bot. Press {self.bot.pause_key} to pause/resume.')
             self._root.iconify()
             # Allow time for user to click inside the app to draw in
@@ -2100,14 +2321,24 @@ class Window:
             self.bot.paused = False
             self.bot.drawing = False
             self.bot.draw_state = {
-                'color_idx': 0,
-                'line_idx': 0,
+                'color_idx': checkpoint.color_idx if checkpoint else 0,
+                'line_idx': checkpoint.line_idx if checkpoint else 0,
                 'segment_idx': 0,
                 'current_color': None,
                 'was_paused': False
             }
 
-            result = self.bot.draw(cmap)
+            result = self.bot.draw_tape(compiled, checkpoint=True)
+
+            # Check the canvas against the target and touch up mismatched cells, still minimized
+            verify_settings = self.tools.get('verify_settings', {})
+            verify_summary = None
+            if result == 'success' and verify_settings.get('enabled', False):
+                result, reports = self.bot.touch_up(self._imname, flags=self.draw_options,
+                                                    passes=int(verify_settings.get('passes', 2)),
+                                                    tolerance=int(verify_settings.get('tolerance', 40)))
+                if reports:
+                    verify_summary = reports[-1].summary()
             self._root.deiconify()  # type: ignore
             self._root.wm_state('normal')  # type: ignore
             if result == 'success':
@@ -2124,6 +2355,8 @@ class Window:
                     self.tlabel['text'] = f"Success! Est: {estimated_str}, Act: {actual_str}, {diff_str}"
                 else:
                     self.tlabel['text'] = f"Success. Time elapsed: {actual_time:.2f}s"
+                if verify_summary:
+                    self.tlabel['text'] += f" - {verify_summary}"
             elif result == 'terminated':
                 actual_time = time.time() - t
                 if hasattr(self.bot, 'estimated_time_seconds'):